@@ -1,25 +1,515 @@
 import os
 import re
-import joblib
+import json
+import math
+import time
+import random
+import hashlib
+import shutil
+import functools
+import threading
 import numpy as np
 
 # Import GenAI feature extractor for enhanced detection
 from .genai_features import extract_genai_features
+from .document import as_document
+from .inference import BatchPredictor, PREDICT_JOBS
+from .model_registry import RegistryError, file_sha256, get_registry
 
 # Path to the trained model
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-MODEL_PATH = os.path.join(BASE_DIR, 'data', 'models', 'ai_detector_rf.joblib')
+MODEL_PATH = os.environ.get('AI_MODEL_PATH', os.path.join(BASE_DIR, 'data', 'models', 'ai_detector_rf.joblib'))
+# Array export of the same model (learning/train_model.py writes it next to the .joblib)
+FLAT_MODEL_PATH = os.path.splitext(MODEL_PATH)[0] + '.flat'
+# Use the flat export when it matches the .joblib file; set to 0 to always evaluate through sklearn
+USE_FLAT_MODEL = os.environ.get('AI_FLAT_MODEL', '1') == '1'
+# Memory-map the flat export's arrays read-only instead of reading them into
+# every process: all workers then share one copy through the page cache
+FLAT_MMAP = os.environ.get('AI_FLAT_MMAP', '1') == '1'
+# An explicit AI_MODEL_PATH pins that file; otherwise the model registry's
+# promoted version is served when there is one (see model_registry.py)
+MODEL_PINNED = 'AI_MODEL_PATH' in os.environ
+# Seconds between checks of the registry for a newly promoted model or shadow candidate
+MODEL_RELOAD_INTERVAL = float(os.environ.get('AI_MODEL_RELOAD_INTERVAL', 2))
+# Shadow predictions allowed to wait; further samples are skipped while the candidate catches up
+SHADOW_MAX_PENDING = int(os.environ.get('AI_SHADOW_MAX_PENDING', 64))
 
-# Load model globally to avoid reloading on every request
-MODEL = None
-try:
-    if os.path.exists(MODEL_PATH):
-        MODEL = joblib.load(MODEL_PATH)
-        print(f"Loaded Random Forest model from {MODEL_PATH}")
+FLAT_FORMAT = 2
+
+
+class FlatForest:
+    """
+    A Random Forest flattened into contiguous arrays, one entry per node of
+    all trees: split feature and threshold, the two children and the class
+    probabilities of leaves. Leaves are their own children, so every row
+    walks all trees at once for max_depth steps.
+
+    predict_proba reproduces RandomForestClassifier.predict_proba bit for
+    bit: features are compared as float32 like sklearn's trees do, and the
+    per-tree probabilities are summed in tree order before dividing by the
+    number of trees.
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth, classes):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.classes_ = np.asarray(classes)
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        feature, threshold, children, value, roots = [], [], [], [], []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left < 0
+            roots.append(offset)
+            feature.append(np.where(leaf, 0, tree.feature))
+            threshold.append(np.where(leaf, np.inf, tree.threshold))
+            left = np.where(leaf, nodes, tree.children_left)
+            right = np.where(leaf, nodes, tree.children_right)
+            children.append(np.stack([left, right], axis=1) + offset)
+            value.append(tree.value[:, 0, :forest.n_classes_])
+            offset += tree.node_count
+        max_depth = max(estimator.tree_.max_depth for estimator in forest.estimators_)
+        return cls(np.concatenate(feature).astype(np.int32), np.concatenate(threshold).astype(np.float64),
+                   np.concatenate(children).astype(np.int32), np.concatenate(value).astype(np.float64),
+                   np.asarray(roots, dtype=np.int32), max_depth, forest.classes_)
+
+    def leaves(self, X: np.ndarray) -> np.ndarray:
+        """Leaf reached in every tree by every row of the dense float32 matrix X."""
+        nodes = np.repeat(self.roots[None, :], len(X), axis=0)
+        rows = np.arange(len(X))[:, None]
+        for _ in range(self.max_depth):
+            right = X[rows, self.feature[nodes]] > self.threshold[nodes]
+            nodes = self.children[nodes, right.view(np.int8)]
+        return nodes
+
+    def predict_proba(self, X) -> np.ndarray:
+        X = X.toarray() if hasattr(X, 'toarray') else np.asarray(X)
+        values = self.value[self.leaves(X.astype(np.float32))]
+        # cumsum adds the trees one after another, the order sklearn accumulates them in
+        return np.cumsum(values, axis=1)[:, -1] / len(self.roots)
+
+
+class FlatVectorizer:
+    """
+    TfidfVectorizer.transform for the detector's settings (word unigrams,
+    raw counts, smoothed IDF, L2 norm) without importing sklearn. Stop
+    words need no list: they are never in the fitted vocabulary. The L2
+    norm is summed feature by feature like sklearn's, so the weights are
+    bit-identical.
+
+    The vocabulary is a sorted array of terms (fixed-width unicode) with the
+    feature index of each, looked up with a binary search instead of a dict,
+    so it can be memory-mapped and shared between processes like the forest.
+    """
+
+    def __init__(self, terms, idf, token_pattern, lowercase=True, term_ids=None):
+        self.terms = np.asarray(terms)
+        self.term_ids = np.arange(len(self.terms)) if term_ids is None else term_ids
+        self.width = self.terms.dtype.itemsize // 4
+        self.idf = idf
+        self.pattern = re.compile(token_pattern)
+        self.lowercase = lowercase
+
+    @classmethod
+    def sorted_terms(cls, vocabulary):
+        """(sorted terms array, feature index of each) of a term -> feature dict."""
+        terms = sorted(vocabulary)
+        return np.array(terms, dtype=str), np.array([vocabulary[t] for t in terms], dtype=np.int32)
+
+    def feature_ids(self, text) -> np.ndarray:
+        """Feature index of every in-vocabulary token of `text`."""
+        width = self.width
+        tokens = [t for t in self.pattern.findall(text.lower() if self.lowercase else text) if len(t) <= width]
+        if not tokens or not len(self.terms):
+            return np.empty(0, dtype=np.intp)
+        # same width as the terms, so searchsorted does not convert (copy) the whole term array
+        tokens = np.array(tokens, dtype=self.terms.dtype)
+        positions = np.minimum(np.searchsorted(self.terms, tokens), len(self.terms) - 1)
+        found = self.terms[positions] == tokens
+        return self.term_ids[positions[found]]
+
+    def transform(self, texts) -> np.ndarray:
+        """Dense (texts, features) float64 TF-IDF matrix."""
+        X = np.zeros((len(texts), len(self.idf)))
+        for row, text in zip(X, texts):
+            ids = self.feature_ids(text)
+            if not len(ids):
+                continue
+            counts = np.bincount(ids)
+            features = np.flatnonzero(counts)
+            data = counts[features].astype(np.float64) * self.idf[features]
+            # cumsum adds the squares in feature order, like sklearn's inplace_csr_row_normalize_l2
+            norm = math.sqrt(np.cumsum(data * data)[-1])
+            row[features] = data / norm
+        return X
+
+
+# TfidfVectorizer settings FlatVectorizer reproduces (besides token_pattern and lowercase)
+_FLAT_VECTORIZER_SETTINGS = {
+    'input': 'content', 'analyzer': 'word', 'ngram_range': (1, 1), 'preprocessor': None, 'tokenizer': None,
+    'strip_accents': None, 'binary': False, 'norm': 'l2', 'use_idf': True, 'sublinear_tf': False,
+}
+
+
+class FlatModel:
+    """A FlatVectorizer plus a FlatForest; a drop-in for the sklearn
+    pipeline's predict_proba(texts)."""
+
+    def __init__(self, vectorizer, forest: FlatForest):
+        self.vectorizer = vectorizer
+        self.forest = forest
+        self.classes_ = forest.classes_
+
+    def predict_proba(self, texts) -> np.ndarray:
+        return self.forest.predict_proba(self.vectorizer.transform(texts))
+
+
+def save_flat_model(pipeline, path, model_sha256):
+    """Export a fitted TF-IDF + Random Forest pipeline to the directory
+    `path`: forest arrays, IDF and the sorted vocabulary as .npy files
+    (which load_flat_model can memory-map), tokenizer settings as JSON.
+    `model_sha256` identifies the .joblib file it was exported from.
+    Raises ValueError for vectorizer settings FlatVectorizer does not
+    reproduce."""
+    vectorizer, forest = pipeline.steps[0][1], pipeline.steps[-1][1]
+    if not hasattr(vectorizer, 'idf_') or not hasattr(forest, 'estimators_'):
+        raise ValueError("Only TF-IDF + Random Forest pipelines can be flattened")
+    params = vectorizer.get_params()
+    unsupported = [k for k, v in _FLAT_VECTORIZER_SETTINGS.items() if params[k] != v]
+    if unsupported:
+        raise ValueError(f"Cannot flatten a TfidfVectorizer with custom {', '.join(unsupported)}")
+    flat = FlatForest.from_sklearn(forest)
+    tmp = path + '.tmp'
+    os.makedirs(tmp, exist_ok=True)
+    for name in ('feature', 'threshold', 'children', 'value', 'roots'):
+        np.save(os.path.join(tmp, f'{name}.npy'), getattr(flat, name))
+    np.save(os.path.join(tmp, 'idf.npy'), vectorizer.idf_)
+    terms, term_ids = FlatVectorizer.sorted_terms(vectorizer.vocabulary_)
+    np.save(os.path.join(tmp, 'terms.npy'), terms)
+    np.save(os.path.join(tmp, 'term_ids.npy'), term_ids)
+    meta = {
+        'format': FLAT_FORMAT,
+        'model_sha256': model_sha256,
+        'max_depth': flat.max_depth,
+        'classes': flat.classes_.tolist(),
+        'token_pattern': params['token_pattern'],
+        'lowercase': params['lowercase'],
+    }
+    with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.replace(tmp, path)
+
+
+def load_flat_model(path=FLAT_MODEL_PATH, model_sha256=None, mmap=FLAT_MMAP):
+    """The FlatModel exported to `path`, or None when there is none or it
+    was exported from a different .joblib file than `model_sha256`. With
+    `mmap` its arrays are read-only memory maps of the files, shared by
+    every process that loads the same export. Exports of format 1 (the
+    vocabulary as a JSON list) still load."""
+    meta_path = os.path.join(path, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('format') not in (1, FLAT_FORMAT) or (model_sha256 and meta.get('model_sha256') != model_sha256):
+        return None
+
+    def load(name):
+        return np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None)
+
+    if meta['format'] == 1:
+        terms, term_ids = FlatVectorizer.sorted_terms({term: i for i, term in enumerate(meta['terms'])})
     else:
-        print(f"Model file not found at {MODEL_PATH}. Using heuristics.")
-except Exception as e:
-    print(f"Error loading model: {e}")
+        terms, term_ids = load('terms'), load('term_ids')
+    vectorizer = FlatVectorizer(terms, load('idf'), meta['token_pattern'], meta['lowercase'], term_ids)
+    arrays = {name: load(name) for name in ('feature', 'threshold', 'children', 'value', 'roots')}
+    return FlatModel(vectorizer, FlatForest(max_depth=meta['max_depth'], classes=meta['classes'], **arrays))
+
+
+_FINGERPRINTS = {}  # path -> ((size, mtime), SHA-256)
+
+
+class LoadedModel:
+    """
+    A loaded model (None: heuristics only) with its micro-batching
+    predictor. Reloading replaces the whole object, so a request keeps
+    using the model it started with while the next one gets the new model.
+    """
+
+    def __init__(self, model, version=None, sha256=None, path=None, n_jobs=PREDICT_JOBS):
+        self.model = model
+        self.version = version
+        self.sha256 = sha256
+        self.path = path
+        self.uses_genai = model_uses_genai_features(model)
+        self.predictor = BatchPredictor(model, n_jobs=n_jobs) if model is not None else None
+        self.loaded_at = time.time()
+
+    def submit(self, doc):
+        """Future of the predict_proba row of an AnalyzedDocument."""
+        # the combined model computes the GenAI features itself; hand it the analysed document
+        return self.predictor.submit(doc if self.uses_genai else doc.text)
+
+    def warm_up(self):
+        """One prediction before serving, so the first request does not pay for lazy setup."""
+        if self.model is not None:
+            self.model.predict_proba(['Warm-up text for the detector model.'])
+
+    def close(self):
+        if self.predictor is not None:
+            self.predictor.close()
+
+    def status(self):
+        return {'version': self.version, 'sha256': self.sha256, 'path': self.path,
+                'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.loaded_at))}
+
+
+class ShadowModel(LoadedModel):
+    """A candidate that scores a `rate` fraction of requests in the background;
+    its scores go to the registry's shadow log next to the served model's."""
+
+    def __init__(self, model, version, sha256, path, rate):
+        # one thread: the candidate must not compete with the served model for cores
+        super().__init__(model, version, sha256, path, n_jobs=1)
+        self.rate = rate
+        self.sampled = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def record(self, primary_version, primary_score, started, text, future):
+        """Done-callback of a shadow prediction; runs on the batching thread."""
+        try:
+            get_registry().record_shadow(self.version, {
+                'time': round(time.time(), 3),
+                'pid': os.getpid(),
+                'primary_version': primary_version,
+                'primary_score': round(primary_score, 4),
+                'shadow_score': round(float(future.result()[1]), 4),
+                'shadow_ms': round((time.perf_counter() - started) * 1000, 2),
+                'text_sha256': hashlib.sha256(text.encode('utf-8')).hexdigest()[:16],
+            })
+        except Exception as e:
+            self.errors += 1
+            print(f"Shadow prediction error: {e}")
+
+    def status(self):
+        return {**super().status(), 'rate': self.rate, 'sampled': self.sampled, 'dropped': self.dropped,
+                'errors': self.errors, 'pending': self.predictor.pending()}
+
+
+def get_predictor():
+    """The BatchPredictor shared by all detect_ai calls of this process (None without a model)."""
+    return current_model().predictor
+
+
+def model_uses_genai_features(model):
+    """Whether `model` was trained on the GenAI features too (learning/train_combined.py)."""
+    if model is None or isinstance(model, FlatModel):
+        return False
+    # the combined pipeline is pickled with sklearn classes, so sklearn is loaded already
+    from .combined_model import uses_genai_features
+    return uses_genai_features(model)
+
+
+def inference_stats():
+    """Batch-size and queue-time histograms of this process's predictor."""
+    active = _ACTIVE
+    stats = active.predictor.stats() if active is not None and active.predictor is not None else {'batches': 0}
+    stats['pid'] = os.getpid()
+    stats['model_version'] = active.version if active is not None else None
+    return stats
+
+
+def model_status():
+    """The model this process serves and its shadow candidate, if any."""
+    active, shadow = _ACTIVE, _SHADOW
+    return {'pid': os.getpid(), 'pinned': MODEL_PINNED, 'serving': active.status() if active is not None else None,
+            'shadow': shadow.status() if shadow is not None else None}
+
+
+def _registry_version():
+    """Metadata of the registry's promoted version; None when AI_MODEL_PATH
+    pins the model or nothing usable was promoted."""
+    if MODEL_PINNED:
+        return None
+    try:
+        return get_registry().current()
+    except (OSError, ValueError, RegistryError):
+        return None
+
+
+def _file_fingerprint(path):
+    """SHA-256 of a model file, recomputed only when its size or mtime changes."""
+    st = os.stat(path)
+    stamp = (st.st_size, st.st_mtime_ns)
+    cached = _FINGERPRINTS.get(path)
+    if cached is None or cached[0] != stamp:
+        cached = _FINGERPRINTS[path] = (stamp, file_sha256(path))
+    return cached[1]
+
+
+def model_fingerprint():
+    """SHA-256 of the served model file, or 'heuristic' when there is none.
+
+    Callers can use it to notice that the model was replaced: it follows
+    promotions in the registry and changes of the file at MODEL_PATH.
+    """
+    meta = _registry_version()
+    if meta is not None:
+        return meta['sha256']
+    try:
+        return _file_fingerprint(MODEL_PATH)
+    except OSError:
+        return 'heuristic'
+
+
+def load_model(path=MODEL_PATH, sha256=None):
+    """The flat export of the model file `path` when it is up to date, else
+    the pickled pipeline (None without a model file). `sha256` is the file's
+    hash when the caller knows it already."""
+    if not os.path.exists(path):
+        print(f"Model file not found at {path}. Using heuristics.")
+        return None
+    if USE_FLAT_MODEL:
+        flat_path = os.path.splitext(path)[0] + '.flat'
+        model = load_flat_model(flat_path, sha256 or _file_fingerprint(path))
+        if model is not None:
+            print(f"Loaded flattened Random Forest model from {flat_path}")
+            return model
+    import joblib  # the pickled pipeline needs sklearn, which takes a while to import
+    model = joblib.load(path)
+    print(f"Loaded detector model from {path}")
+    return model
+
+
+def _load_serving():
+    """LoadedModel of the registry's promoted version, else of MODEL_PATH."""
+    meta = _registry_version()
+    if meta is None:
+        return LoadedModel(load_model(), sha256=model_fingerprint(), path=MODEL_PATH)
+    path = get_registry().model_path(meta['version'])
+    return LoadedModel(load_model(path, meta['sha256']), meta['version'], meta['sha256'], path)
+
+
+def _load_shadow(config):
+    registry = get_registry()
+    meta = registry.get(config['version'])
+    path = registry.model_path(meta['version'])
+    return ShadowModel(load_model(path, meta['sha256']), meta['version'], meta['sha256'], path,
+                       float(config['rate']))
+
+
+def _reload(stamp):
+    """Background half of current_model(): load whatever the registry now
+    points at, warm it up, then swap it in. Requests keep being served by
+    the old model meanwhile, and its queued batches finish before its
+    predictor stops."""
+    global _ACTIVE, _SHADOW, _REGISTRY_STAMP, MODEL
+    try:
+        _serving()
+        meta = _registry_version()
+        if meta is not None and (meta['sha256'], meta['version']) != (_ACTIVE.sha256, _ACTIVE.version):
+            loaded = _load_serving()
+            loaded.warm_up()
+            retired, _ACTIVE = _ACTIVE, loaded
+            MODEL = loaded.model
+            print(f"Serving model {loaded.version} (was {retired.version or retired.path})")
+            retired.close()
+
+        config = get_registry().shadow()
+        shadow = _SHADOW
+        if config is None or config['version'] == _ACTIVE.version:
+            _SHADOW = None
+        elif shadow is not None and shadow.version == config['version']:
+            shadow.rate = float(config['rate'])
+            shadow = None  # keep it
+        else:
+            loaded = _load_shadow(config)
+            if loaded.model is None:
+                raise RegistryError(f"Shadow model {config['version']} has no model file")
+            loaded.warm_up()
+            _SHADOW = loaded
+            print(f"Shadow scoring {config['rate']:.0%} of requests with model {loaded.version}")
+        if shadow is not None and shadow is not _SHADOW:
+            shadow.close()
+    except Exception as e:
+        print(f"Model reload failed: {e}")
+    # a broken version is not retried until the registry changes again
+    _REGISTRY_STAMP = stamp
+
+
+def current_model():
+    """
+    The LoadedModel serving this process. At most every
+    MODEL_RELOAD_INTERVAL seconds this checks whether the registry's
+    promoted version or shadow candidate changed, and if so starts loading
+    them in a background thread; until that is done the current model
+    keeps answering.
+    """
+    global _LAST_CHECK, _RELOADER
+    active = _serving()
+    now = time.monotonic()
+    if MODEL_PINNED or now - _LAST_CHECK < MODEL_RELOAD_INTERVAL:
+        return active
+    _LAST_CHECK = now
+    stamp = get_registry().stamp()
+    with _RELOAD_LOCK:
+        if stamp != _REGISTRY_STAMP and (_RELOADER is None or not _RELOADER.is_alive()):
+            _RELOADER = threading.Thread(target=_reload, args=(stamp,), name='ai-model-reload', daemon=True)
+            _RELOADER.start()
+    return active
+
+
+def _shadow_score(active, doc, score):
+    """Score a sampled request with the shadow candidate too, off the request path."""
+    shadow = _SHADOW
+    if shadow is None or shadow.sha256 == active.sha256 or random.random() >= shadow.rate:
+        return
+    if shadow.predictor.pending() >= SHADOW_MAX_PENDING:
+        shadow.dropped += 1  # the candidate is falling behind; never let it queue without bound
+        return
+    shadow.sampled += 1
+    future = shadow.submit(doc)
+    future.add_done_callback(functools.partial(shadow.record, active.version, score, time.perf_counter(), doc.text))
+
+
+# The model is loaded on first use (or by a warm-up, see pipeline/warmup.py),
+# not at import, so importing this module stays cheap; the registry is
+# checked again on the first request (which also starts a shadow candidate)
+_LAST_CHECK = 0.0
+_REGISTRY_STAMP = None
+_RELOADER = None
+_RELOAD_LOCK = threading.Lock()
+_LOAD_LOCK = threading.Lock()
+_SHADOW = None
+_ACTIVE = None
+MODEL = None
+
+
+def _serving():
+    """The LoadedModel of this process, loaded on first use."""
+    global _ACTIVE, MODEL
+    if _ACTIVE is None:
+        with _LOAD_LOCK:
+            if _ACTIVE is None:
+                try:
+                    loaded = _load_serving()
+                except Exception as e:
+                    print(f"Error loading model: {e}")
+                    loaded = LoadedModel(None, sha256='heuristic')
+                MODEL = loaded.model
+                _ACTIVE = loaded
+    return _ACTIVE
+
 
 def detect_ai(text):
     """
@@ -30,28 +520,37 @@ def detect_ai(text):
     - Overall AI probability score
     - Basic metrics (perplexity, burstiness proxies)
     - GenAI-specific features (GPT repetition, Gemini overflow, etc.)
+    - model_sha256: the model that scored the text (it can differ from
+      model_fingerprint() while a promotion is being rolled out)
+
+    `text` may be a string or an AnalyzedDocument shared with other analyzers.
     """
-    if not text or not text.strip():
+    doc = as_document(text)
+    text = doc.text
+    if not text.strip():
         return {'score': 0.0, 'metrics': {'perplexity': 0, 'burstiness': 0}, 'genai_features': {}}
         
-    sentences = [s.strip() for s in re.split(r'[.!?]+', text) if s.strip()]
-    words = text.split()
+    sentence_lengths = doc.sentence_lengths
+    words = doc.words
     
-    if not sentences or not words:
+    if not sentence_lengths or not words:
         return {'score': 0.0, 'metrics': {'perplexity': 0, 'burstiness': 0}, 'genai_features': {}}
 
     # Default Heuristic Calculation (Fallback & Metrics)
-    avg_len = sum(len(s.split()) for s in sentences) / max(1, len(sentences))
+    avg_len = sum(sentence_lengths) / max(1, len(sentence_lengths))
     unique_ratio = len(set(words)) / max(1, len(words))
     
     # 1. Try ML Model Prediction
-    if MODEL:
+    active = current_model()
+    combined = False
+    if active.model is not None:
         try:
-            # Model pipeline expects a list/iterable of strings
-            # predict_proba returns [[prob_human, prob_ai]]
-            # We want prob_ai (index 1)
-            prediction = MODEL.predict_proba([text])
-            score = float(prediction[0][1])
+            # Concurrent requests are predicted together in one predict_proba call
+            # Each row is [prob_human, prob_ai]; we want prob_ai (index 1)
+            prediction = active.submit(doc).result()
+            score = float(prediction[1])
+            combined = active.uses_genai
+            _shadow_score(active, doc, score)
         except Exception as e:
             print(f"Prediction error: {e}")
             # Fallback to heuristic
@@ -63,12 +562,16 @@ def detect_ai(text):
         score = max(0.0, min(1.0, heuristic_raw))
     
     # 2. Extract GenAI-specific features
-    genai_features = extract_genai_features(text)
+    genai_features = extract_genai_features(doc)
     
     # 3. Combine ML score with GenAI composite score for enhanced detection
     genai_composite = genai_features.get('composite_score', 0)
-    # Weighted combination: 60% ML model, 40% GenAI features
-    enhanced_score = (score * 0.6) + (genai_composite * 0.4)
+    if combined:
+        # trained on TF-IDF and GenAI features together: its probability already weighs both
+        enhanced_score = score
+    else:
+        # Weighted combination: 60% ML model, 40% GenAI features
+        enhanced_score = (score * 0.6) + (genai_composite * 0.4)
     
     # 4. Calculate Display Metrics (Perplexity/Burstiness proxy)
     # These are illustrative metrics for the UI since TF-IDF RF doesn't output them directly
@@ -84,7 +587,9 @@ def detect_ai(text):
             'perplexity': perplexity,
             'burstiness': burstiness,
             'avg_sentence_len': round(avg_len, 1),
-            'method': 'Random Forest + GenAI Features' if MODEL else 'Heuristic + GenAI Features'
+            'method': ('Random Forest on TF-IDF + GenAI Features' if combined else
+                       'Random Forest + GenAI Features' if active.model is not None else 'Heuristic + GenAI Features')
         },
-        'genai_features': genai_features
+        'genai_features': genai_features,
+        'model_sha256': active.sha256,
     }
@@ -0,0 +1,72 @@
+"""
+Passage Alignment
+=================
+Extends the shingle matches found by the plagiarism index ("seeds") into
+maximal common passages between a submission and one source document.
+
+A seed says that the tokens at submission position q and source position
+s start a shared shingle. All seeds of one passage lie on the same
+diagonal s - q, so seeds are processed per diagonal in submission order:
+a seed inside the passage already extended on its diagonal is skipped,
+any other is extended to the left and right until the first differing
+token. Every token of a passage is compared once, so aligning costs time
+linear in the number of seeds plus the length of the passages, however
+long the submission and the source are; comparisons run on NumPy slices
+of growing size.
+"""
+
+from typing import Dict
+
+import numpy as np
+
+
+def common_prefix(a: np.ndarray, b: np.ndarray) -> int:
+    """Length of the longest common prefix of token arrays a and b."""
+    n = min(len(a), len(b))
+    k, step = 0, 16
+    while k < n:
+        end = min(n, k + step)
+        diff = np.flatnonzero(a[k:end] != b[k:end])
+        if len(diff):
+            return k + int(diff[0])
+        k, step = end, step * 2
+    return n
+
+
+def align(query: np.ndarray, source: np.ndarray, seeds_q: np.ndarray, seeds_s: np.ndarray,
+          min_length: int = 1) -> np.ndarray:
+    """
+    Maximal common passages of token arrays `query` and `source` through
+    the seed pairs (seeds_q[i], seeds_s[i]).
+
+    Returns an int64 array of shape (passages, 4) with rows (query_start,
+    query_end, source_start, source_end), token positions with exclusive
+    ends, sorted by query_start. Passages shorter than `min_length` tokens
+    and passages lying inside a longer one in the query are dropped.
+    """
+    seeds_q = np.asarray(seeds_q, dtype=np.int64)
+    seeds_s = np.asarray(seeds_s, dtype=np.int64)
+    diagonals = seeds_s - seeds_q
+    covered: Dict[int, int] = {}  # diagonal -> query end of the last passage on it
+    found = []
+    for i in np.lexsort((seeds_q, diagonals)).tolist():
+        q, s = int(seeds_q[i]), int(seeds_s[i])
+        d = s - q
+        if q < covered.get(d, -1):
+            continue
+        right = common_prefix(query[q:], source[s:])
+        left = common_prefix(query[:q][::-1], source[:s][::-1]) if right else 0
+        covered[d] = q + max(right, 1)
+        if left + right >= min_length:
+            found.append((q - left, q + right, s - left, s + right))
+    if not found:
+        return np.empty((0, 4), dtype=np.int64)
+
+    # drop passages contained in another (e.g. a phrase repeated in the source)
+    found.sort(key=lambda p: (p[0], -p[1]))
+    kept, reach = [], -1
+    for p in found:
+        if p[1] > reach:
+            kept.append(p)
+            reach = p[1]
+    return np.asarray(kept, dtype=np.int64)
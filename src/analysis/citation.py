@@ -1,12 +1,18 @@
 import re
 
+from .document import as_document
+
+
 def check_citations(text, references_text=""):
     """
     Analyzes citations in the text.
     1. Identifies inline citations (e.g., [1], (Author, 2023)).
     2. Checks if they match entries in the references section (if provided).
     3. Returns a 'credibility score' logic based on citation density and formatting.
+    `text` may be a string or an AnalyzedDocument.
     """
+    doc = as_document(text)
+    text = doc.text
     
     # 1. Regex for common citation formats
     # [1], [12]
@@ -18,7 +24,7 @@ def check_citations(text, references_text=""):
     
     # 2. Heuristic Scoring
     # If text is long but has 0 citations, low credibility for a "Scholarly Paper"
-    word_count = len(text.split())
+    word_count = doc.word_count
     if word_count < 50:
         score = 1.0 # Too short to judge
     else:
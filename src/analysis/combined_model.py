@@ -0,0 +1,65 @@
+"""
+Combined TF-IDF + GenAI Feature Model
+=====================================
+Building blocks of a detector that learns from the TF-IDF vector and the
+GenAIFeatureExtractor statistics together (see learning/train_combined.py),
+instead of blending the Random Forest probability with the GenAI composite
+at fixed weights.
+
+The model is an ordinary sklearn Pipeline, pickled like
+ai_detector_rf.joblib:
+
+    FeatureUnion
+      tfidf:  document_texts -> TfidfVectorizer
+      genai:  GenAIFeatureTransformer (extract_feature_matrix columns)
+    -> classifier
+
+Its input may be strings or AnalyzedDocuments. detect_ai passes the
+document it has already analysed, so the GenAI statistics reuse its
+sentences and word counts.
+"""
+
+import numpy as np
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.pipeline import FeatureUnion, Pipeline
+from sklearn.preprocessing import FunctionTransformer
+
+from .document import as_document
+from .genai_features import FEATURE_COLUMNS, get_extractor
+
+
+def document_texts(X):
+    """Plain text of every string or AnalyzedDocument in X."""
+    return [as_document(x).text for x in X]
+
+
+class GenAIFeatureTransformer(TransformerMixin, BaseEstimator):
+    """The GenAI feature matrix (FEATURE_COLUMNS) as a stateless sklearn transformer."""
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X) -> np.ndarray:
+        return get_extractor().extract_feature_matrix(list(X))
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray(FEATURE_COLUMNS, dtype=object)
+
+
+def make_combined_pipeline(vectorizer, classifier) -> Pipeline:
+    """Pipeline of a fitted `vectorizer` and a `classifier` fitted on
+    hstack([vectorizer output, GenAI feature matrix])."""
+    features = FeatureUnion([
+        ('tfidf', Pipeline([('text', FunctionTransformer(document_texts)), ('vectorizer', vectorizer)])),
+        ('genai', GenAIFeatureTransformer()),
+    ])
+    return Pipeline([('features', features), ('clf', classifier)])
+
+
+def uses_genai_features(model) -> bool:
+    """Whether `model` computes the GenAI features itself (a make_combined_pipeline model)."""
+    steps = getattr(model, 'steps', None)
+    if not steps:
+        return False
+    union = steps[0][1]
+    return any(isinstance(t, GenAIFeatureTransformer) for _, t in getattr(union, 'transformer_list', []))
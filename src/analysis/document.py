@@ -0,0 +1,110 @@
+"""
+Analyzed Document
+=================
+Tokenizes a document once so every analyzer can share the result instead
+of lower-casing and splitting the same body again.
+
+All attributes are computed lazily on first access and then kept, so an
+analyzer only pays for the representations it actually uses. `derived`
+holds results other modules compute from the document and reuse (e.g. the
+GenAI phrase scan, which the combined model and the report both need).
+"""
+
+import re
+from collections import Counter
+from functools import cached_property
+from typing import List, Tuple
+
+import numpy as np
+
+from .hashing import tokenize, token_ids
+from . import tfidf
+
+# Same sentence boundaries the analyzers have always used: runs of . ! ?
+_SENTENCE_RE = re.compile(r'[^.!?]+')
+
+
+class AnalyzedDocument:
+    """Text of one document plus its shared tokenizations."""
+
+    def __init__(self, text: str):
+        self.text = text or ''
+        # (what, computed with) -> result, see genai_features
+        self.derived = {}
+
+    def __len__(self):
+        return len(self.text)
+
+    @cached_property
+    def lower(self) -> str:
+        return self.text.lower()
+
+    @cached_property
+    def words(self) -> List[str]:
+        """Whitespace tokens of the original text."""
+        return self.text.split()
+
+    @cached_property
+    def word_count(self) -> int:
+        return len(self.words)
+
+    @cached_property
+    def lower_words(self) -> List[str]:
+        """Whitespace tokens of the lower-cased text."""
+        return self.lower.split()
+
+    @cached_property
+    def sentence_spans(self) -> List[Tuple[int, int]]:
+        """(start, end) character offsets of every non-empty sentence, whitespace trimmed."""
+        spans = []
+        for m in _SENTENCE_RE.finditer(self.text):
+            piece = m.group()
+            stripped = piece.strip()
+            if stripped:
+                start = m.start() + (len(piece) - len(piece.lstrip()))
+                spans.append((start, start + len(stripped)))
+        return spans
+
+    @cached_property
+    def sentences(self) -> List[str]:
+        return [self.text[s:e] for s, e in self.sentence_spans]
+
+    @cached_property
+    def sentence_lengths(self) -> List[int]:
+        """Word count of every sentence."""
+        return [len(s.split()) for s in self.sentences]
+
+    @cached_property
+    def word_counts(self) -> Counter:
+        """Frequency of every lower-cased word."""
+        return Counter(self.lower_words)
+
+    @cached_property
+    def bigram_counts(self) -> Counter:
+        """Frequency of every pair of consecutive lower-cased words."""
+        words = self.lower_words
+        return Counter(zip(words, words[1:]))
+
+    @cached_property
+    def index_tokens(self) -> Tuple[List[str], np.ndarray]:
+        """Lower-cased \\w+ tokens and their (start, end) character spans,
+        the tokenization the plagiarism index is built on."""
+        return tokenize(self.text)
+
+    @cached_property
+    def token_ids(self) -> np.ndarray:
+        """Stable 64-bit hash of every index token."""
+        return token_ids(self.index_tokens[0])
+
+    @cached_property
+    def term_counts(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Hashes and counts of the TF-IDF terms (the detector's vectorizer
+        tokenization), for similar-document search."""
+        return tfidf.term_counts(self.text)
+
+
+def as_document(text) -> AnalyzedDocument:
+    """Accept either raw text or an AnalyzedDocument."""
+    if isinstance(text, AnalyzedDocument):
+        return text
+    return AnalyzedDocument(text)
@@ -1,9 +1,13 @@
+from .document import as_document
+
+
 def check_eligibility(ai_score, plagiarism_score, citation_score, text):
     """
     Determines if the candidate is eligible for a scholarship based on:
     1. Originality (Low AI, Low Plagiarism)
     2. Research Quality (High Citation score)
     3. Data Integrity (No markers of fake/hallucinated data)
+    `text` may be a string or an AnalyzedDocument.
     """
     
     reasons = []
@@ -31,7 +35,7 @@ def check_eligibility(ai_score, plagiarism_score, citation_score, text):
         
     # 4. Data Integrity / Fake Data Heuristics
     # Scanning for signs of "hallucinated" or low-effort generic data
-    lower_text = text.lower()
+    lower_text = as_document(text).lower
     suspicious_phrases = [
         "synthetic data", "generated dataset", "simulated values", "randomly generated",
         "as an ai language model", "sample text", "lorem ipsum"
@@ -16,10 +16,87 @@ Author: AI-Generated Scholarly Paper Detection System
 For Academic Use Only - IEEE/College-level Project
 """
 
+import os
 import re
 import math
-from collections import Counter
-from typing import Dict, List, Tuple, Any
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, List, Tuple, Any, Optional, Union
+
+import numpy as np
+
+from .document import AnalyzedDocument, as_document
+from .lexicon import PhraseLexicon, FamilyHits, load_lexicon_file
+from .ngram_lm import get_language_model
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Optional JSON file of extra patterns per family, e.g. {"claude_hedging": ["\\bit bears mentioning\\b"]}
+LEXICON_PATH = os.environ.get('GENAI_LEXICON_PATH', os.path.join(BASE_DIR, 'data', 'lexicons', 'genai_phrases.json'))
+
+# Families that are scored on phrase frequency, with the frequency per 1000 words that maps to a score of 1.0
+PHRASE_FAMILIES = {
+    'gpt_repetition': (15, 'GPT-style repetitive phrases detected'),
+    'gemini_overflow': (12, 'Over-explanation patterns typical of Gemini'),
+    'claude_hedging': (10, 'Uncertainty hedging typical of Claude'),
+}
+
+# Weights of the composite GenAI score, based on feature reliability and discriminative power
+COMPOSITE_WEIGHTS = {
+    'gpt_repetition': 0.15,
+    'gemini_overflow': 0.10,
+    'claude_hedging': 0.10,
+    'burstiness': 0.25,
+    'citation_hallucination': 0.15,
+    'perplexity': 0.25
+}
+
+# Column layout of extract_feature_matrix(). Append new columns at the end only:
+# models trained on the matrix depend on these positions.
+FEATURE_COLUMNS = (
+    # the six scores and the composite, as in extract_all_features()
+    'gpt_repetition',
+    'gemini_overflow',
+    'claude_hedging',
+    'burstiness',
+    'citation_hallucination',
+    'perplexity',
+    'composite',
+    # raw statistics behind the scores
+    'gpt_frequency_per_1000',
+    'gemini_frequency_per_1000',
+    'claude_frequency_per_1000',
+    'sentence_count',
+    'mean_sentence_length',
+    'sentence_length_cv',
+    'citation_count',
+    'suspicious_citation_ratio',
+    'entropy',
+    'normalized_entropy',
+    'bigram_diversity',
+    'vocabulary_size',
+    'word_count',
+    # n-gram language model (0 when no model is trained)
+    'lm_log2_perplexity',
+)
+
+# Per-document counts gathered by _raw_statistics(), in this order
+_RAW_COLUMNS = (
+    'word_count', 'gpt_count', 'gemini_count', 'claude_count',
+    'sentence_count', 'sentence_length_sum', 'sentence_length_sq_sum',
+    'suspicious_citations', 'citation_count',
+    'lower_word_count', 'vocabulary_size', 'unique_bigrams', 'count_log_count_sum',
+    'lm_log2_perplexity',
+)
+_RAW = {name: i for i, name in enumerate(_RAW_COLUMNS)}
+
+# Sentences whose surprisal is listed in the perplexity details
+MAX_SENTENCE_SURPRISAL = 200
+
+# Every citation, used as the denominator of the hallucination ratio
+_ALL_CITATIONS_RE = re.compile(r'\([A-Z][a-z]+.*?\d{4}\)|\[\d+\]')
+
+# Analyzers accept raw text or a document that has already been tokenized
+TextOrDocument = Union[str, AnalyzedDocument]
 
 
 class GenAIFeatureExtractor:
@@ -30,8 +107,12 @@ class GenAIFeatureExtractor:
     that are characteristic of AI-generated content from various LLMs.
     """
     
-    def __init__(self):
-        """Initialize the feature extractor with pattern definitions."""
+    def __init__(self, lexicon_path: Optional[str] = LEXICON_PATH):
+        """Initialize the feature extractor with pattern definitions.
+
+        Patterns from the JSON file at `lexicon_path` (if it exists) are
+        appended to the built-in families below.
+        """
         
         # GPT-style repetitive phrases
         self.gpt_repetitive_patterns = [
@@ -88,26 +169,52 @@ class GenAIFeatureExtractor:
             # Vague institutional citations
             r'\((?:University|Institute|Organization)\s+\d{4}\)',
         ]
-        
-    def extract_all_features(self, text: str) -> Dict[str, Any]:
+
+        # All families compiled into one scanner, so each document is scanned once
+        lexicon = PhraseLexicon({
+            'gpt_repetition': self.gpt_repetitive_patterns,
+            'gemini_overflow': self.gemini_overflow_patterns,
+            'claude_hedging': self.claude_hedging_patterns,
+            'citation_hallucination': self.suspicious_citation_patterns,
+        })
+        extra = load_lexicon_file(lexicon_path)
+        unknown = set(extra) - set(lexicon.families)
+        if unknown:
+            print(f"Ignoring unknown lexicon families: {sorted(unknown)}")
+        extra = {name: patterns for name, patterns in extra.items() if name in lexicon.families}
+        self.lexicon = lexicon.extended(extra) if extra else lexicon
+
+    def scan_phrases(self, text: TextOrDocument) -> Dict[str, FamilyHits]:
+        """Count every pattern family in one pass over the text (once per
+        document and lexicon: the combined model and the report share it)."""
+        doc = as_document(text)
+        key = ('phrase_hits', self.lexicon)
+        hits = doc.derived.get(key)
+        if hits is None:
+            hits = doc.derived[key] = self.lexicon.scan(doc.text)
+        return hits
+        
+    def extract_all_features(self, text: TextOrDocument) -> Dict[str, Any]:
         """
         Extract all GenAI features from the given text.
         
         Args:
-            text: The scholarly paper text to analyze
+            text: The scholarly paper text (or AnalyzedDocument) to analyze
             
         Returns:
             Dictionary containing all extracted features and scores
         """
-        if not text or not text.strip():
+        text = as_document(text)
+        if not text.text.strip():
             return self._empty_features()
         
         # Extract individual features
-        gpt_score, gpt_details = self.detect_gpt_repetition(text)
-        gemini_score, gemini_details = self.detect_gemini_overflow(text)
-        claude_score, claude_details = self.detect_claude_hedging(text)
+        hits = self.scan_phrases(text)
+        gpt_score, gpt_details = self.detect_gpt_repetition(text, hits)
+        gemini_score, gemini_details = self.detect_gemini_overflow(text, hits)
+        claude_score, claude_details = self.detect_claude_hedging(text, hits)
         burstiness_score, burstiness_details = self.calculate_burstiness(text)
-        citation_score, citation_details = self.detect_citation_hallucination(text)
+        citation_score, citation_details = self.detect_citation_hallucination(text, hits)
         perplexity_score, perplexity_details = self.estimate_perplexity(text)
         
         # Calculate composite GenAI score (weighted average)
@@ -150,42 +257,44 @@ class GenAIFeatureExtractor:
             )
         }
     
-    def detect_gpt_repetition(self, text: str) -> Tuple[float, Dict]:
+    def _phrase_family_score(self, family: str, text: TextOrDocument,
+                             hits: Optional[Dict[str, FamilyHits]]) -> Tuple[float, Dict]:
+        """Score a phrase family by its frequency per 1000 words."""
+        doc = as_document(text)
+        if hits is None:
+            hits = self.scan_phrases(doc)
+        found = hits[family]
+        max_frequency, description = PHRASE_FAMILIES[family]
+
+        # Normalize by word count (per 1000 words)
+        normalized_frequency = (found.count / max(doc.word_count, 1)) * 1000
+
+        # Score: 0-1 scale, higher = more AI-like
+        score = min(1.0, normalized_frequency / max_frequency)
+
+        return score, {
+            'matches_found': found.count,
+            'examples': [e.lower() for e in found.examples],
+            'offsets': [list(span) for span in found.offsets],
+            'frequency_per_1000': round(normalized_frequency, 2),
+            'description': description
+        }
+
+    def detect_gpt_repetition(self, text: TextOrDocument,
+                              hits: Optional[Dict[str, FamilyHits]] = None) -> Tuple[float, Dict]:
         """
         Detect GPT-style repetitive phrase patterns.
         
         GPT models tend to use formulaic transitions and 
-        repetitive academic phrases.
+        repetitive academic phrases (15 matches per 1000 words = max score).
         
         Returns:
             Tuple of (score, details_dict)
         """
-        text_lower = text.lower()
-        word_count = len(text.split())
-        
-        matches = []
-        total_matches = 0
-        
-        for pattern in self.gpt_repetitive_patterns:
-            found = re.findall(pattern, text_lower, re.IGNORECASE)
-            if found:
-                total_matches += len(found)
-                matches.extend(found[:3])  # Keep first 3 examples
-        
-        # Normalize by word count (per 1000 words)
-        normalized_frequency = (total_matches / max(word_count, 1)) * 1000
-        
-        # Score: 0-1 scale, higher = more AI-like
-        score = min(1.0, normalized_frequency / 15)  # 15 matches per 1000 words = max
-        
-        return score, {
-            'matches_found': total_matches,
-            'examples': matches[:5],
-            'frequency_per_1000': round(normalized_frequency, 2),
-            'description': 'GPT-style repetitive phrases detected'
-        }
+        return self._phrase_family_score('gpt_repetition', text, hits)
     
-    def detect_gemini_overflow(self, text: str) -> Tuple[float, Dict]:
+    def detect_gemini_overflow(self, text: TextOrDocument,
+                               hits: Optional[Dict[str, FamilyHits]] = None) -> Tuple[float, Dict]:
         """
         Detect Gemini-style explanatory overflow patterns.
         
@@ -195,29 +304,10 @@ class GenAIFeatureExtractor:
         Returns:
             Tuple of (score, details_dict)
         """
-        text_lower = text.lower()
-        word_count = len(text.split())
-        
-        matches = []
-        total_matches = 0
-        
-        for pattern in self.gemini_overflow_patterns:
-            found = re.findall(pattern, text_lower, re.IGNORECASE)
-            if found:
-                total_matches += len(found)
-                matches.extend([str(f) for f in found[:3]])
-        
-        normalized_frequency = (total_matches / max(word_count, 1)) * 1000
-        score = min(1.0, normalized_frequency / 12)
-        
-        return score, {
-            'matches_found': total_matches,
-            'examples': matches[:5],
-            'frequency_per_1000': round(normalized_frequency, 2),
-            'description': 'Over-explanation patterns typical of Gemini'
-        }
+        return self._phrase_family_score('gemini_overflow', text, hits)
     
-    def detect_claude_hedging(self, text: str) -> Tuple[float, Dict]:
+    def detect_claude_hedging(self, text: TextOrDocument,
+                              hits: Optional[Dict[str, FamilyHits]] = None) -> Tuple[float, Dict]:
         """
         Detect Claude-style uncertainty hedging patterns.
         
@@ -226,29 +316,9 @@ class GenAIFeatureExtractor:
         Returns:
             Tuple of (score, details_dict)
         """
-        text_lower = text.lower()
-        word_count = len(text.split())
-        
-        matches = []
-        total_matches = 0
-        
-        for pattern in self.claude_hedging_patterns:
-            found = re.findall(pattern, text_lower, re.IGNORECASE)
-            if found:
-                total_matches += len(found)
-                matches.extend([str(f) for f in found[:3]])
-        
-        normalized_frequency = (total_matches / max(word_count, 1)) * 1000
-        score = min(1.0, normalized_frequency / 10)
-        
-        return score, {
-            'matches_found': total_matches,
-            'examples': matches[:5],
-            'frequency_per_1000': round(normalized_frequency, 2),
-            'description': 'Uncertainty hedging typical of Claude'
-        }
+        return self._phrase_family_score('claude_hedging', text, hits)
     
-    def calculate_burstiness(self, text: str) -> Tuple[float, Dict]:
+    def calculate_burstiness(self, text: TextOrDocument) -> Tuple[float, Dict]:
         """
         Calculate burstiness (sentence length variance).
         
@@ -258,12 +328,11 @@ class GenAIFeatureExtractor:
         Returns:
             Tuple of (ai_score, details_dict) - higher score = more AI-like (low burstiness)
         """
-        sentences = [s.strip() for s in re.split(r'[.!?]+', text) if s.strip()]
+        lengths = as_document(text).sentence_lengths
         
-        if len(sentences) < 3:
+        if len(lengths) < 3:
             return 0.0, {'variance': 0, 'mean_length': 0, 'description': 'Insufficient sentences'}
         
-        lengths = [len(s.split()) for s in sentences]
         mean_len = sum(lengths) / len(lengths)
         
         # Calculate variance
@@ -282,11 +351,12 @@ class GenAIFeatureExtractor:
             'std_deviation': round(std_dev, 2),
             'coefficient_of_variation': round(cv, 3),
             'mean_sentence_length': round(mean_len, 1),
-            'sentence_count': len(sentences),
+            'sentence_count': len(lengths),
             'description': 'Low burstiness indicates uniform AI-generated patterns'
         }
     
-    def detect_citation_hallucination(self, text: str) -> Tuple[float, Dict]:
+    def detect_citation_hallucination(self, text: TextOrDocument,
+                                      hits: Optional[Dict[str, FamilyHits]] = None) -> Tuple[float, Dict]:
         """
         Detect potentially hallucinated or fabricated citations.
         
@@ -296,18 +366,14 @@ class GenAIFeatureExtractor:
         Returns:
             Tuple of (score, details_dict)
         """
-        suspicious_matches = []
-        
-        for pattern in self.suspicious_citation_patterns:
-            found = re.findall(pattern, text, re.IGNORECASE)
-            suspicious_matches.extend(found)
+        doc = as_document(text)
+        if hits is None:
+            hits = self.scan_phrases(doc)
+        suspicious = hits['citation_hallucination']
         
         # Count total citations for comparison
-        all_citations = re.findall(r'\([A-Z][a-z]+.*?\d{4}\)', text)
-        all_citations += re.findall(r'\[\d+\]', text)
-        
-        total_citations = len(all_citations)
-        suspicious_count = len(suspicious_matches)
+        total_citations = sum(1 for _ in _ALL_CITATIONS_RE.finditer(doc.text))
+        suspicious_count = suspicious.count
         
         if total_citations == 0:
             return 0.5, {
@@ -325,30 +391,38 @@ class GenAIFeatureExtractor:
             'suspicious_count': suspicious_count,
             'total_citations': total_citations,
             'suspicious_ratio': round(ratio, 3),
-            'examples': suspicious_matches[:5],
+            'examples': suspicious.examples,
+            'offsets': [list(span) for span in suspicious.offsets],
             'description': 'Potentially fabricated or hallucinated citations'
         }
     
-    def estimate_perplexity(self, text: str) -> Tuple[float, Dict]:
+    def estimate_perplexity(self, text: TextOrDocument) -> Tuple[float, Dict]:
         """
         Estimate text perplexity using n-gram frequency analysis.
         
         AI-generated text typically has lower perplexity (more predictable)
         compared to human-written text.
         
-        Note: This is a simplified proxy for true perplexity which would
-        require a language model to compute accurately.
+        When an n-gram language model has been trained (see
+        analysis/ngram_lm.py) the score comes from its true per-token
+        perplexity; otherwise word entropy and bigram diversity are used
+        as a proxy.
         
         Returns:
             Tuple of (ai_score, details_dict) - higher score = more AI-like (low perplexity)
         """
-        words = text.lower().split()
+        doc = as_document(text)
+        words = doc.lower_words
         
         if len(words) < 10:
             return 0.0, {'estimated_perplexity': 0, 'description': 'Insufficient text'}
         
+        lm = get_language_model()
+        if lm is not None:
+            return self._language_model_perplexity(lm, doc)
+        
         # Calculate word frequency entropy as proxy for perplexity
-        word_counts = Counter(words)
+        word_counts = doc.word_counts
         total_words = len(words)
         
         # Shannon entropy
@@ -362,9 +436,8 @@ class GenAIFeatureExtractor:
         normalized_entropy = entropy / 12  # Normalize to ~0-1 range
         
         # Bigram repetition rate (another perplexity proxy)
-        bigrams = [tuple(words[i:i+2]) for i in range(len(words)-1)]
-        unique_bigrams = len(set(bigrams))
-        bigram_ratio = unique_bigrams / max(len(bigrams), 1)
+        unique_bigrams = len(doc.bigram_counts)
+        bigram_ratio = unique_bigrams / max(len(words) - 1, 1)
         
         # Low entropy + low bigram diversity = low perplexity = more AI-like
         perplexity_proxy = (normalized_entropy + bigram_ratio) / 2
@@ -380,6 +453,21 @@ class GenAIFeatureExtractor:
             'description': 'Low perplexity indicates predictable AI-generated text'
         }
     
+    def _language_model_perplexity(self, lm, doc: AnalyzedDocument) -> Tuple[float, Dict]:
+        """Perplexity score from the trained n-gram language model."""
+        result = _language_model_score(lm, doc)
+        ai_score = lm.ai_score(result['log2_perplexity'])
+        surprisal = result['sentence_surprisal']
+        return ai_score, {
+            'method': f"{lm.order}-gram language model",
+            'perplexity': round(result['perplexity'], 2),
+            'log2_perplexity': round(result['log2_perplexity'], 3),
+            'tokens': result['tokens'],
+            'sentence_surprisal': [round(x, 2) for x in surprisal[:MAX_SENTENCE_SURPRISAL]],
+            'estimated_perplexity': round(result['perplexity'], 1),
+            'description': 'Low perplexity indicates predictable AI-generated text'
+        }
+    
     def _calculate_composite_score(
         self, 
         gpt: float, 
@@ -394,14 +482,7 @@ class GenAIFeatureExtractor:
         
         Weights are based on feature reliability and discriminative power.
         """
-        weights = {
-            'gpt_repetition': 0.15,
-            'gemini_overflow': 0.10,
-            'claude_hedging': 0.10,
-            'burstiness': 0.25,
-            'citation_hallucination': 0.15,
-            'perplexity': 0.25
-        }
+        weights = COMPOSITE_WEIGHTS
         
         composite = (
             gpt * weights['gpt_repetition'] +
@@ -414,6 +495,126 @@ class GenAIFeatureExtractor:
         
         return min(1.0, max(0.0, composite))
     
+    def _raw_statistics(self, text: TextOrDocument) -> List[float]:
+        """Counts behind every feature of one document (see _RAW_COLUMNS)."""
+        doc = as_document(text)
+        if not doc.text.strip():
+            return [0.0] * len(_RAW_COLUMNS)
+        hits = self.scan_phrases(doc)
+        lengths = doc.sentence_lengths
+        counts = np.fromiter(doc.word_counts.values(), dtype=np.float64, count=len(doc.word_counts))
+        return [
+            doc.word_count,
+            hits['gpt_repetition'].count,
+            hits['gemini_overflow'].count,
+            hits['claude_hedging'].count,
+            len(lengths),
+            sum(lengths),
+            sum(l * l for l in lengths),
+            hits['citation_hallucination'].count,
+            sum(1 for _ in _ALL_CITATIONS_RE.finditer(doc.text)),
+            len(doc.lower_words),
+            len(counts),
+            len(doc.bigram_counts),
+            float(np.dot(counts, np.log2(counts))) if len(counts) else 0.0,
+            self._lm_log2_perplexity(doc),
+        ]
+
+    def _lm_log2_perplexity(self, doc: AnalyzedDocument) -> float:
+        lm = get_language_model()
+        if lm is None or len(doc.lower_words) < 10:
+            return 0.0
+        return _language_model_score(lm, doc)['log2_perplexity']
+
+    def extract_feature_matrix(self, texts: Iterable[TextOrDocument], n_jobs: int = 1,
+                               chunk_size: int = 256) -> np.ndarray:
+        """
+        Extract GenAI features for many texts at once.
+
+        Returns a float32 matrix with one row per text and the columns in
+        FEATURE_COLUMNS, ready to feed a scikit-learn model. Scores match
+        extract_all_features() up to rounding. Per-text counting is done
+        in Python (optionally in `n_jobs` worker processes, `chunk_size`
+        texts per task, each with a copy of this extractor and its lexicon);
+        all scoring arithmetic is vectorized over the batch.
+        """
+        if n_jobs == 1:
+            raw = [self._raw_statistics(t) for t in texts]
+        else:
+            raw = []
+            it = iter(texts)
+            workers = n_jobs if n_jobs > 0 else (os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_pool_worker, initargs=(self,)) as pool:
+                pending = []
+                while True:
+                    chunk = [as_document(t).text for t in islice(it, chunk_size)]
+                    if chunk:
+                        pending.append(pool.submit(_raw_statistics_chunk, chunk))
+                    # keep a bounded number of chunks in flight so iterators are consumed lazily
+                    while pending and (len(pending) > 2 * workers or not chunk):
+                        raw.extend(pending.pop(0).result())
+                    if not chunk:
+                        break
+        return self._score_matrix(np.asarray(raw, dtype=np.float64).reshape(-1, len(_RAW_COLUMNS)))
+
+    def _score_matrix(self, raw: np.ndarray) -> np.ndarray:
+        """Vectorized version of the per-feature scoring in the detect_* methods."""
+        def col(name):
+            return raw[:, _RAW[name]]
+
+        out = np.zeros((raw.shape[0], len(FEATURE_COLUMNS)), dtype=np.float64)
+        index = {name: i for i, name in enumerate(FEATURE_COLUMNS)}
+
+        def put(name, values):
+            out[:, index[name]] = values
+
+        empty = col('word_count') == 0
+        words = np.maximum(col('word_count'), 1)
+
+        for family, prefix in (('gpt_repetition', 'gpt'), ('gemini_overflow', 'gemini'), ('claude_hedging', 'claude')):
+            frequency = col(f'{prefix}_count') / words * 1000
+            put(f'{prefix}_frequency_per_1000', frequency)
+            put(family, np.minimum(1.0, frequency / PHRASE_FAMILIES[family][0]))
+
+        # burstiness: low coefficient of variation of sentence lengths = AI-like
+        n = col('sentence_count')
+        mean = col('sentence_length_sum') / np.maximum(n, 1)
+        variance = np.maximum(col('sentence_length_sq_sum') / np.maximum(n, 1) - mean ** 2, 0)
+        cv = np.sqrt(variance) / np.maximum(mean, 1)
+        put('sentence_count', n)
+        put('mean_sentence_length', mean)
+        put('sentence_length_cv', cv)
+        put('burstiness', np.where(n < 3, 0.0, np.maximum(0, 1 - cv / 0.6)))
+
+        # citations: share of suspicious ones, 0.5 when there are none at all
+        total = col('citation_count')
+        ratio = col('suspicious_citations') / np.maximum(total, 1)
+        put('citation_count', total)
+        put('suspicious_citation_ratio', ratio)
+        put('citation_hallucination', np.where(total == 0, np.where(empty, 0.0, 0.5), np.minimum(1.0, ratio * 2)))
+
+        # perplexity: n-gram language model if one is trained, else word entropy plus bigram diversity
+        total_words = col('lower_word_count')
+        safe_total = np.maximum(total_words, 1)
+        entropy = np.where(total_words > 0, np.log2(safe_total) - col('count_log_count_sum') / safe_total, 0.0)
+        bigram_ratio = col('unique_bigrams') / np.maximum(total_words - 1, 1)
+        put('entropy', entropy)
+        put('normalized_entropy', entropy / 12)
+        put('bigram_diversity', bigram_ratio)
+        put('vocabulary_size', col('vocabulary_size'))
+        put('word_count', col('word_count'))
+        proxy = np.maximum(0, 1 - (entropy / 12 + bigram_ratio) / 2)
+        lm_perplexity = col('lm_log2_perplexity')
+        put('lm_log2_perplexity', lm_perplexity)
+        lm = get_language_model()
+        if lm is not None:
+            proxy = np.where(lm_perplexity > 0, lm.ai_score(lm_perplexity), proxy)
+        put('perplexity', np.where(total_words < 10, 0.0, proxy))
+
+        composite = sum(out[:, index[name]] * weight for name, weight in COMPOSITE_WEIGHTS.items())
+        put('composite', np.clip(composite, 0.0, 1.0))
+        return out.astype(np.float32)
+
     def _generate_interpretation(
         self,
         gpt: float,
@@ -466,19 +667,53 @@ class GenAIFeatureExtractor:
         }
 
 
+def _language_model_score(lm, doc: AnalyzedDocument) -> Dict:
+    """lm.score(doc), once per document and language model."""
+    key = ('language_model', lm)
+    result = doc.derived.get(key)
+    if result is None:
+        result = doc.derived[key] = lm.score(doc)
+    return result
+
+
 # Convenience function for direct usage
-def extract_genai_features(text: str) -> Dict[str, Any]:
+_EXTRACTOR = None
+
+
+def get_extractor() -> GenAIFeatureExtractor:
+    """Shared extractor, so the pattern scanner is compiled once per process."""
+    global _EXTRACTOR
+    if _EXTRACTOR is None:
+        _EXTRACTOR = GenAIFeatureExtractor()
+    return _EXTRACTOR
+
+
+# the extractor whose extract_feature_matrix() started this pool worker
+_POOL_EXTRACTOR = None
+
+
+def _init_pool_worker(extractor: GenAIFeatureExtractor):
+    global _POOL_EXTRACTOR
+    _POOL_EXTRACTOR = extractor
+
+
+def _raw_statistics_chunk(texts: List[str]) -> List[List[float]]:
+    """Process-pool task of extract_feature_matrix()."""
+    extractor = _POOL_EXTRACTOR or get_extractor()
+    return [extractor._raw_statistics(t) for t in texts]
+
+
+def extract_genai_features(text: TextOrDocument) -> Dict[str, Any]:
     """
     Extract GenAI features from text.
     
     Args:
-        text: The text to analyze
+        text: The text (or AnalyzedDocument) to analyze
         
     Returns:
         Dictionary containing all GenAI features and scores
     """
-    extractor = GenAIFeatureExtractor()
-    return extractor.extract_all_features(text)
+    return get_extractor().extract_all_features(text)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+"""
+Stable Token Hashing
+====================
+64-bit hashes of tokens and n-grams that are identical in every process
+and on every run (unlike the built-in hash()), so they can be stored in
+on-disk indexes and looked up from any worker.
+
+Token hashes come from BLAKE2b and are memoized; n-gram keys are combined
+from token hashes with NumPy, so hashing all n-grams of a document is a
+handful of vectorized operations.
+"""
+
+import hashlib
+import re
+from functools import lru_cache
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+# Lower-cased word tokens, the unit every index is built on
+WORD_RE = re.compile(r'\w+')
+
+_MULT = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+@lru_cache(maxsize=1 << 18)
+def token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def token_ids(tokens: Iterable[str]) -> np.ndarray:
+    """uint64 hash of every token."""
+    tokens = list(tokens)
+    return np.fromiter((token_hash(t) for t in tokens), dtype=np.uint64, count=len(tokens))
+
+
+def tokenize(text: str) -> Tuple[List[str], np.ndarray]:
+    """Lower-cased word tokens of `text` and their (start, end) character spans."""
+    tokens = []
+    spans = []
+    for m in WORD_RE.finditer(text):
+        tokens.append(m.group().lower())
+        spans.append(m.span())
+    return tokens, np.asarray(spans, dtype=np.int64).reshape(-1, 2)
+
+
+def _finalize(h: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, spreads the bits of the combined key."""
+    h = h ^ (h >> np.uint64(30))
+    h = h * _MIX1
+    h = h ^ (h >> np.uint64(27))
+    h = h * _MIX2
+    return h ^ (h >> np.uint64(31))
+
+
+def ngram_keys(ids: np.ndarray, n: int) -> np.ndarray:
+    """Key of every n-gram of consecutive ids (len(ids) - n + 1 keys).
+
+    Keys of different orders never collide systematically because the
+    order is mixed into the key.
+    """
+    ids = np.asarray(ids, dtype=np.uint64)
+    count = len(ids) - n + 1
+    if count <= 0:
+        return np.empty(0, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        h = np.full(count, np.uint64(n), dtype=np.uint64)
+        for j in range(n):
+            h = h * _MULT + ids[j:j + count]
+        return _finalize(h)
+
+
+def hash_rows(values: np.ndarray, salt=0) -> np.ndarray:
+    """Key of every row of an integer array (combined over the last axis).
+
+    `salt` (a number, or an array broadcastable to the row shape) is mixed
+    in first, e.g. the band number of MinHash band keys.
+    """
+    values = np.asarray(values).astype(np.uint64)
+    with np.errstate(over='ignore'):
+        h = np.broadcast_to(np.asarray(salt, dtype=np.uint64), values.shape[:-1]).copy()
+        for j in range(values.shape[-1]):
+            h = h * _MULT + values[..., j]
+        return _finalize(h)
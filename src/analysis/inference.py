@@ -0,0 +1,244 @@
+"""
+Micro-batching Inference
+========================
+Runs the AI detector's predict_proba on batches of concurrent requests.
+
+A single call of the TF-IDF + Random Forest pipeline costs almost the
+same for one text as for a few dozen: most of the time goes into the
+per-call overhead of the vectorizer and of the 100 trees. Callers
+therefore submit their text to a BatchPredictor and get a Future back. A
+background thread takes the first waiting text, collects whatever else
+arrives within `max_wait_ms` (up to `max_batch_size` texts) and predicts
+them all in one call, spreading the trees over `n_jobs` threads when the
+batch has more than one text. It only waits while other analyses of this
+process are running that have not submitted their text yet (see
+analysis_in_progress); a lone request, e.g. in an ANALYSIS_MODE=process
+worker, is predicted right away.
+
+Batch sizes and queue times (submission to start of the batch) are
+recorded in histograms (stats()) for tuning the two limits: a longer wait
+gives larger batches and more throughput at the cost of latency.
+"""
+
+import bisect
+import contextlib
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Most texts predicted in one call
+BATCH_MAX_SIZE = int(os.environ.get('AI_BATCH_MAX_SIZE', 32))
+# How long the first text of a batch waits for others (milliseconds)
+BATCH_MAX_WAIT_MS = float(os.environ.get('AI_BATCH_MAX_WAIT_MS', 5))
+# Threads the forest's trees are spread over for batches of more than one text
+PREDICT_JOBS = int(os.environ.get('AI_PREDICT_JOBS', os.cpu_count() or 1))
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_TIME_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+
+class Histogram:
+    """Counts of observations per bucket (upper bounds, inclusive) plus an overflow bucket."""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def snapshot(self) -> Dict:
+        labels = [f'<={b:g}' for b in self.bounds] + [f'>{self.bounds[-1]:g}']
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 3) if self.count else 0.0,
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+_ANALYSES = 0
+_ANALYSES_LOCK = threading.Lock()
+
+
+@contextlib.contextmanager
+def analysis_in_progress():
+    """Marks an analysis running in this process that will submit a text
+    (pipeline/analyze.analyze_document); batches wait only for those."""
+    global _ANALYSES
+    with _ANALYSES_LOCK:
+        _ANALYSES += 1
+    try:
+        yield
+    finally:
+        with _ANALYSES_LOCK:
+            _ANALYSES -= 1
+
+
+def analyses_in_progress() -> int:
+    return _ANALYSES
+
+
+def merge_stats(stats: List[Dict]) -> Dict:
+    """BatchPredictor.stats() of several predictors (one per worker process)
+    added up; the histograms' means are weighted by their counts."""
+    merged = {key: sum(s.get(key, 0) for s in stats) for key in ('batches', 'errors', 'pending')}
+    for key in ('max_batch_size', 'max_wait_ms'):
+        merged[key] = next((s[key] for s in stats if key in s), None)
+    for key in ('batch_size', 'queue_time_ms'):
+        snapshots = [s[key] for s in stats if key in s]
+        count = sum(h['count'] for h in snapshots)
+        buckets = {}
+        for h in snapshots:
+            for label, n in h['buckets'].items():
+                buckets[label] = buckets.get(label, 0) + n
+        merged[key] = {'count': count,
+                       'mean': round(sum(h['mean'] * h['count'] for h in snapshots) / count, 3) if count else 0.0,
+                       'buckets': buckets}
+    merged['workers'] = len(stats)
+    return merged
+
+
+def _final_estimator(model):
+    """The classifier at the end of a Pipeline (or the model itself)."""
+    steps = getattr(model, 'steps', None)
+    return steps[-1][1] if steps else model
+
+
+class BatchPredictor:
+    """
+    Micro-batching front end of a fitted model with predict_proba.
+
+    submit() queues one text and returns a concurrent.futures.Future of its
+    probability row; predict() waits for it. The batching thread starts on
+    the first submission (and again in a forked child process, which does
+    not inherit it) and stops on close().
+    """
+
+    def __init__(self, model, max_batch_size: int = BATCH_MAX_SIZE, max_wait_ms: float = BATCH_MAX_WAIT_MS,
+                 n_jobs: int = PREDICT_JOBS):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.n_jobs = max(1, n_jobs)
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_times = Histogram(QUEUE_TIME_BUCKETS_MS)
+        self.batches = 0
+        self.errors = 0
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _start(self):
+        # called with self._lock held
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        self._queue = queue.Queue()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, args=(self._queue,), name='ai-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue `text`; the Future resolves to its predict_proba row."""
+        future = Future()
+        with self._lock:
+            if not self._closed:
+                self._start()
+                self._queue.put((text, future, time.perf_counter()))
+                return future
+        # closed (the model was swapped out while the caller held on to it): predict right here
+        try:
+            future.set_result(self.model.predict_proba([text])[0])
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def predict(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        return self.submit(text).result(timeout)
+
+    def close(self):
+        """Stop the batching thread once the queued texts are predicted. Texts
+        submitted afterwards are predicted one by one in the caller's thread."""
+        with self._lock:
+            self._closed = True
+            thread = self._thread if self._pid == os.getpid() else None
+            if thread is not None:
+                self._queue.put(None)
+            self._thread = None
+        # joined without the lock: submit() must not wait behind a long batch, and
+        # texts it predicts in the caller's thread meanwhile do not touch the queue
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def pending(self) -> int:
+        """Texts waiting for a batch."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> Dict:
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'batches': self.batches,
+            'errors': self.errors,
+            'pending': self.pending(),
+            'batch_size': self.batch_sizes.snapshot(),
+            'queue_time_ms': self.queue_times.snapshot(),
+        }
+
+    # ---- batching thread ----
+
+    def _collect(self, pending: queue.Queue, first) -> List:
+        """`first` plus whatever is queued or arrives before its wait is over,
+        up to a full batch. There is no wait unless more analyses are running
+        than there are texts in the batch."""
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            wait = remaining > 0 and analyses_in_progress() > len(batch)
+            try:
+                item = pending.get(timeout=remaining) if wait else pending.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                pending.put(None)  # stop after this batch
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self, pending: queue.Queue):
+        while True:
+            first = pending.get()
+            if first is None:
+                return
+            batch = [item for item in self._collect(pending, first) if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            for _, _, queued in batch:
+                self.queue_times.observe((started - queued) * 1000)
+            self.batch_sizes.observe(len(batch))
+            self.batches += 1
+            try:
+                forest = _final_estimator(self.model)
+                if hasattr(forest, 'n_jobs'):
+                    # threads only pay off when there is more than one text to push through every tree
+                    forest.n_jobs = self.n_jobs if len(batch) > 1 else None
+                probabilities = self.model.predict_proba([text for text, _, _ in batch])
+            except Exception as e:
+                self.errors += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), row in zip(batch, probabilities):
+                future.set_result(row)
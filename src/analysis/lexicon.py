@@ -0,0 +1,104 @@
+"""
+Phrase Lexicon Scanner
+======================
+Compiles several families of phrase patterns into a single scanner so a
+document is scanned once, instead of once per pattern.
+
+Every pattern becomes a branch of one alternation. Patterns that start with
+a word boundary (all the phrase families) share an alternation that is only
+tried at word starts, which is what keeps a 30-branch scan cheaper than 30
+separate scans; the few patterns without a leading word boundary (citation
+shapes) get a second alternation. Within an alternation matches are found
+left to right without overlap, and where two patterns could match at the
+same position the one listed first wins. For each family the scan reports
+the match count, the first examples and their character offsets.
+
+A pattern that starts with \b must continue with a word character and must
+not contain a top-level `|`; wrap alternatives in a group instead.
+"""
+
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Tuple
+
+MAX_EXAMPLES = 5
+MAX_OFFSETS = 50
+
+
+class FamilyHits:
+    """Matches of one pattern family in one document."""
+
+    __slots__ = ('count', 'examples', 'offsets')
+
+    def __init__(self):
+        self.count = 0
+        self.examples: List[str] = []
+        self.offsets: List[Tuple[int, int]] = []
+
+
+class PhraseLexicon:
+    """A set of named pattern families compiled into one scanner."""
+
+    def __init__(self, families: Dict[str, Iterable[str]], flags=re.IGNORECASE):
+        self.families = {name: list(patterns) for name, patterns in families.items()}
+        self.flags = flags
+        word_patterns = []
+        other_patterns = []
+        for name, patterns in self.families.items():
+            for pattern in patterns:
+                if pattern.startswith(r'\b'):
+                    word_patterns.append((name, pattern[2:]))
+                else:
+                    other_patterns.append((name, pattern))
+        # (regex, {group index: family}) pairs, each scanned once
+        self._scanners = []
+        if word_patterns:
+            self._scanners.append(self._compile(word_patterns, r'\b(?=\w)(?:', ')'))
+        if other_patterns:
+            self._scanners.append(self._compile(other_patterns, '', ''))
+
+    def _compile(self, patterns, prefix, suffix):
+        branches = []
+        group_family = {}
+        group = 1
+        for name, pattern in patterns:
+            # each pattern is wrapped in its own group; that group closes last,
+            # so match.lastindex tells which pattern (and family) matched
+            branches.append(f'({pattern})')
+            group_family[group] = name
+            group += 1 + re.compile(pattern, self.flags).groups
+        return re.compile(prefix + '|'.join(branches) + suffix, self.flags), group_family
+
+    def scan(self, text: str) -> Dict[str, FamilyHits]:
+        """Scan `text` and return the hits of every family."""
+        hits = {name: FamilyHits() for name in self.families}
+        if not text:
+            return hits
+        for regex, group_family in self._scanners:
+            for m in regex.finditer(text):
+                family = hits[group_family[m.lastindex]]
+                family.count += 1
+                if len(family.examples) < MAX_EXAMPLES:
+                    family.examples.append(m.group())
+                if len(family.offsets) < MAX_OFFSETS:
+                    family.offsets.append(m.span())
+        return hits
+
+    def extended(self, extra: Dict[str, Iterable[str]]) -> 'PhraseLexicon':
+        """A new lexicon with `extra` patterns appended to their families."""
+        families = {name: list(patterns) for name, patterns in self.families.items()}
+        for name, patterns in extra.items():
+            families.setdefault(name, []).extend(patterns)
+        return PhraseLexicon(families, self.flags)
+
+
+def load_lexicon_file(path: str) -> Dict[str, List[str]]:
+    """Read extra patterns from a JSON file mapping family names to lists of regexes."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"Lexicon file {path} must map family names to pattern lists")
+    return {name: [str(p) for p in patterns] for name, patterns in data.items()}
@@ -0,0 +1,95 @@
+"""
+MinHash Paragraph Signatures
+============================
+MinHash signatures of overlapping word windows ("paragraphs") and their
+locality-sensitive hash (LSH) band keys, for finding near-duplicate and
+lightly paraphrased passages that exact shingle matching misses.
+
+A paragraph is PARAGRAPH_WORDS consecutive words, starting every
+PARAGRAPH_WORDS / 2 words, represented by its set of word 3-grams. Its
+signature holds, for each of LSH_BANDS * LSH_ROWS hash permutations, the
+minimum permuted hash over that set; the share of equal signature entries
+of two paragraphs estimates the Jaccard similarity of their 3-gram sets.
+Splitting the signature into LSH_BANDS bands of LSH_ROWS entries and
+hashing each band gives keys two paragraphs share with probability
+1 - (1 - J^rows)^bands, so candidates are found by exact key lookups
+instead of comparing against every corpus paragraph.
+"""
+
+import os
+from typing import Tuple
+
+import numpy as np
+
+from .document import AnalyzedDocument
+from .hashing import hash_rows, ngram_keys
+
+PARAGRAPH_WORDS = int(os.environ.get('PLAGIARISM_PARAGRAPH_WORDS', 100))
+LSH_BANDS = int(os.environ.get('PLAGIARISM_LSH_BANDS', 40))
+LSH_ROWS = int(os.environ.get('PLAGIARISM_LSH_ROWS', 3))
+# Estimated Jaccard similarity above which a paragraph is reported as a near duplicate
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('PLAGIARISM_NEAR_DUPLICATE_THRESHOLD', 0.4))
+SHINGLE_WORDS = 3
+# Shingles hashed at a time; bounds the (permutations x shingles) scratch array
+HASH_BLOCK_SHINGLES = 4096
+
+_SEED = 0x5EED
+
+
+def _permutations(count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Multiply-shift hash parameters, fixed so signatures are comparable across builds."""
+    rng = np.random.default_rng(_SEED)
+    a = rng.integers(1, 2 ** 63, size=count, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.integers(0, 2 ** 63, size=count, dtype=np.uint64)
+    return a, b
+
+
+def paragraph_signatures(doc: AnalyzedDocument, bands: int = LSH_BANDS, rows: int = LSH_ROWS,
+                         words: int = PARAGRAPH_WORDS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    MinHash signature and (start, end) character span of every paragraph of `doc`.
+
+    Returns (signatures, spans): a uint32 array of shape
+    (paragraphs, bands * rows) and an int64 array of shape (paragraphs, 2).
+    Shingles are hashed HASH_BLOCK_SHINGLES at a time, so memory does not
+    grow with bands * rows * document length.
+    """
+    perms = bands * rows
+    keys = ngram_keys(doc.token_ids, SHINGLE_WORDS)
+    spans = doc.index_tokens[1]
+    if len(keys) == 0:
+        return np.empty((0, perms), dtype=np.uint32), np.empty((0, 2), dtype=np.int64)
+
+    # minimum per block of `stride` shingles; a paragraph is two consecutive blocks
+    stride = max(1, words // 2)
+    starts = np.arange(0, len(keys), stride)
+    a, b = _permutations(perms)
+    step = max(1, HASH_BLOCK_SHINGLES // stride) * stride
+    blocks = np.empty((perms, len(starts)), dtype=np.uint32)
+    for lo in range(0, len(keys), step):
+        chunk = keys[lo:lo + step]
+        with np.errstate(over='ignore'):
+            # high 32 bits of (a * x + b) mod 2^64 is a universal hash of x
+            hashed = ((a[:, None] * chunk[None, :] + b[:, None]) >> np.uint64(32)).astype(np.uint32)
+        blocks[:, lo // stride:(lo + len(chunk) + stride - 1) // stride] = \
+            np.minimum.reduceat(hashed, np.arange(0, len(chunk), stride), axis=1)
+    if blocks.shape[1] == 1:
+        signatures = blocks.T
+        first = starts
+    else:
+        signatures = np.minimum(blocks[:, :-1], blocks[:, 1:]).T
+        first = starts[:-1]
+    last = np.minimum(first + 2 * stride - 1 + SHINGLE_WORDS - 1, len(spans) - 1)
+    para_spans = np.stack([spans[first, 0], spans[last, 1]], axis=1)
+    return np.ascontiguousarray(signatures), para_spans
+
+
+def band_keys(signatures: np.ndarray, bands: int = LSH_BANDS, rows: int = LSH_ROWS) -> np.ndarray:
+    """LSH key of every band of every signature, shape (paragraphs, bands)."""
+    grouped = signatures.reshape(len(signatures), bands, rows)
+    return hash_rows(grouped, salt=np.arange(bands, dtype=np.uint64))
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Estimated Jaccard similarity of signatures a and b (row-wise)."""
+    return (np.asarray(a) == np.asarray(b)).mean(axis=-1)
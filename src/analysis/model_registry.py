@@ -0,0 +1,321 @@
+"""
+Model Registry
+==============
+Versioned detector models on disk, so a retrained model can be rolled out
+(and back) without restarting the API or its workers:
+
+    versions/v1/model.joblib    the pickled pipeline
+    versions/v1/model.flat/     its flat export, when there is one (see ai_detector.py)
+    versions/v1/meta.json       version, SHA-256, size, source, metrics, notes
+    versions/v2/...
+    CURRENT                     name of the version detect_ai serves
+    history.jsonl               one line per promotion and rollback, for rollback
+    shadow.json                 candidate version scored on a sample of traffic
+    shadow-v2.jsonl             primary vs. candidate score of every shadowed request
+
+A version directory is written under a temporary name and renamed into
+place, and CURRENT and shadow.json are replaced with os.replace, so a
+reader never sees a half-written model or pointer. Versions are never
+modified after registration.
+
+Every process running detect_ai watches CURRENT and shadow.json and swaps
+models in the background (ai_detector.current_model), so promote() takes
+effect within AI_MODEL_RELOAD_INTERVAL seconds everywhere.
+
+    python src/learning/manage_models.py register|promote|rollback|shadow|list ...
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+REGISTRY_DIR = os.environ.get('AI_MODEL_REGISTRY', os.path.join(BASE_DIR, 'data', 'models', 'registry'))
+
+MODEL_FILE = 'model.joblib'
+FLAT_DIR = 'model.flat'
+
+
+class RegistryError(Exception):
+    """Raised for invalid registry operations."""
+
+
+class UnknownVersionError(RegistryError):
+    """Raised when a model version is not registered."""
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _write_json(path: str, data):
+    tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _check_version(version: str):
+    if not version or os.sep in version or version.startswith('.'):
+        raise RegistryError(f"Invalid model version: {version!r}")
+
+
+def _stat_stamp(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class ModelRegistry:
+    """The registry in `root`; see the module docstring for the layout."""
+
+    def __init__(self, root: str = REGISTRY_DIR):
+        self.root = root
+        self.versions_dir = os.path.join(root, 'versions')
+        self._current = (None, None)  # (stamp of CURRENT, meta)
+        self._lock = threading.Lock()
+
+    # ---- versions ----
+
+    def version_dir(self, version: str) -> str:
+        return os.path.join(self.versions_dir, version)
+
+    def model_path(self, version: str) -> str:
+        return os.path.join(self.version_dir(version), MODEL_FILE)
+
+    def get(self, version: str) -> Dict:
+        """meta.json of `version`; RegistryError when it is not registered."""
+        _check_version(version)
+        try:
+            with open(os.path.join(self.version_dir(version), 'meta.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UnknownVersionError(f"Unknown model version: {version}")
+
+    def versions(self) -> List[Dict]:
+        """meta.json of every registered version, oldest first."""
+        if not os.path.isdir(self.versions_dir):
+            return []
+        metas = [self.get(name) for name in os.listdir(self.versions_dir)
+                 if not name.startswith('.') and os.path.exists(os.path.join(self.versions_dir, name, 'meta.json'))]
+        return sorted(metas, key=lambda m: (m['created'], m['version']))
+
+    def _next_version(self) -> str:
+        numbers = [int(name[1:]) for name in os.listdir(self.versions_dir)
+                   if name.startswith('v') and name[1:].isdigit()]
+        return f'v{max(numbers, default=0) + 1}'
+
+    def register(self, model_path: str, version: Optional[str] = None, metrics: Optional[Dict] = None,
+                 notes: str = '') -> Dict:
+        """
+        Copy the model file `model_path` (and its flat export, when it was
+        made from this file) into a new version and return its metadata.
+        Versions are numbered v1, v2, ... unless `version` is given.
+        """
+        if not os.path.isfile(model_path):
+            raise RegistryError(f"Model file not found: {model_path}")
+        if version is not None:
+            _check_version(version)
+        os.makedirs(self.versions_dir, exist_ok=True)
+        tmp = os.path.join(self.versions_dir, f'.tmp-{uuid.uuid4().hex}')
+        os.makedirs(tmp)
+        try:
+            shutil.copy2(model_path, os.path.join(tmp, MODEL_FILE))
+            sha256 = file_sha256(os.path.join(tmp, MODEL_FILE))
+            flat_dir = os.path.splitext(model_path)[0] + '.flat'
+            flat = False
+            try:
+                with open(os.path.join(flat_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+                    flat = json.load(f).get('model_sha256') == sha256
+            except (OSError, ValueError):
+                pass
+            if flat:
+                shutil.copytree(flat_dir, os.path.join(tmp, FLAT_DIR))
+            meta = {
+                'version': version,
+                'sha256': sha256,
+                'size': os.path.getsize(model_path),
+                'source': os.path.abspath(model_path),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'flat': flat,
+                'metrics': metrics or {},
+                'notes': notes,
+            }
+            while True:
+                name = version or self._next_version()
+                meta['version'] = name
+                _write_json(os.path.join(tmp, 'meta.json'), meta)
+                try:
+                    # fails when another process took the name first
+                    os.rename(tmp, self.version_dir(name))
+                    return meta
+                except OSError:
+                    if version is not None:
+                        raise RegistryError(f"Model version already exists: {version}")
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    # ---- the served version ----
+
+    def current(self) -> Optional[Dict]:
+        """Metadata of the promoted version, None before the first promotion.
+        CURRENT is re-read only when the file was replaced."""
+        path = os.path.join(self.root, 'CURRENT')
+        stamp = _stat_stamp(path)
+        with self._lock:
+            if stamp != self._current[0]:
+                meta = None
+                if stamp is not None:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        meta = self.get(f.read().strip())
+                self._current = (stamp, meta)
+            return self._current[1]
+
+    def promote(self, version: str) -> Dict:
+        """Make `version` the served model, atomically for every reader."""
+        return self._promote(version)
+
+    def _promote(self, version: str, rollback: bool = False) -> Dict:
+        meta = self.get(version)
+        if file_sha256(self.model_path(version)) != meta['sha256']:
+            raise RegistryError(f"Model file of {version} does not match its recorded SHA-256")
+        previous = self.current()
+        tmp = os.path.join(self.root, f'.CURRENT-{uuid.uuid4().hex}')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(version + '\n')
+        os.replace(tmp, os.path.join(self.root, 'CURRENT'))
+        with open(os.path.join(self.root, 'history.jsonl'), 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'version': version, 'previous': previous and previous['version'],
+                                'promoted': time.strftime('%Y-%m-%dT%H:%M:%S'), 'rollback': rollback}) + '\n')
+        print(("Rolled back to model " if rollback else "Promoted model ") + version
+              + (f" (was {previous['version']})" if previous else ""))
+        return meta
+
+    def _served(self) -> List[str]:
+        """The promoted versions still to roll back through, oldest first:
+        history.jsonl replayed with every promotion pushing its version and
+        every rollback popping the one it rolled back from."""
+        try:
+            with open(os.path.join(self.root, 'history.jsonl'), 'r', encoding='utf-8') as f:
+                history = [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            history = []
+        stack = []
+        for entry in history:
+            if entry.get('rollback'):
+                if stack:
+                    stack.pop()
+            elif not stack or stack[-1] != entry['version']:
+                stack.append(entry['version'])
+        return stack
+
+    def rollback(self) -> Dict:
+        """Promote the version that was served before the current one. Repeated
+        rollbacks walk further back through the promotions; a version that
+        was rolled back from is not returned to."""
+        current = self.current()
+        stack = self._served()
+        while stack and current and stack[-1] == current['version']:
+            stack.pop()
+        if not stack:
+            raise RegistryError("No earlier promoted version to roll back to")
+        return self._promote(stack[-1], rollback=True)
+
+    def stamp(self):
+        """Changes whenever CURRENT or shadow.json is replaced."""
+        return _stat_stamp(os.path.join(self.root, 'CURRENT')), _stat_stamp(os.path.join(self.root, 'shadow.json'))
+
+    # ---- shadow scoring ----
+
+    def shadow(self) -> Optional[Dict]:
+        """{'version': ..., 'rate': ...} of the shadowed candidate, or None."""
+        try:
+            with open(os.path.join(self.root, 'shadow.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def set_shadow(self, version: str, rate: float) -> Dict:
+        """Score a `rate` fraction of requests with `version` too, in the background."""
+        self.get(version)
+        if not 0 < rate <= 1:
+            raise RegistryError(f"Shadow rate must be in (0, 1], got {rate}")
+        config = {'version': version, 'rate': rate, 'started': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        os.makedirs(self.root, exist_ok=True)
+        _write_json(os.path.join(self.root, 'shadow.json'), config)
+        return config
+
+    def clear_shadow(self):
+        try:
+            os.remove(os.path.join(self.root, 'shadow.json'))
+        except FileNotFoundError:
+            pass
+
+    def _shadow_log(self, version: str) -> str:
+        return os.path.join(self.root, f'shadow-{version}.jsonl')
+
+    def record_shadow(self, version: str, record: Dict):
+        """Append one shadowed request to the candidate's log (one short
+        O_APPEND write, so workers can share the file)."""
+        with open(self._shadow_log(version), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+
+    def shadow_summary(self, version: str, threshold: float = 0.5) -> Dict:
+        """How the candidate's scores compare with the served model's over its log."""
+        primary, shadow, latency = [], [], []
+        try:
+            with open(self._shadow_log(version), 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # a line being written right now
+                    primary.append(record['primary_score'])
+                    shadow.append(record['shadow_score'])
+                    latency.append(record['shadow_ms'])
+        except FileNotFoundError:
+            pass
+        n = len(primary)
+        if not n:
+            return {'version': version, 'requests': 0}
+        return {
+            'version': version,
+            'requests': n,
+            'agreement': round(sum((p >= threshold) == (s >= threshold) for p, s in zip(primary, shadow)) / n, 4),
+            'mean_abs_diff': round(sum(abs(p - s) for p, s in zip(primary, shadow)) / n, 4),
+            'mean_primary_score': round(sum(primary) / n, 4),
+            'mean_shadow_score': round(sum(shadow) / n, 4),
+            'flagged_primary': sum(p >= threshold for p in primary),
+            'flagged_shadow': sum(s >= threshold for s in shadow),
+            'mean_shadow_ms': round(sum(latency) / n, 2),
+        }
+
+    def status(self) -> Dict:
+        current, shadow = self.current(), self.shadow()
+        return {
+            'root': self.root,
+            'current': current and current['version'],
+            'versions': self.versions(),
+            'shadow': shadow and {**shadow, 'summary': self.shadow_summary(shadow['version'])},
+        }
+
+
+_REGISTRY = None
+
+
+def get_registry() -> ModelRegistry:
+    global _REGISTRY
+    if _REGISTRY is None:
+        _REGISTRY = ModelRegistry()
+    return _REGISTRY
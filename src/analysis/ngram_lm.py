@@ -0,0 +1,276 @@
+"""
+N-gram Language Model
+=====================
+An interpolated Kneser-Ney n-gram model (trigram by default) that gives a
+real per-token perplexity and per-sentence surprisal, instead of the
+entropy/bigram proxy in GenAIFeatureExtractor.
+
+The model is trained offline (see learning/train_ngram_lm.py) and stored
+in a compact, array-backed directory:
+
+    keys.npy      uint64  hashed n-gram keys of every order, sorted
+    logprob.npy   uint16  quantized log2 P(w | context) of each n-gram
+    backoff.npy   uint16  quantized log2 backoff weight of each n-gram as a context
+    meta.json     order, quantization ranges, unknown-word probability, calibration
+
+The arrays are memory-mapped on load, so every worker process on a machine
+shares one copy through the page cache. Scoring turns a document into
+token hashes and looks up all n-grams with searchsorted, one vectorized
+pass per order.
+"""
+
+import json
+import math
+import os
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .document import as_document
+from .hashing import WORD_RE, token_hash, token_ids, ngram_keys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+LM_PATH = os.environ.get('NGRAM_LM_PATH', os.path.join(BASE_DIR, 'data', 'models', 'ngram_lm'))
+
+BOS = '<s>'
+EOS = '</s>'
+_QMAX = 65535
+
+
+def sentence_tokens(text) -> List[List[str]]:
+    """Lower-cased word tokens of every sentence of `text`."""
+    out = []
+    for sentence in as_document(text).sentences:
+        tokens = [t.lower() for t in WORD_RE.findall(sentence)]
+        if tokens:
+            out.append(tokens)
+    return out
+
+
+def _discount(counts: Counter) -> float:
+    """Kneser-Ney discount D = n1 / (n1 + 2 n2), 0.75 when it can't be estimated."""
+    n1 = sum(1 for c in counts.values() if c == 1)
+    n2 = sum(1 for c in counts.values() if c == 2)
+    if n1 == 0 or n2 == 0:
+        return 0.75
+    return min(0.95, max(0.1, n1 / (n1 + 2 * n2)))
+
+
+def train_kneser_ney(sentences: Iterable[Sequence[str]], order: int = 3):
+    """
+    Train an interpolated Kneser-Ney model.
+
+    Returns (entries, unk_logprob) where entries maps every n-gram tuple
+    to (log2 probability, log2 backoff weight), in the usual ARPA layout:
+    P(w | h) is the stored probability when (h, w) was seen and
+    backoff(h) + P(w | h[1:]) otherwise.
+    """
+    raw = [None] + [Counter() for _ in range(order)]
+    for tokens in sentences:
+        seq = [BOS] + list(tokens) + [EOS]
+        for k in range(1, order + 1):
+            for i in range(len(seq) - k + 1):
+                raw[k][tuple(seq[i:i + k])] += 1
+
+    # Lower orders use continuation counts (number of distinct left contexts),
+    # except n-grams starting with <s>, which can have no left context
+    counts = [None] * (order + 1)
+    counts[order] = raw[order]
+    for k in range(order - 1, 0, -1):
+        cont = Counter()
+        for gram in raw[k + 1]:
+            cont[gram[1:]] += 1
+        counts[k] = Counter({g: (c if g[0] == BOS else cont.get(g, 0)) for g, c in raw[k].items()})
+
+    probs = {}
+    backoffs = {}
+
+    # Unigrams, interpolated with a uniform distribution that also covers unknown words
+    unigrams = {g: c for g, c in counts[1].items() if g[0] != BOS}
+    total = sum(unigrams.values()) or 1
+    d1 = _discount(counts[1])
+    vocab = len(unigrams) + 1
+    gamma0 = d1 * sum(1 for c in unigrams.values() if c > 0) / total
+    for g, c in unigrams.items():
+        probs[g] = max(c - d1, 0) / total + gamma0 / vocab
+    unk_prob = gamma0 / vocab or 1e-9
+
+    for k in range(2, order + 1):
+        d = _discount(counts[k])
+        context_total = defaultdict(int)
+        context_types = defaultdict(int)
+        for g, c in counts[k].items():
+            context_total[g[:-1]] += c
+            if c > 0:
+                context_types[g[:-1]] += 1
+        for h, t in context_total.items():
+            if t > 0:
+                backoffs[h] = d * context_types[h] / t
+        for g, c in counts[k].items():
+            h = g[:-1]
+            t = context_total[h]
+            lower = probs.get(g[1:], unk_prob)
+            if t > 0:
+                probs[g] = max(c - d, 0) / t + backoffs[h] * lower
+            else:
+                probs[g] = lower
+
+    entries = {}
+    for g in set(probs) | set(backoffs):
+        p = probs.get(g)
+        lp = math.log2(p) if p else None
+        bo = math.log2(backoffs[g]) if backoffs.get(g) else 0.0
+        entries[g] = (lp, bo)
+    # <s> is only ever a context
+    entries[(BOS,)] = (None, entries.get((BOS,), (None, 0.0))[1])
+    return entries, math.log2(unk_prob)
+
+
+def _gram_key(gram: Tuple[str, ...]) -> int:
+    return int(ngram_keys(np.array([token_hash(t) for t in gram], dtype=np.uint64), len(gram))[0])
+
+
+def _quantize(values: np.ndarray, lo: float, hi: float) -> np.ndarray:
+    span = (hi - lo) or 1.0
+    return np.clip(np.rint((values - lo) / span * _QMAX), 0, _QMAX).astype(np.uint16)
+
+
+def save_model(entries, unk_logprob: float, path: str, order: int, calibration: Optional[Dict] = None):
+    """Write a trained model to the array-backed layout described above."""
+    os.makedirs(path, exist_ok=True)
+    grams = list(entries)
+    keys = np.array([_gram_key(g) for g in grams], dtype=np.uint64)
+    floor = unk_logprob - 10.0  # stands in for "never predicted" (<s>)
+    logprob = np.array([entries[g][0] if entries[g][0] is not None else floor for g in grams])
+    backoff = np.array([entries[g][1] for g in grams])
+
+    # duplicate keys would be hash collisions; keep the first one
+    keys, first = np.unique(keys, return_index=True)
+    logprob, backoff = logprob[first], backoff[first]
+
+    lp_range = (float(logprob.min(initial=floor)), 0.0)
+    bo_range = (float(backoff.min(initial=0.0)), float(backoff.max(initial=0.0)))
+    np.save(os.path.join(path, 'keys.npy'), keys)
+    np.save(os.path.join(path, 'logprob.npy'), _quantize(logprob, *lp_range))
+    np.save(os.path.join(path, 'backoff.npy'), _quantize(backoff, *bo_range))
+    meta = {
+        'order': order,
+        'ngrams': int(len(keys)),
+        'logprob_range': lp_range,
+        'backoff_range': bo_range,
+        'unk_logprob': unk_logprob,
+        'calibration': calibration or {},
+    }
+    with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+
+def set_calibration(path: str, calibration: Dict):
+    """Store the perplexity -> AI score calibration of a saved model."""
+    meta_path = os.path.join(path, 'meta.json')
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    meta['calibration'] = calibration
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+
+class NgramLanguageModel:
+    """A saved n-gram model, memory-mapped for scoring."""
+
+    def __init__(self, path: str, mmap: bool = True):
+        with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        mode = 'r' if mmap else None
+        self.keys = np.load(os.path.join(path, 'keys.npy'), mmap_mode=mode)
+        self._logprob = np.load(os.path.join(path, 'logprob.npy'), mmap_mode=mode)
+        self._backoff = np.load(os.path.join(path, 'backoff.npy'), mmap_mode=mode)
+        self.order = int(self.meta['order'])
+        self.unk_logprob = float(self.meta['unk_logprob'])
+        self.calibration = self.meta.get('calibration') or {}
+
+    def _dequantize(self, q: np.ndarray, rng) -> np.ndarray:
+        lo, hi = rng
+        return lo + q.astype(np.float64) / _QMAX * (hi - lo)
+
+    def _lookup(self, query: np.ndarray):
+        idx = np.searchsorted(self.keys, query)
+        idx = np.minimum(idx, len(self.keys) - 1)
+        found = self.keys[idx] == query
+        return found, idx
+
+    def token_logprobs(self, text) -> Tuple[np.ndarray, np.ndarray]:
+        """log2 P of every predicted token (each word and each sentence end)
+        plus the index of the sentence it belongs to."""
+        sentences = sentence_tokens(text)
+        if not sentences:
+            return np.empty(0), np.empty(0, dtype=np.int64)
+        lengths = np.array([len(s) + 2 for s in sentences])
+        ids = token_ids(t for s in sentences for t in [BOS] + s + [EOS])
+        starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        pos = np.arange(len(ids)) - starts
+        sentence = np.repeat(np.arange(len(sentences)), lengths)
+
+        lp_range = self.meta['logprob_range']
+        bo_range = self.meta['backoff_range']
+        uni = ngram_keys(ids, 1)
+        found, idx = self._lookup(uni)
+        result = np.where(found, self._dequantize(self._logprob[idx], lp_range), self.unk_logprob)
+        for k in range(2, self.order + 1):
+            valid = pos >= k - 1
+            grams = np.zeros(len(ids), dtype=np.uint64)
+            grams[k - 1:] = ngram_keys(ids, k)
+            context = np.zeros(len(ids), dtype=np.uint64)
+            context[k - 1:] = ngram_keys(ids, k - 1)[:len(ids) - k + 1]
+            g_found, g_idx = self._lookup(grams)
+            c_found, c_idx = self._lookup(context)
+            backoff = np.where(c_found, self._dequantize(self._backoff[c_idx], bo_range), 0.0)
+            stored = self._dequantize(self._logprob[g_idx], lp_range)
+            result = np.where(valid, np.where(g_found, stored, backoff + result), result)
+
+        predicted = pos >= 1
+        return result[predicted], sentence[predicted]
+
+    def score(self, text) -> Dict:
+        """Perplexity of the whole text and surprisal of each sentence."""
+        logprobs, sentence = self.token_logprobs(text)
+        if len(logprobs) == 0:
+            return {'tokens': 0, 'log2_perplexity': 0.0, 'perplexity': 0.0, 'sentence_surprisal': []}
+        log2_ppl = float(-logprobs.mean())
+        surprisal = np.bincount(sentence, weights=-logprobs)
+        per_sentence = surprisal / np.maximum(np.bincount(sentence), 1)
+        return {
+            'tokens': int(len(logprobs)),
+            'log2_perplexity': log2_ppl,
+            'perplexity': float(2 ** log2_ppl),
+            'sentence_surprisal': per_sentence.tolist(),  # mean bits per token of each sentence
+        }
+
+    def ai_score(self, log2_perplexity: float) -> float:
+        """Map log2 perplexity to 0-1: text more predictable than the reference
+        (human) corpus scores towards 1."""
+        center = float(self.calibration.get('center', 8.0))
+        scale = max(float(self.calibration.get('scale', 1.0)), 1e-6)
+        return 1.0 / (1.0 + 2 ** ((log2_perplexity - center) / scale))
+
+
+_MODEL = None
+_MODEL_LOADED = False
+_MODEL_LOCK = threading.Lock()
+
+
+def get_language_model(path: str = LM_PATH) -> Optional[NgramLanguageModel]:
+    """The model at LM_PATH, loaded once per process; None if it was never trained."""
+    global _MODEL, _MODEL_LOADED
+    if not _MODEL_LOADED:
+        with _MODEL_LOCK:
+            if not _MODEL_LOADED:
+                if os.path.exists(os.path.join(path, 'meta.json')):
+                    try:
+                        _MODEL = NgramLanguageModel(path)
+                    except Exception as e:
+                        print(f"Error loading n-gram model: {e}")
+                _MODEL_LOADED = True
+    return _MODEL
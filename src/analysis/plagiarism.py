@@ -1,29 +1,64 @@
 import os
-import re
 
+import numpy as np
 
-def check_plagiarism(text, corpus_dir):
-    """Naive plagiarism check: finds exact sentence matches in text files under corpus_dir.
-    Returns (score, matches)
+from .document import as_document
+from .plagiarism_shards import open_index
+
+# Share of a sentence's words that must be covered by corpus shingles for it to count as copied
+SENTENCE_COVERAGE = 0.5
+
+
+def analyze_plagiarism(text, index, exclude=()):
+    """Plagiarism check against a fingerprint index: a ShardedIndex handle
+    (see open_index) or, as before, the corpus directory whose .txt files
+    are indexed. `text` may be a string or an AnalyzedDocument. Documents
+    whose id is in `exclude` are not matched (e.g. the submission itself).
+
+    Returns a dict with 'score' (share of sentences longer than 8 words that
+    were mostly found in the corpus), 'matches' (those sentences),
+    'sources' (matching corpus documents with character offsets of every
+    shared passage, see PlagiarismIndex.search), 'passages' (the passages
+    of all those sources in submission order, each with its 'source' and
+    'source_id'), 'near_duplicates' (paraphrased or lightly edited
+    paragraphs with their estimated similarity, see
+    PlagiarismIndex.near_duplicates), 'similar_documents' (the corpus
+    documents closest in TF-IDF cosine similarity, see
+    PlagiarismIndex.similar_documents) and 'index_state' (ShardedIndex.state
+    of the index searched).
     """
-    if not text:
-        return 0.0, []
-    sentences = [s.strip() for s in re.split(r'[.!?]+', text) if s.strip()]
-    corpus_text = ''
-    if os.path.isdir(corpus_dir):
-        for fname in os.listdir(corpus_dir):
-            if fname.lower().endswith('.txt'):
-                try:
-                    with open(os.path.join(corpus_dir, fname), 'r', encoding='utf-8') as f:
-                        corpus_text += f.read() + '\n'
-                except Exception:
-                    continue
+    doc = as_document(text)
+    if not doc.text:
+        return {'score': 0.0, 'matches': [], 'sources': [], 'passages': [], 'near_duplicates': [],
+                'similar_documents': []}
+    if isinstance(index, (str, os.PathLike)):
+        index = open_index(os.fspath(index))
+    sentences = doc.sentences
+    index_state = index.state()
+    covered, sources, near_duplicates, similar_documents = index.analyze(doc, exclude=exclude)
+    token_starts = doc.index_tokens[1][:, 0]
     matches = []
-    for s in sentences:
+    for (start, end), s, length in zip(doc.sentence_spans, sentences, doc.sentence_lengths):
         # only consider longer sentences for match
-        if len(s.split()) > 8 and s in corpus_text:
+        if length <= 8:
+            continue
+        lo, hi = np.searchsorted(token_starts, [start, end])
+        if hi > lo and covered[lo:hi].mean() >= SENTENCE_COVERAGE:
             matches.append(s)
     score = 0.0
     if sentences:
         score = min(1.0, len(matches) / max(1, len(sentences)))
-    return round(score, 3), matches
+    passages = sorted(({**p, 'source': s['source'], 'source_id': s['source_id']}
+                       for s in sources for p in s['passages']), key=lambda p: (p['start'], -p['end']))
+    return {'score': round(score, 3), 'matches': matches, 'sources': sources, 'passages': passages,
+            'near_duplicates': near_duplicates, 'similar_documents': similar_documents, 'index_state': index_state}
+
+
+def check_plagiarism(text, index):
+    """Plagiarism check: finds sentences copied from the documents of `index`
+    (a ShardedIndex handle, or a corpus directory).
+    `text` may be a string or an AnalyzedDocument.
+    Returns (score, matches)
+    """
+    result = analyze_plagiarism(text, index)
+    return result['score'], result['matches']
@@ -0,0 +1,1027 @@
+"""
+Plagiarism Fingerprint Index
+============================
+A persistent index of the reference corpus for plagiarism checks, so a
+query costs time proportional to the submission instead of rescanning
+every corpus file.
+
+Documents are tokenized into lower-cased words and hashed into overlapping
+word n-grams (shingles). Winnowing keeps the minimum shingle hash of every
+window of WINNOW_WINDOW consecutive shingles, which guarantees that any
+passage of at least SHINGLE_SIZE + WINNOW_WINDOW - 1 shared words is found
+while storing only about 2 / (WINNOW_WINDOW + 1) of the shingles.
+
+An index is a directory holding a manifest and one or more segments:
+
+    manifest.json               settings, segment list, tombstones, signature of the synced corpus directory
+    seg-<id>/
+        hashes.npy              uint64  fingerprint hashes, sorted
+        docs.npy                uint32  document (within the segment) of each fingerprint
+        starts.npy              uint32  character offset where the fingerprint's shingle starts
+        ends.npy                uint32  character offset where it ends
+        para_signatures.npy     uint32  MinHash signature of every paragraph (see minhash.py)
+        para_docs.npy           uint32  document of each paragraph
+        para_spans.npy          uint32  character span of each paragraph
+        lsh_keys.npy            uint64  LSH band keys of all paragraphs, sorted
+        lsh_paragraphs.npy      uint32  paragraph of each band key
+        tfidf_*.npy             TF-IDF postings: terms, posting offsets, documents, counts, weights, max weights
+        tokens.npy              uint32  token hashes (low 32 bits) of all documents, for passage alignment
+        token_spans.npy         uint32  character span of each token
+        token_offsets.npy       uint64  position of every document's first token in tokens.npy
+        docs.jsonl              id, name, length and token count of each document, one per line
+        doc_offsets.npy         uint64  byte offset of every line of docs.jsonl
+        id_keys.npy             uint64  hash of every document id, sorted (see id_key)
+        id_rows.npy             uint32  document of each id hash
+    idf-<id>/                   TF-IDF IDF table the weights are computed with (see tfidf.py)
+    texts/                      ingested texts kept for rebuilds (add_documents(keep_text=True))
+
+Segment arrays are memory-mapped. A query hashes every shingle of the
+submission and looks it up with searchsorted, then extends the hits into
+maximal common passages against the source's stored tokens (see
+alignment.py), with character offsets in the submission and the source.
+Near-duplicate search does the same with the LSH band keys of the
+submission's paragraphs and keeps candidates whose signatures agree.
+Similar-document search ranks documents by TF-IDF cosine similarity with
+pruned top-k search over the postings of the submission's terms.
+
+The index grows incrementally: add_documents() writes the new documents
+as one more segment, delete_documents() records tombstones in the
+manifest, and segments are merged (dropping tombstoned documents) once
+there are more than MAX_SEGMENTS of them, or by compact(). The IDF table
+is refitted when the index is rebuilt or compacted, and once the index
+holds twice as many documents as it was fitted on, by a background thread
+of the process whose write crossed that line (refit), so no write waits
+for it.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .document import AnalyzedDocument, as_document
+from .hashing import ngram_keys
+from . import alignment, minhash, tfidf
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process write lock
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+INDEX_DIR = os.environ.get('PLAGIARISM_INDEX_DIR', os.path.join(BASE_DIR, 'data', 'index', 'plagiarism'))
+SHINGLE_SIZE = int(os.environ.get('PLAGIARISM_SHINGLE_SIZE', 5))
+WINNOW_WINDOW = int(os.environ.get('PLAGIARISM_WINNOW_WINDOW', 4))
+# Fingerprints shared by more documents than this are boilerplate and ignored in queries
+MAX_POSTINGS = int(os.environ.get('PLAGIARISM_MAX_POSTINGS', 1000))
+MAX_SOURCES = 10
+MAX_NEAR_DUPLICATES = 20
+# Seconds between checks of the manifest for changes made by other processes
+REFRESH_SECONDS = float(os.environ.get('PLAGIARISM_INDEX_REFRESH', 5))
+# Index new, changed and removed .txt files of the corpus directory in the background (pipeline/ingest.py)
+SYNC_CORPUS = os.environ.get('PLAGIARISM_SYNC_CORPUS', '1') != '0'
+# Segments allowed before the smaller half is merged
+MAX_SEGMENTS = int(os.environ.get('PLAGIARISM_MAX_SEGMENTS', 16))
+
+INDEX_FORMAT = 7
+
+
+def default_settings() -> Dict:
+    """Index settings from the environment; an index built with other settings is rebuilt."""
+    return {
+        'shingle_size': SHINGLE_SIZE,
+        'window': WINNOW_WINDOW,
+        'paragraph_words': minhash.PARAGRAPH_WORDS,
+        'lsh_bands': minhash.LSH_BANDS,
+        'lsh_rows': minhash.LSH_ROWS,
+    }
+
+
+def winnow(keys: np.ndarray, window: int = WINNOW_WINDOW) -> np.ndarray:
+    """Positions of the winnowing fingerprints of a sequence of shingle hashes:
+    the rightmost minimum of every window, each position reported once."""
+    n = len(keys)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    if n <= window:
+        return np.array([n - 1 - int(np.argmin(keys[::-1]))], dtype=np.int64)
+    windows = sliding_window_view(keys, window)
+    rightmost = window - 1 - np.argmin(windows[:, ::-1], axis=1)
+    return np.unique(np.arange(len(windows)) + rightmost)
+
+
+def shingles(doc: AnalyzedDocument, size: int = SHINGLE_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """Hash and (start, end) character span of every word shingle of `doc`."""
+    return token_shingles(doc.token_ids, doc.index_tokens[1], size)
+
+
+def token_shingles(ids: np.ndarray, spans: np.ndarray, size: int = SHINGLE_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """shingles() of a token sequence given as token hashes and character spans."""
+    keys = ngram_keys(ids, size)
+    if len(keys) == 0:
+        return keys, np.empty((0, 2), dtype=np.int64)
+    return keys, np.stack([spans[:len(keys), 0], spans[size - 1:, 1]], axis=1)
+
+
+def alignment_tokens(ids: np.ndarray) -> np.ndarray:
+    """The token hashes stored for passage alignment: their low 32 bits."""
+    return (np.asarray(ids, dtype=np.uint64) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def shingle_coverage(hit: np.ndarray, token_count: int, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """Boolean mask over `token_count` tokens, True where a token is part of a hit shingle."""
+    # each hit shingle covers its `size` tokens: mark them with a difference array
+    covered = np.zeros(token_count + 1, dtype=np.int64)
+    positions = np.flatnonzero(hit)
+    np.add.at(covered, positions, 1)
+    np.add.at(covered, positions + size, -1)
+    return np.cumsum(covered)[:-1] > 0
+
+
+def paragraph_signatures(doc: AnalyzedDocument, settings: Dict) -> Tuple[np.ndarray, np.ndarray]:
+    """MinHash signatures and spans of the paragraphs of `doc` for an index built with `settings`."""
+    return minhash.paragraph_signatures(doc, int(settings['lsh_bands']), int(settings['lsh_rows']),
+                                        int(settings['paragraph_words']))
+
+
+def shard_of(key: str, shards: int) -> int:
+    """Shard a document ID (or corpus file name) belongs to, out of `shards`."""
+    if shards <= 1:
+        return 0
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') % shards
+
+
+def id_key(doc_id: str) -> int:
+    """64-bit hash of a document ID, for the segments' sorted ID lookup table."""
+    return int.from_bytes(hashlib.blake2b(doc_id.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def corpus_signature(corpus_dir: str, shard: Optional[Tuple[int, int]] = None) -> List[Tuple[str, int, int]]:
+    """(name, mtime, size) of every .txt file in corpus_dir; with `shard` =
+    (i, n), only of the files that belong to shard i of n."""
+    sig = []
+    if not os.path.isdir(corpus_dir):
+        return sig
+    for fname in sorted(os.listdir(corpus_dir)):
+        if fname.lower().endswith('.txt') and (not shard or shard_of(fname, shard[1]) == shard[0]):
+            try:
+                st = os.stat(os.path.join(corpus_dir, fname))
+            except OSError:
+                continue
+            sig.append((fname, st.st_mtime_ns, st.st_size))
+    return sig
+
+
+class _WriteLock:
+    """Exclusive write lock on an index directory, shared between processes.
+    Readers never take it."""
+
+    def __init__(self, index_dir: str, name: str = '.lock'):
+        os.makedirs(index_dir, exist_ok=True)
+        self.path = os.path.join(index_dir, name)
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = open(self.path, 'a+')
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._fd.close()
+
+
+def write_segment(segment_dir: str, documents: Iterable[Tuple[str, str, str]], settings: Optional[Dict] = None,
+                  idf: Optional[tfidf.Idf] = None) -> int:
+    """Fingerprint (doc_id, name, text) triples into a new segment, with
+    TF-IDF weights from `idf`. Returns the number of documents."""
+    settings = settings or default_settings()
+    idf = idf or tfidf.Idf()
+    bands, rows = settings['lsh_bands'], settings['lsh_rows']
+    hashes, docs, starts, ends, meta = [], [], [], [], []
+    signatures, para_docs, para_spans = [], [], []
+    tokens, token_spans = [], []
+    posting_terms, posting_docs, posting_tf = [], [], []
+    for doc_id, name, text in documents:
+        doc = AnalyzedDocument(text)
+        keys, spans = shingles(doc, settings['shingle_size'])
+        picked = winnow(keys, settings['window'])
+        hashes.append(keys[picked])
+        starts.append(spans[picked, 0])
+        ends.append(spans[picked, 1])
+        docs.append(np.full(len(picked), len(meta), dtype=np.uint32))
+        sigs, sig_spans = paragraph_signatures(doc, settings)
+        signatures.append(sigs)
+        para_spans.append(sig_spans)
+        para_docs.append(np.full(len(sigs), len(meta), dtype=np.uint32))
+        tokens.append(alignment_tokens(doc.token_ids))
+        token_spans.append(doc.index_tokens[1])
+        terms, counts = doc.term_counts
+        posting_terms.append(terms)
+        posting_docs.append(np.full(len(terms), len(meta), dtype=np.uint32))
+        posting_tf.append(counts)
+        meta.append({'id': doc_id, 'name': name, 'chars': len(text), 'tokens': len(doc.token_ids)})
+
+    def join(parts, shape=(0,), dtype=np.uint32):
+        return np.concatenate(parts) if parts else np.empty(shape, dtype=dtype)
+
+    arrays = {
+        'hashes': join(hashes, dtype=np.uint64),
+        'docs': join(docs),
+        'starts': join(starts),
+        'ends': join(ends),
+        'para_signatures': join(signatures, (0, bands * rows)),
+        'para_docs': join(para_docs),
+        'para_spans': join(para_spans, (0, 2)),
+        'tokens': join(tokens),
+        'token_spans': join(token_spans, (0, 2)),
+        'posting_terms': join(posting_terms, dtype=np.uint64),
+        'posting_docs': join(posting_docs),
+        'posting_tf': join(posting_tf, dtype=np.float32),
+    }
+    _save_segment(segment_dir, arrays, meta, bands, rows, idf)
+    return len(meta)
+
+
+def _save_segment(segment_dir: str, arrays: Dict[str, np.ndarray], meta: List[Dict], bands: int, rows: int,
+                  idf: tfidf.Idf):
+    """Sort the fingerprints, add the LSH tables and TF-IDF postings and
+    write the segment directory (under a temporary name, renamed when
+    complete)."""
+    tmp_dir = segment_dir + '.tmp'
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    def save(name, values):
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), values)
+
+    order = np.argsort(arrays['hashes'], kind='stable')
+    save('hashes', arrays['hashes'][order].astype(np.uint64))
+    for name in ('docs', 'starts', 'ends'):
+        save(name, arrays[name][order].astype(np.uint32))
+
+    # paragraph signatures, and their LSH band keys sorted for lookup
+    signatures = arrays['para_signatures'].astype(np.uint32)
+    save('para_signatures', signatures)
+    save('para_docs', arrays['para_docs'].astype(np.uint32))
+    save('para_spans', arrays['para_spans'].astype(np.uint32))
+    band = minhash.band_keys(signatures, bands, rows).ravel()
+    order = np.argsort(band, kind='stable')
+    save('lsh_keys', band[order])
+    save('lsh_paragraphs', (order // bands).astype(np.uint32))
+
+    # tokens of every document, in document order
+    save('tokens', arrays['tokens'].astype(np.uint32))
+    save('token_spans', arrays['token_spans'].astype(np.uint32))
+    save('token_offsets', np.concatenate([[0], np.cumsum([d['tokens'] for d in meta], dtype=np.uint64)]).astype(np.uint64))
+
+    postings = tfidf.postings_arrays(arrays['posting_terms'].astype(np.uint64),
+                                     arrays['posting_docs'].astype(np.int64), arrays['posting_tf'], idf)
+    for name, values in postings.items():
+        save(name, values)
+
+    # document metadata is read line by line through a memory map, so it
+    # never has to be loaded whole however large the segment is
+    lines = [(json.dumps(d) + '\n').encode('utf-8') for d in meta]
+    with open(os.path.join(tmp_dir, 'docs.jsonl'), 'wb') as f:
+        f.writelines(lines)
+    save('doc_offsets', np.concatenate([[0], np.cumsum([len(line) for line in lines], dtype=np.uint64)]).astype(np.uint64))
+    # sorted ID hashes, so finding a document by ID is a binary search instead of a scan of docs.jsonl
+    keys = np.array([id_key(d['id']) for d in meta], dtype=np.uint64)
+    order = np.argsort(keys, kind='stable')
+    save('id_keys', keys[order])
+    save('id_rows', order.astype(np.uint32))
+    os.replace(tmp_dir, segment_dir)
+
+
+def _postings(sorted_keys: np.ndarray, keys: np.ndarray, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(query position, row) of every entry of sorted_keys equal to a query key.
+    Keys with more than `limit` entries are skipped."""
+    if len(sorted_keys) == 0 or len(keys) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    lo = np.searchsorted(sorted_keys, keys, side='left')
+    hi = np.searchsorted(sorted_keys, keys, side='right')
+    counts = hi - lo
+    counts[counts > limit] = 0
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    query_pos = np.repeat(np.arange(len(keys)), counts)
+    # row = lo[q] + rank of the hit among the hits of q
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    rows = np.repeat(lo, counts) + (np.arange(total) - first)
+    return query_pos, rows
+
+
+class Segment:
+    """One memory-mapped segment of an index."""
+
+    def __init__(self, path: str, deleted: Iterable[int] = ()):
+        self.path = path
+        self.name = os.path.basename(path)
+
+        def load(name):
+            return np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+
+        self.hashes = load('hashes')
+        self.docs = load('docs')
+        self.starts = load('starts')
+        self.ends = load('ends')
+        self.para_signatures = load('para_signatures')
+        self.para_docs = load('para_docs')
+        self.para_spans = load('para_spans')
+        self.lsh_keys = load('lsh_keys')
+        self.lsh_paragraphs = load('lsh_paragraphs')
+        self.tokens = load('tokens')
+        self.token_spans = load('token_spans')
+        self.token_offsets = load('token_offsets')
+        self.postings = tfidf.Postings(path)
+        self.doc_offsets = load('doc_offsets')
+        self.doc_count = len(self.doc_offsets) - 1
+        docs_path = os.path.join(path, 'docs.jsonl')
+        self._doc_bytes = np.memmap(docs_path, dtype=np.uint8, mode='r') if os.path.getsize(docs_path) else b''
+        # tombstoned documents stay in the arrays until compaction but are never returned
+        self.alive = np.ones(self.doc_count, dtype=bool)
+        self.alive[list(deleted)] = False
+        self.live_count = int(self.alive.sum())
+
+    def document(self, i: int) -> Dict:
+        """Metadata of document i of the segment."""
+        return json.loads(bytes(self._doc_bytes[int(self.doc_offsets[i]):int(self.doc_offsets[i + 1])]))
+
+    def document_tokens(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Alignment token hashes and character spans of document i of the segment."""
+        lo, hi = int(self.token_offsets[i]), int(self.token_offsets[i + 1])
+        return self.tokens[lo:hi], self.token_spans[lo:hi]
+
+    def without(self, rows: Iterable[int]) -> 'Segment':
+        """This segment with documents `rows` left out of queries too."""
+        seg = copy.copy(self)
+        seg.alive = self.alive.copy()
+        seg.alive[list(rows)] = False
+        seg.live_count = int(seg.alive.sum())
+        return seg
+
+    def _live(self, doc_of_row: np.ndarray, *columns: np.ndarray):
+        if self.live_count == self.doc_count:
+            return columns
+        keep = self.alive[doc_of_row]
+        return tuple(c[keep] for c in columns)
+
+    def lookup(self, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(query position, fingerprint row) of every fingerprint equal to a query key."""
+        query_pos, rows = _postings(self.hashes, keys, MAX_POSTINGS)
+        return self._live(self.docs[rows], query_pos, rows)
+
+    def similar_paragraphs(self, signatures: np.ndarray, band: np.ndarray,
+                           threshold: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(query paragraph, corpus paragraph, estimated similarity) of every
+        LSH candidate pair whose estimated Jaccard similarity is >= threshold."""
+        query_pos, rows = _postings(self.lsh_keys, band.ravel(), MAX_POSTINGS)
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+        pairs = np.unique(np.stack([query_pos // band.shape[1], self.lsh_paragraphs[rows]], axis=1), axis=0)
+        query, paragraph = self._live(self.para_docs[pairs[:, 1]], pairs[:, 0], pairs[:, 1])
+        sim = minhash.similarity(signatures[query], self.para_signatures[paragraph])
+        keep = sim >= threshold
+        return query[keep], paragraph[keep], sim[keep]
+
+
+def _covered_chars(passages: List[Dict]) -> int:
+    """Characters of the submission covered by `passages` (sorted by start), overlaps counted once."""
+    total, reach = 0, 0
+    for p in passages:
+        start = max(p['start'], reach)
+        if p['end'] > start:
+            total += p['end'] - start
+        reach = max(reach, p['end'])
+    return total
+
+
+class PlagiarismIndex:
+    """A fingerprint index directory opened for queries."""
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        self.index_dir = index_dir
+        self.manifest = self._read_manifest(index_dir) or {}
+        self.settings = self.manifest.get('settings') or default_settings()
+        self.shingle_size = int(self.settings['shingle_size'])
+        deleted = self.manifest.get('deleted', {})
+        self.segments = [Segment(os.path.join(index_dir, name), deleted.get(name, ()))
+                         for name in self.manifest.get('segments', [])]
+        fitted = self.manifest.get('tfidf') or {'idf': None, 'documents': 0}
+        self.idf = tfidf.Idf.load(os.path.join(index_dir, fitted['idf']) if fitted['idf'] else None,
+                                  fitted['documents'])
+
+    @staticmethod
+    def _read_manifest(index_dir: str) -> Optional[Dict]:
+        try:
+            with open(os.path.join(index_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def document_count(self) -> int:
+        return sum(seg.live_count for seg in self.segments)
+
+    def excluding(self, ids: Iterable[str]) -> 'PlagiarismIndex':
+        """This index with the documents `ids` left out of queries, e.g. a
+        submission's own earlier copy (see pipeline/ingest.submission_id)."""
+        ids = set(ids)
+        segments = []
+        for seg in self.segments:
+            rows = _find_rows(seg.path, ids) if ids else []
+            segments.append(seg.without(rows) if rows else seg)
+        if all(a is b for a, b in zip(segments, self.segments)):
+            return self
+        index = copy.copy(self)
+        index.segments = segments
+        return index
+
+    def search(self, text, max_sources: int = MAX_SOURCES) -> Tuple[np.ndarray, List[Dict]]:
+        """
+        Find corpus documents sharing passages with `text` (string or
+        AnalyzedDocument).
+
+        Returns (coverage, sources). coverage is a boolean mask over the
+        submission's index tokens, True where the token is part of a shingle
+        found in the corpus. sources holds up to `max_sources` documents,
+        most matched text first, each as {'source', 'source_id',
+        'matched_chars', 'passages': [{'start', 'end', 'source_start',
+        'source_end', 'words'}, ...]}: the maximal passages the submission
+        shares with the source, with character offsets into both.
+        """
+        doc = as_document(text)
+        hit, sources = self.search_tokens(doc.token_ids, doc.index_tokens[1], max_sources)
+        return shingle_coverage(hit, len(doc.token_ids), self.shingle_size), sources
+
+    def search_tokens(self, ids: np.ndarray, spans: np.ndarray,
+                      max_sources: int = MAX_SOURCES) -> Tuple[np.ndarray, List[Dict]]:
+        """search() on a tokenized submission (token hashes and character
+        spans): returns a boolean mask of the submission's shingles found
+        in the corpus and the matching sources."""
+        keys, _ = token_shingles(ids, spans, self.shingle_size)
+        query_tokens = alignment_tokens(ids)
+        hit = np.zeros(len(keys), dtype=bool)
+        sources = []
+        for seg in self.segments:
+            query_pos, rows = seg.lookup(keys)
+            if len(rows) == 0:
+                continue
+            hit[query_pos] = True
+            docs = np.asarray(seg.docs[rows])
+            src_starts = np.asarray(seg.starts[rows], dtype=np.int64)
+            order = np.lexsort((query_pos, docs))
+            docs, query_pos, src_starts = docs[order], query_pos[order], src_starts[order]
+            bounds = np.flatnonzero(np.diff(docs)) + 1
+            for part in np.split(np.arange(len(docs)), bounds):
+                i = int(docs[part[0]])
+                source_tokens, source_spans = seg.document_tokens(i)
+                # fingerprints start on a token: their character offset gives the token position
+                seeds = np.searchsorted(source_spans[:, 0], src_starts[part])
+                aligned = alignment.align(query_tokens, source_tokens, query_pos[part], seeds, self.shingle_size)
+                if len(aligned) == 0:
+                    continue
+                passages = [{
+                    'start': int(spans[q0, 0]), 'end': int(spans[q1 - 1, 1]),
+                    'source_start': int(source_spans[s0, 0]), 'source_end': int(source_spans[s1 - 1, 1]),
+                    'words': int(q1 - q0),
+                } for q0, q1, s0, s1 in aligned.tolist()]
+                meta = seg.document(i)
+                sources.append({
+                    'source': meta['name'],
+                    'source_id': meta['id'],
+                    'matched_chars': _covered_chars(passages),
+                    'passages': passages,
+                })
+        sources.sort(key=lambda s: s['matched_chars'], reverse=True)
+        return hit, sources[:max_sources]
+
+    def similar_documents(self, text, k: int = tfidf.SIMILAR_DOCUMENTS,
+                          min_similarity: float = tfidf.MIN_SIMILARITY) -> List[Dict]:
+        """
+        The up to `k` documents most similar to `text` (string or
+        AnalyzedDocument) by TF-IDF cosine similarity, best first, each as
+        {'source', 'source_id', 'similarity'}; documents below
+        `min_similarity` are left out.
+        """
+        terms, counts = as_document(text).term_counts
+        return self.similar_terms(terms, counts, k, min_similarity)
+
+    def similar_terms(self, terms: np.ndarray, counts: np.ndarray, k: int = tfidf.SIMILAR_DOCUMENTS,
+                      min_similarity: float = tfidf.MIN_SIMILARITY) -> List[Dict]:
+        """similar_documents() of a submission given as term hashes and counts (see tfidf.term_counts)."""
+        # like a vectorizer's transform, ignore terms outside the vocabulary (no indexed document has them)
+        known = tfidf.lookup(self.idf.terms, terms)[1]
+        for seg in self.segments:
+            known |= tfidf.lookup(seg.postings.terms, terms)[1]
+        terms, counts = terms[known], counts[known]
+        q = tfidf.query_vector(terms, counts, self.idf)
+        found = []  # (score, segment, document), best first
+        for seg in self.segments:
+            # documents must beat the k-th best score so far
+            threshold = found[k - 1][0] if len(found) >= k else min_similarity - 1e-9
+            alive = None if seg.live_count == seg.doc_count else seg.alive
+            found.extend((score, seg, doc) for score, doc in tfidf.top_k(seg.postings, alive, terms, q, k, threshold))
+            found.sort(key=lambda f: f[0], reverse=True)
+            found = found[:k]
+        similar = []
+        for score, seg, doc in found:
+            meta = seg.document(doc)
+            similar.append({'source': meta['name'], 'source_id': meta['id'], 'similarity': round(score, 4)})
+        return similar
+
+    def query(self, text, max_sources: int = MAX_SOURCES) -> List[Dict]:
+        """Matching sources only, see search()."""
+        return self.search(text, max_sources)[1]
+
+    def near_duplicates(self, text, threshold: float = minhash.NEAR_DUPLICATE_THRESHOLD,
+                        limit: int = MAX_NEAR_DUPLICATES) -> List[Dict]:
+        """
+        Paragraphs of `text` whose MinHash-estimated Jaccard similarity to a
+        corpus paragraph is at least `threshold`, found through the LSH
+        band keys (exact key lookups, so sub-linear in the corpus size).
+
+        Returns up to `limit` passages, most similar first, each as
+        {'source', 'similarity', 'start', 'end', 'source_start',
+        'source_end'}; overlapping paragraphs matching the same source are
+        merged.
+        """
+        doc = as_document(text)
+        signatures, spans = paragraph_signatures(doc, self.settings)
+        return self.near_duplicate_paragraphs(signatures, spans, threshold, limit)
+
+    def near_duplicate_paragraphs(self, signatures: np.ndarray, spans: np.ndarray,
+                                  threshold: float = minhash.NEAR_DUPLICATE_THRESHOLD,
+                                  limit: int = MAX_NEAR_DUPLICATES) -> List[Dict]:
+        """near_duplicates() on precomputed paragraph signatures (see paragraph_signatures())."""
+        if len(signatures) == 0:
+            return []
+        band = minhash.band_keys(signatures, int(self.settings['lsh_bands']), int(self.settings['lsh_rows']))
+        found = []
+        for seg in self.segments:
+            query, paragraph, sim = seg.similar_paragraphs(signatures, band, threshold)
+            for q, p, value in zip(query.tolist(), paragraph.tolist(), sim.tolist()):
+                found.append((seg.document(int(seg.para_docs[p]))['name'], q, value,
+                              int(seg.para_spans[p, 0]), int(seg.para_spans[p, 1])))
+
+        # best corpus paragraph per (source, submission paragraph), then merge runs of overlapping ones
+        best = {}
+        for source, q, value, r0, r1 in found:
+            if (source, q) not in best or value > best[(source, q)][0]:
+                best[(source, q)] = (value, r0, r1)
+        passages = []
+        last = {}
+        for (source, q), (value, r0, r1) in sorted(best.items()):
+            s0, s1 = int(spans[q, 0]), int(spans[q, 1])
+            cur = last.get(source)
+            if cur and s0 <= cur['end']:
+                cur['end'] = max(cur['end'], s1)
+                cur['source_start'] = min(cur['source_start'], r0)
+                cur['source_end'] = max(cur['source_end'], r1)
+                cur['similarity'] = max(cur['similarity'], round(value, 3))
+            else:
+                cur = {'source': source, 'similarity': round(value, 3), 'start': s0, 'end': s1,
+                       'source_start': r0, 'source_end': r1}
+                passages.append(cur)
+                last[source] = cur
+        passages.sort(key=lambda p: p['similarity'], reverse=True)
+        return passages[:limit]
+
+
+# ---- writing ----
+#
+# Segments are immutable once written. Every change (adding documents,
+# tombstoning them, merging segments) writes new segments first and then
+# swaps in a new manifest with os.replace, so readers always see either the
+# old or the new index and never wait for a writer. Writers are serialized
+# by a lock file in the index directory.
+
+def _read_manifest(index_dir: str) -> Optional[Dict]:
+    return PlagiarismIndex._read_manifest(index_dir)
+
+
+def _new_manifest(settings: Dict, shard: Optional[Tuple[int, int]] = None) -> Dict:
+    return {
+        'format': INDEX_FORMAT,
+        'settings': settings,
+        'shard': list(shard) if shard else None,
+        'segments': [],
+        'segment_documents': {},
+        'deleted': {},
+        'corpus_dir': None,
+        'corpus_signature': [],
+        'tfidf': {'idf': None, 'documents': 0},
+    }
+
+
+def _usable(manifest: Optional[Dict]) -> bool:
+    return bool(manifest) and manifest.get('format') == INDEX_FORMAT and manifest.get('settings') == default_settings()
+
+
+# index_dir -> (PlagiarismIndex, time of the last freshness check)
+_INDEXES: Dict[str, Tuple[PlagiarismIndex, float]] = {}
+_INDEX_LOCK = threading.RLock()
+
+
+def _write_manifest(index_dir: str, manifest: Dict):
+    manifest['documents'] = sum(manifest['segment_documents'].values()) - \
+        sum(len(v) for v in manifest['deleted'].values())
+    manifest['updated_at'] = time.time()
+    tmp = os.path.join(index_dir, f'manifest.json.{os.getpid()}.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(index_dir, 'manifest.json'))
+    # this process sees its own writes at once, others within REFRESH_SECONDS
+    with _INDEX_LOCK:
+        _INDEXES.pop(index_dir, None)
+
+
+def _remove_segments(index_dir: str, names: Iterable[str]):
+    # readers that opened these segments keep their mappings after the files are removed
+    for name in names:
+        if name:
+            shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+
+def _text_path(index_dir: str, doc_id: str) -> str:
+    return os.path.join(index_dir, 'texts', hashlib.sha1(doc_id.encode('utf-8')).hexdigest() + '.json')
+
+
+def _find_rows(segment_dir: str, ids: Iterable[str]) -> List[int]:
+    """Documents of a segment whose id is in `ids`: a binary search of the
+    segment's sorted id hashes, confirmed against docs.jsonl, so the cost
+    does not grow with the segment."""
+    ids = set(ids)
+    if not ids:
+        return []
+    keys = np.load(os.path.join(segment_dir, 'id_keys.npy'), mmap_mode='r')
+    if len(keys) == 0:
+        return []
+    wanted = np.array(sorted(id_key(doc_id) for doc_id in ids), dtype=np.uint64)
+    lo = np.searchsorted(keys, wanted, side='left')
+    hi = np.searchsorted(keys, wanted, side='right')
+    candidates = [i for a, b in zip(lo.tolist(), hi.tolist()) for i in range(a, b)]
+    if not candidates:
+        return []
+    rows = np.load(os.path.join(segment_dir, 'id_rows.npy'), mmap_mode='r')
+    offsets = np.load(os.path.join(segment_dir, 'doc_offsets.npy'), mmap_mode='r')
+    found = []
+    with open(os.path.join(segment_dir, 'docs.jsonl'), 'rb') as f:
+        for i in candidates:
+            row = int(rows[i])
+            f.seek(int(offsets[row]))
+            if json.loads(f.read(int(offsets[row + 1] - offsets[row])))['id'] in ids:
+                found.append(row)
+    return found
+
+
+def _locate(index_dir: str, manifest: Dict, ids: Iterable[str]) -> List[Tuple[str, int]]:
+    """(segment, position) of every live document whose id is in `ids`."""
+    ids = set(ids)
+    found = []
+    for name in manifest['segments']:
+        deleted = set(manifest['deleted'].get(name, ()))
+        found.extend((name, i) for i in _find_rows(os.path.join(index_dir, name), ids) if i not in deleted)
+    return found
+
+
+def _delete(index_dir: str, manifest: Dict, ids: Iterable[str]) -> int:
+    located = _locate(index_dir, manifest, ids)
+    for name, i in located:
+        manifest['deleted'].setdefault(name, []).append(i)
+    return len(located)
+
+
+def _idf(index_dir: str, manifest: Dict) -> tfidf.Idf:
+    fitted = manifest['tfidf']
+    return tfidf.Idf.load(os.path.join(index_dir, fitted['idf']) if fitted['idf'] else None, fitted['documents'])
+
+
+def _add(index_dir: str, manifest: Dict, documents: List[Tuple[str, str, str]]) -> int:
+    """Write `documents` as one new segment; documents with an id already in
+    the index replace the old version."""
+    if not documents:
+        return 0
+    _delete(index_dir, manifest, [doc_id for doc_id, _, _ in documents])
+    segment = f'seg-{uuid.uuid4().hex[:12]}'
+    count = write_segment(os.path.join(index_dir, segment), documents, manifest['settings'], _idf(index_dir, manifest))
+    manifest['segments'].append(segment)
+    manifest['segment_documents'][segment] = count
+    return count
+
+
+def _merge(index_dir: str, manifest: Dict, names: List[str], refit: bool = False) -> List[str]:
+    """Merge segments `names` into one new segment, dropping tombstoned
+    documents. Arrays are merged directly; no document is re-read. With
+    `refit` (only when merging all segments) the IDF table is refitted on
+    the merged documents. Returns the directories replaced."""
+    settings = manifest['settings']
+    parts = {key: [] for key in ('hashes', 'docs', 'starts', 'ends', 'para_signatures', 'para_docs', 'para_spans',
+                                 'tokens', 'token_spans', 'posting_terms', 'posting_docs', 'posting_tf')}
+    parts['tokens'].append(np.empty(0, dtype=np.uint32))
+    parts['token_spans'].append(np.empty((0, 2), dtype=np.uint32))
+    meta = []
+    for name in names:
+        seg = Segment(os.path.join(index_dir, name), manifest['deleted'].get(name, ()))
+        # new position of every live document of the segment
+        remap = np.cumsum(seg.alive).astype(np.int64) - 1 + len(meta)
+        keep = seg.alive[seg.docs]
+        parts['hashes'].append(np.asarray(seg.hashes)[keep])
+        parts['docs'].append(remap[np.asarray(seg.docs)[keep]])
+        parts['starts'].append(np.asarray(seg.starts)[keep])
+        parts['ends'].append(np.asarray(seg.ends)[keep])
+        keep = seg.alive[seg.para_docs]
+        parts['para_signatures'].append(np.asarray(seg.para_signatures)[keep])
+        parts['para_docs'].append(remap[np.asarray(seg.para_docs)[keep]])
+        parts['para_spans'].append(np.asarray(seg.para_spans)[keep])
+        keep = seg.alive[seg.postings.docs]
+        parts['posting_terms'].append(seg.postings.posting_terms()[keep])
+        parts['posting_docs'].append(remap[np.asarray(seg.postings.docs)[keep]])
+        parts['posting_tf'].append(np.asarray(seg.postings.tf)[keep])
+        for i in np.flatnonzero(seg.alive):
+            ids, spans = seg.document_tokens(i)
+            parts['tokens'].append(np.asarray(ids))
+            parts['token_spans'].append(np.asarray(spans))
+            meta.append(seg.document(i))
+    arrays = {key: np.concatenate(values) for key, values in parts.items()}
+    replaced = list(names)
+    if refit:
+        old = manifest['tfidf']['idf']
+        name = f'idf-{uuid.uuid4().hex[:12]}'
+        tfidf.fit_idf(arrays['posting_terms'], len(meta)).save(os.path.join(index_dir, name))
+        manifest['tfidf'] = {'idf': name, 'documents': len(meta)}
+        replaced += [old] if old else []
+    segment = f'seg-{uuid.uuid4().hex[:12]}'
+    _save_segment(os.path.join(index_dir, segment), arrays, meta, settings['lsh_bands'], settings['lsh_rows'],
+                  _idf(index_dir, manifest))
+
+    first = min(manifest['segments'].index(name) for name in names)
+    manifest['segments'] = [n for n in manifest['segments'] if n not in names]
+    manifest['segments'].insert(first, segment)
+    for name in names:
+        manifest['segment_documents'].pop(name, None)
+        manifest['deleted'].pop(name, None)
+    manifest['segment_documents'][segment] = len(meta)
+    return replaced
+
+
+def _maybe_merge(index_dir: str, manifest: Dict) -> List[str]:
+    """Keep the segment count bounded: once there are more than MAX_SEGMENTS,
+    merge the smaller half. Returns the directories replaced."""
+    if len(manifest['segments']) <= MAX_SEGMENTS:
+        return []
+    sizes = manifest['segment_documents']
+    smallest = sorted(manifest['segments'], key=lambda n: sizes.get(n, 0))[:len(manifest['segments']) // 2 + 1]
+    return _merge(index_dir, manifest, smallest)
+
+
+def _needs_refit(manifest: Dict) -> bool:
+    """Whether the index has grown to twice the documents its IDF table was
+    fitted on (refitting then is amortized, like doubling a growing array)."""
+    live = sum(manifest['segment_documents'].values()) - sum(len(v) for v in manifest['deleted'].values())
+    return bool(manifest['segments']) and live > 2 * manifest['tfidf']['documents']
+
+
+def refit(index_dir: str) -> bool:
+    """Merge all segments and refit the IDF table if the index has outgrown
+    it (_needs_refit). Returns whether it did."""
+    with _WriteLock(index_dir):
+        manifest = _read_manifest(index_dir)
+        if not manifest or not _needs_refit(manifest):
+            return False
+        replaced = _merge(index_dir, manifest, list(manifest['segments']), refit=True)
+        _write_manifest(index_dir, manifest)
+        _remove_segments(index_dir, replaced)
+        return True
+
+
+_REFITTING = set()
+_REFITTING_LOCK = threading.Lock()
+
+
+def _refit_in_background(index_dir: str):
+    """refit() on a daemon thread, at most one per index directory and process."""
+    with _REFITTING_LOCK:
+        if index_dir in _REFITTING:
+            return
+        _REFITTING.add(index_dir)
+
+    def run():
+        try:
+            refit(index_dir)
+        except Exception as e:
+            print(f"Refitting the IDF table of {index_dir} failed: {e}")
+        finally:
+            with _REFITTING_LOCK:
+                _REFITTING.discard(index_dir)
+
+    threading.Thread(target=run, name='idf-refit', daemon=True).start()
+
+
+def _read_corpus_files(corpus_dir: str, names: Iterable[str]) -> List[Tuple[str, str, str]]:
+    documents = []
+    for fname in names:
+        try:
+            with open(os.path.join(corpus_dir, fname), 'r', encoding='utf-8') as f:
+                documents.append((fname, fname, f.read()))
+        except Exception:
+            continue
+    return documents
+
+
+def _sync(corpus_dir: str, index_dir: str, manifest: Dict) -> Tuple[int, int]:
+    """Bring the .txt files of corpus_dir up to date in the index: index new
+    and modified files, tombstone removed ones. Returns (added, removed)."""
+    signature = corpus_signature(corpus_dir, manifest.get('shard'))
+    old = {name: (mtime, size) for name, mtime, size in manifest.get('corpus_signature', [])}
+    current = {name: (mtime, size) for name, mtime, size in signature}
+    changed = [name for name in current if old.get(name) != current[name]]
+    removed = [name for name in old if name not in current]
+    _delete(index_dir, manifest, removed)
+    added = _add(index_dir, manifest, _read_corpus_files(corpus_dir, changed))
+    manifest['corpus_dir'] = os.path.abspath(corpus_dir)
+    manifest['corpus_signature'] = signature
+    return added, len(removed)
+
+
+def _rebuild(corpus_dir: Optional[str], index_dir: str, shard: Optional[Tuple[int, int]] = None) -> Dict:
+    """Index everything from scratch with the current settings: the corpus
+    files (of `shard`, if the index is one shard of a ShardedIndex) plus
+    every stored ingested text. Returns the new manifest."""
+    started = time.time()
+    old = _read_manifest(index_dir) or {}
+    manifest = _new_manifest(default_settings(), shard or old.get('shard'))
+    documents = []
+    text_dir = os.path.join(index_dir, 'texts')
+    if os.path.isdir(text_dir):
+        for fname in sorted(os.listdir(text_dir)):
+            with open(os.path.join(text_dir, fname), 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            documents.append((stored['id'], stored['name'], stored['text']))
+    _add(index_dir, manifest, documents)
+    if corpus_dir:
+        _sync(corpus_dir, index_dir, manifest)
+    replaced = _merge(index_dir, manifest, list(manifest['segments']), refit=True) if manifest['segments'] else []
+    _write_manifest(index_dir, manifest)
+    _remove_segments(index_dir, replaced + old.get('segments', []) + [(old.get('tfidf') or {}).get('idf')])
+    print(f"Indexed {manifest['documents']} documents in {time.time() - started:.2f}s")
+    return manifest
+
+
+def build_index(corpus_dir: Optional[str], index_dir: str = INDEX_DIR,
+                shard: Optional[Tuple[int, int]] = None) -> Dict:
+    """Rebuild the index of corpus_dir (and the stored ingested documents)
+    from scratch. `shard` = (i, n) limits the corpus files to those of shard
+    i of n (see shard_of); it is kept in the manifest for later syncs."""
+    with _WriteLock(index_dir):
+        return _rebuild(corpus_dir, index_dir, shard)
+
+
+def _writable_manifest(index_dir: str) -> Dict:
+    manifest = _read_manifest(index_dir)
+    if not _usable(manifest):
+        manifest = _rebuild(manifest.get('corpus_dir') if manifest else None, index_dir)
+    return manifest
+
+
+def add_documents(index_dir: str, documents: Iterable[Tuple[str, str, str]], keep_text: bool = False) -> int:
+    """
+    Index (doc_id, name, text) triples as a new segment; the cost depends
+    only on the new documents. A document whose id is already indexed is
+    replaced. With keep_text the texts are stored in the index directory so
+    a rebuild (e.g. after a settings change) keeps them.
+    Returns the number of documents added.
+    """
+    documents = list(documents)
+    with _WriteLock(index_dir):
+        manifest = _writable_manifest(index_dir)
+        count = _add(index_dir, manifest, documents)
+        merged = _maybe_merge(index_dir, manifest)
+        if keep_text:
+            os.makedirs(os.path.join(index_dir, 'texts'), exist_ok=True)
+            for doc_id, name, text in documents:
+                with open(_text_path(index_dir, doc_id), 'w', encoding='utf-8') as f:
+                    json.dump({'id': doc_id, 'name': name, 'text': text}, f)
+        _write_manifest(index_dir, manifest)
+        _remove_segments(index_dir, merged)
+    if _needs_refit(manifest):
+        _refit_in_background(index_dir)
+    return count
+
+
+def contains(index_dir: str, doc_id: str) -> bool:
+    """Whether a live document with id `doc_id` is in the index."""
+    manifest = _read_manifest(index_dir)
+    return bool(manifest) and bool(_locate(index_dir, manifest, [doc_id]))
+
+
+def delete_documents(index_dir: str, ids: Iterable[str]) -> int:
+    """Tombstone every document with one of `ids`; they disappear from
+    queries immediately and from disk at the next compaction.
+    Returns the number of documents deleted."""
+    ids = list(ids)
+    with _WriteLock(index_dir):
+        manifest = _read_manifest(index_dir)
+        if not manifest:
+            return 0
+        count = _delete(index_dir, manifest, ids)
+        for doc_id in ids:
+            try:
+                os.remove(_text_path(index_dir, doc_id))
+            except OSError:
+                pass
+        # deleted corpus files stay deleted until they are modified again
+        if count:
+            _write_manifest(index_dir, manifest)
+    return count
+
+
+def compact(index_dir: str) -> Dict:
+    """Merge all segments into one and drop tombstoned documents. Returns the manifest."""
+    with _WriteLock(index_dir):
+        manifest = _read_manifest(index_dir)
+        if not manifest or not manifest['segments']:
+            return manifest or {}
+        replaced = _merge(index_dir, manifest, list(manifest['segments']), refit=True)
+        _write_manifest(index_dir, manifest)
+        _remove_segments(index_dir, replaced)
+        return manifest
+
+
+def sync_corpus(corpus_dir: str, index_dir: str) -> Tuple[int, int]:
+    """Incrementally index changes to the .txt files of corpus_dir. Returns (added, removed)."""
+    with _WriteLock(index_dir):
+        manifest = _read_manifest(index_dir)
+        if not _usable(manifest):
+            manifest = _rebuild(corpus_dir, index_dir)
+            return manifest['documents'], 0
+        if not _corpus_changed(manifest, corpus_dir):
+            return 0, 0
+        result = _sync(corpus_dir, index_dir, manifest)
+        merged = _maybe_merge(index_dir, manifest)
+        _write_manifest(index_dir, manifest)
+        _remove_segments(index_dir, merged)
+    if _needs_refit(manifest):
+        _refit_in_background(index_dir)
+    return result
+
+
+def default_index_dir(corpus_dir: str) -> str:
+    """INDEX_DIR for the bundled corpus, a per-corpus subdirectory for any other."""
+    if os.path.abspath(corpus_dir) == os.path.join(BASE_DIR, 'data'):
+        return INDEX_DIR
+    digest = hashlib.sha1(os.path.abspath(corpus_dir).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(INDEX_DIR, 'corpora', digest)
+
+
+def _corpus_changed(manifest: Dict, corpus_dir: str) -> bool:
+    return [tuple(s) for s in manifest.get('corpus_signature', [])] != \
+        [tuple(s) for s in corpus_signature(corpus_dir, manifest.get('shard'))]
+
+
+def ensure_index(corpus_dir: Optional[str], index_dir: str) -> Dict:
+    """Build the index if it is missing or has stale settings (from
+    corpus_dir and the stored ingested texts). Returns the current manifest.
+    Changes to corpus_dir are not looked for here: queries only read the
+    manifest, and sync_corpus() picks them up (see pipeline/ingest.py)."""
+    manifest = _read_manifest(index_dir)
+    if _usable(manifest):
+        return manifest
+    with _WriteLock(index_dir):
+        # another process may have built it while we waited for the lock
+        if not _usable(_read_manifest(index_dir)):
+            _rebuild(corpus_dir, index_dir)
+    return _read_manifest(index_dir)
+
+
+def get_index(corpus_dir: Optional[str], index_dir: Optional[str] = None) -> PlagiarismIndex:
+    """The index of corpus_dir, opened once per process and reopened when the
+    manifest changes (checked at most every REFRESH_SECONDS). It is built on
+    first use (see ensure_index)."""
+    index_dir = index_dir or default_index_dir(corpus_dir)
+    with _INDEX_LOCK:
+        index, checked = _INDEXES.get(index_dir, (None, 0.0))
+        now = time.monotonic()
+        if index is not None and now - checked < REFRESH_SECONDS:
+            return index
+        manifest = ensure_index(corpus_dir, index_dir)
+        if index is None or index.manifest != manifest:
+            try:
+                index = PlagiarismIndex(index_dir)
+            except OSError:
+                # a concurrent merge removed a segment between reading the manifest and opening it
+                index = PlagiarismIndex(index_dir)
+        _INDEXES[index_dir] = (index, now)
+        return index
@@ -0,0 +1,402 @@
+"""
+Sharded Plagiarism Index
+========================
+Splits the plagiarism index of a corpus into PLAGIARISM_SHARDS independent
+indexes (see plagiarism_index.py), so a corpus of millions of documents
+can be queried without any one process holding all of it.
+
+Every document goes to the shard chosen by a hash of its ID (corpus files
+by their file name, which is their ID), so adding, replacing or deleting a
+document touches one shard only. The layout is recorded in a manifest at
+the index root:
+
+    shards.json                 shard count and the directory of every shard
+    shard-<token>-000/          a complete plagiarism index (manifest, segments, stored texts)
+    shard-<token>-001/
+    ...
+
+With one shard (the default) there is no shards.json and the root is a
+plain index directory, exactly as before.
+
+A query tokenizes and signs the submission once, then fans the hashes out
+to a pool of PLAGIARISM_SHARD_WORKERS processes, each searching the shards
+it is given through memory-mapped segments, and merges the per-shard
+results into the global top sources, near-duplicate passages and most
+similar documents. Segment
+pages are mapped, not loaded, so the resident memory of a worker stays
+bounded by what its queries touch, whatever the corpus size.
+
+The shard count of an existing index only changes through reshard(),
+which re-indexes the stored texts and the corpus files into the new
+layout (python src/pipeline/ingest.py reshard N).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .document import as_document
+from . import minhash, tfidf
+from .plagiarism_index import (MAX_NEAR_DUPLICATES, MAX_SOURCES, REFRESH_SECONDS, PlagiarismIndex, _WriteLock,
+                               add_documents, build_index, compact, contains, default_index_dir,
+                               default_settings, delete_documents, ensure_index, paragraph_signatures, shard_of,
+                               shingle_coverage, sync_corpus)
+
+SHARDS = int(os.environ.get('PLAGIARISM_SHARDS', 1))
+# Processes searching shards in parallel; 0 searches them one after another in the calling process
+SHARD_WORKERS = int(os.environ.get('PLAGIARISM_SHARD_WORKERS', min(SHARDS, os.cpu_count() or 1)))
+
+LAYOUT_FORMAT = 1
+
+
+class ShardedIndex:
+    """
+    Handle on the (possibly sharded) plagiarism index of a corpus directory.
+    Pass it to analyze_plagiarism / check_plagiarism; use open_index() to
+    get the shared handle of a corpus.
+
+    search() and near_duplicates() return the same results as the
+    PlagiarismIndex methods of the same name over the whole corpus.
+    """
+
+    def __init__(self, root: str, corpus_dir: Optional[str] = None, shards: int = SHARDS,
+                 workers: int = SHARD_WORKERS):
+        self.root = root
+        self.corpus_dir = corpus_dir
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._pool = None
+        self._checked = 0.0
+        self._updated = {}
+        layout = self._read_layout()
+        if layout is None and shards > 1 and not os.path.exists(os.path.join(root, 'manifest.json')):
+            layout = self.reshard(shards)
+        self._layout = layout
+
+    # ---- layout ----
+
+    def _read_layout(self) -> Optional[Dict]:
+        try:
+            with open(os.path.join(self.root, 'shards.json'), 'r', encoding='utf-8') as f:
+                layout = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return layout if layout.get('format') == LAYOUT_FORMAT else None
+
+    @property
+    def shard_dirs(self) -> List[str]:
+        if not self._layout:
+            return [self.root]
+        return [os.path.join(self.root, name) for name in self._layout['shards']]
+
+    @property
+    def shard_count(self) -> int:
+        return len(self.shard_dirs)
+
+    def shard_dir(self, doc_id: str) -> str:
+        """Index directory of the shard `doc_id` belongs to."""
+        dirs = self.shard_dirs
+        return dirs[shard_of(doc_id, len(dirs))]
+
+    def _stored_texts(self) -> List[str]:
+        """Path of every stored ingested text in the current layout."""
+        found = []
+        for index_dir in self.shard_dirs:
+            text_dir = os.path.join(index_dir, 'texts')
+            if os.path.isdir(text_dir):
+                found.extend(os.path.join(text_dir, fname) for fname in os.listdir(text_dir))
+        return found
+
+    def reshard(self, shards: int) -> Optional[Dict]:
+        """
+        Re-index everything into `shards` shards: the stored ingested texts
+        move to the shard of their ID and every shard is rebuilt from them
+        and its corpus files. Readers switch to the new layout when
+        shards.json is replaced; writes made while resharding may be lost.
+        Returns the new layout (None for a single unsharded index).
+        """
+        shards = max(1, shards)
+        with _WriteLock(self.root, '.layout.lock'):
+            old_layout = self._read_layout()
+            self._layout = old_layout
+            old_dirs = self.shard_dirs
+            if (old_layout and len(old_dirs) == shards) or (not old_layout and shards == 1):
+                return old_layout
+            started = time.time()
+            token = uuid.uuid4().hex[:6]
+            names = [f'shard-{token}-{i:03d}' for i in range(shards)] if shards > 1 else []
+            new_dirs = [os.path.join(self.root, name) for name in names] or [self.root]
+            stored = self._stored_texts()
+            for path in stored:
+                with open(path, 'r', encoding='utf-8') as f:
+                    doc_id = json.load(f)['id']
+                text_dir = os.path.join(new_dirs[shard_of(doc_id, shards)], 'texts')
+                os.makedirs(text_dir, exist_ok=True)
+                shutil.copy2(path, os.path.join(text_dir, os.path.basename(path)))
+            for i, index_dir in enumerate(new_dirs):
+                build_index(self.corpus_dir, index_dir, (i, shards) if shards > 1 else None)
+
+            layout = None
+            if shards > 1:
+                layout = {'format': LAYOUT_FORMAT, 'shards': names, 'settings': default_settings(),
+                          'updated_at': time.time()}
+                tmp = os.path.join(self.root, f'shards.json.{os.getpid()}.tmp')
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(layout, f, indent=2)
+                os.replace(tmp, os.path.join(self.root, 'shards.json'))
+            else:
+                os.remove(os.path.join(self.root, 'shards.json'))
+            self._layout = layout
+            self._checked = 0.0
+
+            # clean up the old layout
+            for index_dir in old_dirs:
+                if index_dir == self.root:
+                    _clear_root(self.root)
+                else:
+                    shutil.rmtree(index_dir, ignore_errors=True)
+            print(f"Resharded {self.root} into {shards} shard(s) in {time.time() - started:.2f}s")
+            return layout
+
+    # ---- reading ----
+
+    def refresh(self, force: bool = False) -> Dict[str, float]:
+        """Re-read the layout and the shards' manifests, building missing
+        shards (at most every REFRESH_SECONDS). The corpus directory is not
+        listed here; sync() indexes its changes.
+        Returns {shard dir: manifest updated_at}."""
+        with self._lock:
+            now = time.monotonic()
+            if force or not self._updated or now - self._checked >= REFRESH_SECONDS:
+                self._layout = self._read_layout()
+                updated = {}
+                for index_dir in self.shard_dirs:
+                    manifest = ensure_index(self.corpus_dir, index_dir) or {}
+                    updated[index_dir] = manifest.get('updated_at')
+                self._updated, self._checked = updated, now
+            return self._updated
+
+    def state(self, current: bool = False) -> str:
+        """Token of the index contents this handle searches; it changes
+        whenever a shard's manifest is rewritten (documents added, deleted or
+        merged). With `current`, of the manifests on disk right now instead of
+        as of the last refresh (which may be REFRESH_SECONDS old)."""
+        updated = sorted((os.path.basename(index_dir), stamp)
+                         for index_dir, stamp in self.refresh(force=current).items())
+        return hashlib.sha256(json.dumps(updated).encode('utf-8')).hexdigest()[:16]
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0 or self.shard_count <= 1:
+            return None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=min(self.workers, self.shard_count))
+        return self._pool
+
+    def worker_pids(self) -> List[int]:
+        """Process ids of the running shard workers (none before the first
+        search starts them). One task per worker, each holding its worker
+        briefly so the others pick up the rest."""
+        if self._pool is None:
+            return []
+        futures = [self._pool.submit(_worker_pid, 0.05) for _ in range(min(self.workers, self.shard_count))]
+        return sorted({future.result() for future in futures})
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _fan_out(self, query: Dict) -> List[Tuple[np.ndarray, List[Dict], List[Dict], List[Dict]]]:
+        updated = self.refresh()
+        tasks = [(index_dir, updated.get(index_dir), query) for index_dir in updated]
+        pool = self._executor()
+        if pool is None:
+            return [_search_shard(*task) for task in tasks]
+        # one task per worker, each searching a contiguous group of shards
+        groups = np.array_split(np.arange(len(tasks)), min(self.workers, len(tasks)))
+        futures = [pool.submit(_search_shards, [tasks[i] for i in group]) for group in groups]
+        return [result for future in futures for result in future.result()]
+
+    def analyze(self, text, max_sources: int = MAX_SOURCES,
+                threshold: float = minhash.NEAR_DUPLICATE_THRESHOLD, limit: int = MAX_NEAR_DUPLICATES,
+                similar: int = tfidf.SIMILAR_DOCUMENTS,
+                exclude: Iterable[str] = ()) -> Tuple[np.ndarray, List[Dict], List[Dict], List[Dict]]:
+        """search(), near_duplicates() and similar_documents() in one
+        fan-out, ignoring the documents `exclude`.
+        Returns (coverage, sources, near_duplicates, similar_documents)."""
+        doc = as_document(text)
+        settings = default_settings()
+        signatures, para_spans = paragraph_signatures(doc, settings)
+        terms, counts = doc.term_counts if similar > 0 else (None, None)
+        query = {'token_ids': doc.token_ids, 'token_spans': doc.index_tokens[1],
+                 'signatures': signatures, 'para_spans': para_spans, 'terms': terms, 'counts': counts,
+                 'max_sources': max_sources, 'threshold': threshold, 'limit': limit, 'similar': similar,
+                 'exclude': list(exclude)}
+        hit = np.zeros(max(0, len(doc.token_ids) - settings['shingle_size'] + 1), dtype=bool)
+        sources, near, similar_docs = [], [], []
+        for shard_hit, shard_sources, shard_near, shard_similar in self._fan_out(query):
+            hit |= shard_hit
+            sources.extend(shard_sources)
+            near.extend(shard_near)
+            similar_docs.extend(shard_similar)
+        sources.sort(key=lambda s: s['matched_chars'], reverse=True)
+        near.sort(key=lambda p: p['similarity'], reverse=True)
+        similar_docs.sort(key=lambda d: d['similarity'], reverse=True)
+        coverage = shingle_coverage(hit, len(doc.token_ids), settings['shingle_size'])
+        return coverage, sources[:max_sources], near[:limit], similar_docs[:similar]
+
+    def search(self, text, max_sources: int = MAX_SOURCES) -> Tuple[np.ndarray, List[Dict]]:
+        """See PlagiarismIndex.search."""
+        coverage, sources, _, _ = self.analyze(text, max_sources, limit=0, similar=0)
+        return coverage, sources
+
+    def query(self, text, max_sources: int = MAX_SOURCES) -> List[Dict]:
+        return self.search(text, max_sources)[1]
+
+    def near_duplicates(self, text, threshold: float = minhash.NEAR_DUPLICATE_THRESHOLD,
+                        limit: int = MAX_NEAR_DUPLICATES) -> List[Dict]:
+        """See PlagiarismIndex.near_duplicates."""
+        return self.analyze(text, 0, threshold, limit, similar=0)[2]
+
+    def similar_documents(self, text, k: int = tfidf.SIMILAR_DOCUMENTS) -> List[Dict]:
+        """See PlagiarismIndex.similar_documents. Each shard ranks its
+        documents with its own IDF table."""
+        return self.analyze(text, 0, limit=0, similar=k)[3]
+
+    # ---- writing ----
+
+    def add_documents(self, documents: Iterable[Tuple[str, str, str]], keep_text: bool = False) -> int:
+        """Route (doc_id, name, text) triples to their shards, see plagiarism_index.add_documents."""
+        self.refresh()
+        by_shard = {}
+        for document in documents:
+            by_shard.setdefault(self.shard_dir(document[0]), []).append(document)
+        count = sum(add_documents(index_dir, docs, keep_text) for index_dir, docs in by_shard.items())
+        self._checked = 0.0
+        return count
+
+    def contains(self, doc_id: str) -> bool:
+        """Whether a document with id `doc_id` is indexed."""
+        return contains(self.shard_dir(doc_id), doc_id)
+
+    def delete_documents(self, ids: Iterable[str]) -> int:
+        by_shard = {}
+        for doc_id in ids:
+            by_shard.setdefault(self.shard_dir(doc_id), []).append(doc_id)
+        count = sum(delete_documents(index_dir, doc_ids) for index_dir, doc_ids in by_shard.items())
+        self._checked = 0.0
+        return count
+
+    def compact(self) -> List[Dict]:
+        manifests = [compact(index_dir) for index_dir in self.shard_dirs]
+        self._checked = 0.0
+        return manifests
+
+    def sync(self) -> Tuple[int, int]:
+        """Index changes to the corpus directory's .txt files. Returns (added, removed)."""
+        added = removed = 0
+        for index_dir in self.shard_dirs:
+            a, r = sync_corpus(self.corpus_dir, index_dir)
+            added, removed = added + a, removed + r
+        self._checked = 0.0
+        return added, removed
+
+    def stats(self) -> Dict:
+        self.refresh()
+        shards = []
+        for index_dir in self.shard_dirs:
+            manifest = PlagiarismIndex._read_manifest(index_dir) or {}
+            shards.append({
+                'documents': manifest.get('documents', 0),
+                'segments': len(manifest.get('segments', [])),
+                'tombstones': sum(len(v) for v in manifest.get('deleted', {}).values()),
+                'corpus_files': len(manifest.get('corpus_signature', [])),
+                'updated_at': manifest.get('updated_at'),
+            })
+        return {
+            'documents': sum(s['documents'] for s in shards),
+            'shards': len(shards),
+            'segments': sum(s['segments'] for s in shards),
+            'tombstones': sum(s['tombstones'] for s in shards),
+            'corpus_files': sum(s['corpus_files'] for s in shards),
+            'settings': default_settings(),
+            'updated_at': max((s['updated_at'] or 0 for s in shards), default=None),
+            'per_shard': shards if len(shards) > 1 else None,
+        }
+
+
+def _clear_root(root: str):
+    """Remove a single-index layout from root, leaving shard directories alone."""
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name == 'texts' or name.startswith(('seg-', 'idf-')):
+            shutil.rmtree(path, ignore_errors=True)
+        elif name == 'manifest.json':
+            os.remove(path)
+
+
+# ---- shard workers ----
+
+# index_dir -> PlagiarismIndex, in every process that searches shards
+_OPEN_SHARDS: Dict[str, PlagiarismIndex] = {}
+
+
+def _open_shard(index_dir: str, updated_at: Optional[float]) -> PlagiarismIndex:
+    """The shard opened in this process, reopened once its manifest is newer
+    than the one it was opened with."""
+    index = _OPEN_SHARDS.get(index_dir)
+    if index is None or index.manifest.get('updated_at') != updated_at:
+        try:
+            index = PlagiarismIndex(index_dir)
+        except OSError:
+            # a concurrent merge removed a segment between reading the manifest and opening it
+            index = PlagiarismIndex(index_dir)
+        _OPEN_SHARDS[index_dir] = index
+    return index
+
+
+def _search_shard(index_dir: str, updated_at: Optional[float], query: Dict):
+    index = _open_shard(index_dir, updated_at).excluding(query.get('exclude', ()))
+    hit, sources = index.search_tokens(query['token_ids'], query['token_spans'], query['max_sources'])
+    near = []
+    if query['limit'] > 0:
+        near = index.near_duplicate_paragraphs(query['signatures'], query['para_spans'],
+                                               query['threshold'], query['limit'])
+    similar = []
+    if query['similar'] > 0:
+        similar = index.similar_terms(query['terms'], query['counts'], query['similar'])
+    return hit, sources, near, similar
+
+
+def _search_shards(tasks):
+    return [_search_shard(*task) for task in tasks]
+
+
+def _worker_pid(seconds: float) -> int:
+    time.sleep(seconds)
+    return os.getpid()
+
+
+# ---- shared handles ----
+
+_HANDLES: Dict[str, ShardedIndex] = {}
+_HANDLES_LOCK = threading.Lock()
+
+
+def open_index(corpus_dir: str, index_dir: Optional[str] = None) -> ShardedIndex:
+    """The index handle of corpus_dir, shared within the process. A new
+    index gets PLAGIARISM_SHARDS shards; an existing one keeps its layout."""
+    index_dir = index_dir or default_index_dir(corpus_dir)
+    with _HANDLES_LOCK:
+        handle = _HANDLES.get(index_dir)
+        if handle is None:
+            handle = _HANDLES[index_dir] = ShardedIndex(index_dir, corpus_dir)
+        return handle
@@ -0,0 +1,234 @@
+"""
+TF-IDF Similarity Search
+========================
+Sparse TF-IDF vectors and pruned top-k cosine search over inverted
+postings, for finding the corpus documents topically closest to a
+submission.
+
+Documents are tokenized exactly like the TfidfVectorizer of the AI
+detector (make_vectorizer, used by learning/train_model.py): lower-cased
+words of two or more characters without English stop words. Terms are
+stored by their stable hash (hashing.token_ids), so no vocabulary has to
+be kept in memory. Weights follow TfidfVectorizer's defaults: raw term
+counts times the smoothed IDF ln((1 + n) / (1 + df)) + 1, L2-normalized
+per document. The IDF table is fitted on the indexed documents
+(fit_idf) and then frozen like a fitted vectorizer: documents added later
+are weighted with it, terms it has never seen get the IDF of df = 0.
+
+A query is answered with MaxScore pruning over the postings of its terms
+(top_k): the exact scores of the documents in the posting list with the
+highest upper bound give a score threshold, and posting lists whose
+summed upper bounds stay below it cannot add a new top-k document, so
+only the documents of the remaining lists are scored.
+"""
+
+import heapq
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .hashing import token_ids
+
+# Documents reported as most similar to a submission
+SIMILAR_DOCUMENTS = int(os.environ.get('SIMILAR_DOCUMENTS', 5))
+# Cosine similarity below which a document is not reported
+MIN_SIMILARITY = float(os.environ.get('SIMILAR_DOCUMENTS_MIN_SIMILARITY', 0.1))
+
+
+def make_vectorizer(**params):
+    """The TfidfVectorizer configuration the detector is trained with."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    return TfidfVectorizer(stop_words='english', **params)
+
+
+def make_hashing_vectorizer(n_features: int = 1 << 20, **params):
+    """Stateless counterpart of make_vectorizer for out-of-core training:
+    same tokens, hashed into `n_features` columns, L2-normalized counts."""
+    from sklearn.feature_extraction.text import HashingVectorizer
+    return HashingVectorizer(stop_words='english', n_features=n_features, alternate_sign=False, **params)
+
+
+@lru_cache(maxsize=1)
+def _analyzer():
+    return make_vectorizer().build_analyzer()
+
+
+def term_counts(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Sorted unique term hashes of `text` (uint64) and their counts (float32)."""
+    terms = _analyzer()(text)
+    if not terms:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.float32)
+    unique, counts = np.unique(token_ids(terms), return_counts=True)
+    return unique, counts.astype(np.float32)
+
+
+def lookup(sorted_terms: np.ndarray, terms: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Positions of `terms` in the sorted array `sorted_terms` and whether
+    each is there (positions of missing terms are meaningless)."""
+    if len(sorted_terms) == 0:
+        return np.zeros(len(terms), dtype=np.int64), np.zeros(len(terms), dtype=bool)
+    pos = np.minimum(np.searchsorted(sorted_terms, terms), len(sorted_terms) - 1)
+    return pos, sorted_terms[pos] == terms
+
+
+class Idf:
+    """A fitted IDF table: sorted term hashes, their IDF and the number of
+    documents it was fitted on."""
+
+    def __init__(self, terms: Optional[np.ndarray] = None, values: Optional[np.ndarray] = None, documents: int = 0):
+        self.terms = terms if terms is not None else np.empty(0, dtype=np.uint64)
+        self.values = values if values is not None else np.empty(0, dtype=np.float32)
+        self.documents = int(documents)
+        # IDF of a term no fitted document contains
+        self.default = float(np.log(1 + self.documents) + 1)
+
+    def __call__(self, terms: np.ndarray) -> np.ndarray:
+        """IDF of every term of `terms`."""
+        out = np.full(len(terms), self.default, dtype=np.float32)
+        pos, found = lookup(self.terms, terms)
+        out[found] = self.values[pos[found]]
+        return out
+
+    def save(self, path: str):
+        tmp = path + '.tmp'
+        os.makedirs(tmp, exist_ok=True)
+        np.save(os.path.join(tmp, 'terms.npy'), self.terms.astype(np.uint64))
+        np.save(os.path.join(tmp, 'idf.npy'), self.values.astype(np.float32))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Optional[str], documents: int) -> 'Idf':
+        if not path:
+            return cls(documents=documents)
+        return cls(np.load(os.path.join(path, 'terms.npy'), mmap_mode='r'),
+                   np.load(os.path.join(path, 'idf.npy'), mmap_mode='r'), documents)
+
+
+def fit_idf(posting_terms: np.ndarray, documents: int) -> Idf:
+    """Fit the IDF on postings (one entry per document and term it contains)
+    of `documents` documents."""
+    terms, df = np.unique(posting_terms, return_counts=True)
+    values = np.log((1 + documents) / (1 + df)) + 1
+    return Idf(terms, values.astype(np.float32), documents)
+
+
+def weigh(posting_terms: np.ndarray, posting_docs: np.ndarray, tf: np.ndarray, idf: Idf) -> np.ndarray:
+    """L2-normalized TF-IDF weight of every posting."""
+    if len(tf) == 0:
+        return np.empty(0, dtype=np.float32)
+    x = tf.astype(np.float64) * idf(posting_terms)
+    norms = np.sqrt(np.bincount(posting_docs, weights=x * x))
+    return (x / norms[posting_docs]).astype(np.float32)
+
+
+def query_vector(terms: np.ndarray, counts: np.ndarray, idf: Idf) -> np.ndarray:
+    """L2-normalized TF-IDF weights of a query's terms."""
+    x = counts.astype(np.float64) * idf(terms)
+    norm = np.sqrt((x * x).sum())
+    return x / norm if norm else x
+
+
+def postings_arrays(posting_terms: np.ndarray, posting_docs: np.ndarray, tf: np.ndarray,
+                    idf: Idf) -> Dict[str, np.ndarray]:
+    """Inverted postings of a segment: unique terms, offset of every term's
+    posting list, and per posting (sorted by term, then document) the
+    document, raw count and weight, plus the largest weight of each term."""
+    order = np.lexsort((posting_docs, posting_terms))
+    posting_terms, posting_docs, tf = posting_terms[order], posting_docs[order], tf[order]
+    weights = weigh(posting_terms, posting_docs, tf, idf)
+    terms, starts = np.unique(posting_terms, return_index=True)
+    offsets = np.append(starts, len(posting_terms)).astype(np.uint64)
+    max_weight = np.maximum.reduceat(weights, starts) if len(weights) else np.empty(0, dtype=np.float32)
+    return {
+        'tfidf_terms': terms.astype(np.uint64),
+        'tfidf_offsets': offsets,
+        'tfidf_docs': posting_docs.astype(np.uint32),
+        'tfidf_tf': tf.astype(np.float32),
+        'tfidf_weights': weights,
+        'tfidf_max': max_weight.astype(np.float32),
+    }
+
+
+class Postings:
+    """The postings_arrays() of a segment, memory-mapped from its directory."""
+
+    def __init__(self, path: str):
+        def load(name):
+            # plain ndarray views of the mapping: slicing a np.memmap is much slower
+            return np.asarray(np.load(os.path.join(path, f'tfidf_{name}.npy'), mmap_mode='r'))
+
+        self.terms = load('terms')
+        self.offsets = load('offsets')
+        self.docs = load('docs')
+        self.tf = load('tf')
+        self.weights = load('weights')
+        self.max = load('max')
+
+    def posting_terms(self) -> np.ndarray:
+        """Term of every posting (same order as docs/tf/weights)."""
+        counts = np.diff(np.asarray(self.offsets, dtype=np.int64))
+        return np.repeat(self.terms, counts)
+
+
+def top_k(postings: Postings, alive: Optional[np.ndarray], terms: np.ndarray, q: np.ndarray, k: int,
+          threshold: float = 0.0) -> List[Tuple[float, int]]:
+    """
+    The up to `k` documents of `postings` with the highest cosine score
+    against the query terms `terms` with weights `q` (see query_vector),
+    skipping documents that are not `alive`. Only documents scoring above
+    `threshold` (e.g. the k-th best score of earlier segments) are returned.
+
+    Returns [(score, document), ...], best first.
+    """
+    if len(postings.terms) == 0 or len(terms) == 0 or k <= 0:
+        return []
+    pos, found = lookup(postings.terms, terms)
+    # (upper bound, query weight, documents, weights) of every posting list
+    lists = []
+    for p, weight in zip(pos[found].tolist(), q[found].tolist()):
+        lo, hi = int(postings.offsets[p]), int(postings.offsets[p + 1])
+        lists.append((weight * float(postings.max[p]), weight, postings.docs[lo:hi], postings.weights[lo:hi]))
+    if not lists:
+        return []
+    lists.sort(key=lambda entry: entry[0])
+    bounds = np.cumsum([entry[0] for entry in lists])
+
+    def score(candidates, which):
+        """Exact contribution of lists `which` to the scores of `candidates`."""
+        total = np.zeros(len(candidates))
+        for i in which:
+            _, weight, docs, weights = lists[i]
+            at = np.minimum(np.searchsorted(docs, candidates), len(docs) - 1)
+            hit = docs[at] == candidates
+            total[hit] += weight * weights[at[hit]]
+        return total
+
+    # exact scores of the documents of the list with the highest bound give a first threshold
+    top = len(lists) - 1
+    seen = lists[top][2]
+    if alive is not None:
+        seen = seen[alive[seen]]
+    scores = score(seen, range(len(lists)))
+    cutoff = threshold
+    if len(scores) >= k:
+        cutoff = max(cutoff, float(np.partition(scores, len(scores) - k)[len(scores) - k]))
+
+    # a document found only in lists[:essential] scores at most bounds[essential - 1] < cutoff
+    essential = int(np.searchsorted(bounds, cutoff, side='left'))
+    middle = range(essential, top)
+    if len(middle):
+        candidates, inverse = np.unique(np.concatenate([lists[i][2] for i in middle]), return_inverse=True)
+        partial = np.bincount(inverse, weights=np.concatenate([lists[i][1] * lists[i][3] for i in middle]))
+        # documents of the top list are scored already; drop dead ones and those that cannot reach the cutoff
+        keep = ~np.isin(candidates, seen) & (partial + (bounds[essential - 1] if essential else 0.0) >= cutoff)
+        if alive is not None:
+            keep &= alive[candidates]
+        candidates, partial = candidates[keep], partial[keep]
+        if len(candidates):
+            seen = np.concatenate([seen, candidates])
+            scores = np.concatenate([scores, partial + score(candidates, range(essential))])
+
+    best = heapq.nlargest(k, zip(scores.tolist(), seen.tolist()))
+    return [(s, d) for s, d in best if s > threshold and s > 0]
@@ -1,25 +1,36 @@
 import os
 import sys
+import json
+import shutil
+import sqlite3
+import uuid
+import zipfile
 from pathlib import Path
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from typing import List
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from typing import Optional
+from typing import Literal, Optional
 
 # make src importable when running from project root
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
-from extraction.extract import extract_text
-from preprocessing.clean import preprocess
-from analysis.ai_detector import detect_ai
-from analysis.plagiarism import check_plagiarism
-from analysis.citation import check_citations
-from analysis.eligibility import check_eligibility  # New Import
-from analysis.genai_features import extract_genai_features  # GenAI Feature Extraction
-from scoring.score import aggregate_scores
-from report.generate import generate_report
-from learning.retrain import retrain
+from pipeline.analyze import analyze_document, ExtractionError
+from pipeline.executor import AnalysisExecutor, QueueFullError, JobTimeoutError
+from pipeline.jobs import JobStore, run_batch
+from pipeline.cache import ResultCache
+from pipeline.ingest import IngestError, ingest_file, delete as delete_from_index, index_stats, start_corpus_sync
+from pipeline.warmup import Readiness
+from pipeline.uploads import (SpooledUpload, UploadFormatError, UploadTooLargeError, UPLOAD_MAX_BYTES,
+                              UPLOAD_CHUNK_BYTES)
+from learning.feedback_store import FeedbackStore, start_pruning
+from learning.retrain import RETRAIN_WORKER, start_worker
+from analysis.ai_detector import model_fingerprint, model_status
+from analysis.inference import merge_stats
+from analysis.plagiarism_shards import open_index
+from analysis.model_registry import RegistryError, UnknownVersionError, get_registry
 from chatbot.explainer import chat, generate_explanation, get_chatbot  # Chatbot Integration
 from pydantic import BaseModel
 
@@ -42,6 +53,8 @@ class FeedbackRequest(BaseModel):
     filename: str
     is_accurate: bool
     comments: str = None
+    content_hash: Optional[str] = None  # 'content_hash' of the /analyze report the verdict is about
+    label: Optional[Literal['ai', 'human']] = None  # the reviewer's own label, if they gave one
 
 
 class ChatRequest(BaseModel):
@@ -62,6 +75,19 @@ WEB_DIR = ROOT / 'web'
 UPLOAD_DIR = ROOT / 'data' / 'uploads'
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+BATCH_DIR = UPLOAD_DIR / 'batches'
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 1000))
+BATCH_MAX_BYTES = int(os.environ.get('BATCH_MAX_BYTES', 1024 * 1024 * 1024))  # per .zip archive
+BATCH_EXTENSIONS = ('.txt', '.pdf', '.csv', '.xlsx', '.xls', '.png', '.jpg', '.jpeg', '.tiff', '.bmp')
+
+# Pool that runs the analysis pipeline (mode/workers/queue/timeout come from ANALYSIS_* env vars)
+EXECUTOR = AnalysisExecutor(corpus_dir=str(ROOT / 'data'))
+JOBS = JobStore()
+RESULT_CACHE = ResultCache()
+FEEDBACK = FeedbackStore()
+# model, plagiarism index and (ANALYSIS_WARMUP=1) one synthetic analysis, per worker, in the background
+READINESS = Readiness()
+
 # mount static files (css/js)
 if WEB_DIR.exists():
     app.mount('/static', StaticFiles(directory=str(WEB_DIR)), name='static')
@@ -75,74 +101,250 @@ def root():
     return {"message": "Web frontend not found. Place files in /web directory."}
 
 
-@app.post('/analyze')
-async def analyze(file: UploadFile = File(...)):
-    if not file.filename:
-        raise HTTPException(status_code=400, detail="No file uploaded")
-    save_path = UPLOAD_DIR / file.filename
+@app.on_event('startup')
+def start_executor():
+    EXECUTOR.start()
+    READINESS.start(EXECUTOR)
+    # the only place the corpus directory is listed; analyses just read the index
+    start_corpus_sync(str(ROOT / 'data'))
+    start_pruning(FEEDBACK)
+    if RETRAIN_WORKER:
+        start_worker()
+
+
+@app.on_event('shutdown')
+def stop_executor():
+    EXECUTOR.shutdown(wait=False)
+
+
+def _cached_report(digest):
+    """The cached report of an upload, against the index as it is on disk now. Blocks on the index
+    (refreshing every shard's manifest, or building it on first use) and on the disk tier."""
+    return RESULT_CACHE.get(digest, index_state=open_index(str(ROOT / 'data')).state(current=True))
+
+
+def _remember_for_feedback(digest, report):
+    """Keep the report's document for POST /feedback, after it has left the result cache.
+    A SQLite write: it may wait up to the connection timeout while the retrain worker writes."""
     try:
-        content = await file.read()
-        save_path.write_bytes(content)
+        FEEDBACK.remember(digest, report)
+    except sqlite3.Error as e:
+        print(f"Could not keep the document for feedback: {e}")
+
+
+# the form field is read by SpooledUpload.receive, not declared as a parameter; document it by hand
+ANALYZE_FORM = {'requestBody': {'required': True, 'content': {'multipart/form-data': {'schema': {
+    'type': 'object', 'required': ['file'], 'properties': {'file': {'type': 'string', 'format': 'binary'}}}}}}}
+
+
+@app.post('/analyze', openapi_extra=ANALYZE_FORM)
+async def analyze(request: Request):
+    # streamed from the request body, so an oversized upload is refused before it is buffered
+    try:
+        upload = await SpooledUpload.receive(request, 'file')
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save file: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to read upload: {e}")
+    try:
+        digest = upload.digest
+        # Identical bytes analysed by the same model and weights against the same corpus give the same report
+        cached = await run_in_threadpool(_cached_report, digest)
+        if cached is not None:
+            return cached
 
-    text, metadata = extract_text(str(save_path))
-    
-    if text.startswith("Error"):
+        # CPU-bound work runs in the executor so the event loop stays free for /health and /chat
+        report = await EXECUTOR.run(analyze_document, upload.source, str(ROOT / 'data'), upload.filename)
+    except HTTPException:
+        raise
+    except ExtractionError as e:
         # Return a 422 Unprocessable Entity with the specific error message (e.g., Tesseract missing)
-        raise HTTPException(status_code=422, detail=text)
-        
-    try:
-        sections = preprocess(text)
-        ai_result = detect_ai(sections.get('body',''))
-        # Handle dict or float for backward compatibility (though we know it is dict now)
-        ai_score_val = ai_result['score'] if isinstance(ai_result, dict) else ai_result
-        
-        plagiarism_score, matches = check_plagiarism(sections.get('body',''), str(ROOT / 'data'))
-        
-        citation_result = check_citations(sections.get('body', ''))
-        
-        # NEW: Check Eligibility
-        eligibility_result = check_eligibility(
-            ai_score_val,
-            plagiarism_score,
-            citation_result,
-            sections.get('body','')
-        )
-        
-        final = aggregate_scores(ai_score_val, plagiarism_score)
-        
-        # Add eligibility to the report structure
-        report = generate_report(str(save_path), metadata, sections, ai_result, plagiarism_score, citation_result, final, matches)
-        report['eligibility'] = eligibility_result # Append explicitly since generate_report might not expect it
-        
-        # Add GenAI features to report for frontend display
-        if isinstance(ai_result, dict) and 'genai_features' in ai_result:
-            report['scores']['genai_features'] = ai_result['genai_features']
-        
-        # Generate automatic chatbot explanation
-        try:
-            report['chatbot_explanation'] = generate_explanation(report)
-        except Exception as chat_err:
-            print(f"Chatbot explanation error: {chat_err}")
-            report['chatbot_explanation'] = "Analysis complete. Ask me about your results!"
-        
-        return report
+        raise HTTPException(status_code=422, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except JobTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=422, detail=f"Analysis failed: {str(e)}")
+    finally:
+        upload.cleanup()
+
+    # Generate automatic chatbot explanation
+    try:
+        report['chatbot_explanation'] = generate_explanation(report)
+    except Exception as chat_err:
+        print(f"Chatbot explanation error: {chat_err}")
+        report['chatbot_explanation'] = "Analysis complete. Ask me about your results!"
+
+    report['content_hash'] = digest
+    await run_in_threadpool(RESULT_CACHE.put, digest, report, report.get('model_sha256'), report.get('index_state'))
+    await run_in_threadpool(_remember_for_feedback, digest, report)
+    return report
+
+async def _copy_upload(upload, path, max_bytes):
+    """Stream an UploadFile to `path` in chunks, enforcing `max_bytes`."""
+    size = 0
+    with open(path, 'wb') as out:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(status_code=413, detail=f"{upload.filename} exceeds the {max_bytes:,} byte limit")
+            out.write(chunk)
+
+
+async def _save_batch_files(files, work_dir):
+    """Stream the uploads (expanding .zip archives) into work_dir.
+    Returns [(display_name, path), ...]."""
+    saved = []
+
+    def target(name):
+        if len(saved) >= BATCH_MAX_FILES:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_FILES} files")
+        path = work_dir / f"{len(saved):05d}_{os.path.basename(name)}"
+        saved.append((name, str(path)))
+        return path
+
+    for upload in files:
+        if not upload.filename:
+            continue
+        if not upload.filename.lower().endswith('.zip'):
+            await _copy_upload(upload, target(upload.filename), UPLOAD_MAX_BYTES)
+            continue
+        archive_path = work_dir / f"archive_{uuid.uuid4().hex}.zip"
+        await _copy_upload(upload, archive_path, BATCH_MAX_BYTES)
+        try:
+            with zipfile.ZipFile(archive_path) as archive:
+                for member in archive.infolist():
+                    name = member.filename
+                    if member.is_dir() or name.startswith('__MACOSX/') or os.path.basename(name).startswith('.'):
+                        continue
+                    if not name.lower().endswith(BATCH_EXTENSIONS):
+                        continue
+                    if member.file_size > UPLOAD_MAX_BYTES:
+                        raise HTTPException(status_code=413, detail=f"{name} exceeds the {UPLOAD_MAX_BYTES:,} byte limit")
+                    with archive.open(member) as src, open(target(name), 'wb') as dst:
+                        shutil.copyfileobj(src, dst, UPLOAD_CHUNK_BYTES)
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail=f"{upload.filename} is not a valid zip archive")
+        finally:
+            os.remove(archive_path)
+    return saved
+
+
+@app.post('/analyze/batch')
+async def analyze_batch(files: List[UploadFile] = File(...)):
+    """
+    Queue many files (or .zip archives of files) for analysis.
+    Returns a job ID; poll GET /jobs/{id} for progress.
+    """
+    if not any(f.filename for f in files):
+        raise HTTPException(status_code=400, detail="No files uploaded")
+
+    work_dir = BATCH_DIR / uuid.uuid4().hex
+    work_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        saved = await _save_batch_files(files, work_dir)
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+    if not saved:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise HTTPException(status_code=400, detail="No supported files found in upload")
+
+    job = JOBS.create(saved, work_dir=str(work_dir))
+    run_batch(job, EXECUTOR, analyze_document, str(ROOT / 'data'))
+    return {'job_id': job.id, 'total': job.total, 'status': job.status}
+
+
+@app.get('/jobs/{job_id}')
+def job_status(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.summary()
+
+
+@app.get('/jobs/{job_id}/results.jsonl')
+def job_results(job_id: str):
+    """Full reports of every finished file, one JSON object per line."""
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+
+    def lines():
+        for entry in job.finished_results():
+            yield json.dumps(entry) + '\n'
+
+    return StreamingResponse(lines(), media_type='application/x-ndjson',
+                             headers={'Content-Disposition': f'attachment; filename="{job_id}.jsonl"'})
+
+
+@app.post('/corpus/documents')
+async def add_corpus_documents(files: List[UploadFile] = File(...)):
+    """Add reference documents to the plagiarism index without rebuilding it."""
+    added = []
+    for file in files:
+        if not file.filename:
+            continue
+        upload = SpooledUpload(file.filename)
+        try:
+            await upload.read_from(file)
+            added.append(await EXECUTOR.run(ingest_file, upload.source, str(ROOT / 'data'), upload.filename))
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except IngestError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except QueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except JobTimeoutError as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        finally:
+            upload.cleanup()
+    if not added:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+    return {'added': added}
+
+
+@app.delete('/corpus/documents/{doc_id}')
+def delete_corpus_document(doc_id: str):
+    """Remove a document (an ingested one, or an upload added by PLAGIARISM_AUTO_INGEST) from the index."""
+    if not delete_from_index([doc_id], str(ROOT / 'data')):
+        raise HTTPException(status_code=404, detail="Unknown document")
+    return {'deleted': doc_id}
+
+
+@app.get('/corpus/stats')
+def corpus_stats():
+    """Size of the plagiarism index."""
+    return index_stats(str(ROOT / 'data'))
+
 
 @app.post('/feedback')
 def submit_feedback(feedback: FeedbackRequest):
     """
     Collects user feedback for the learning loop.
+
+    The verdict is stored with the text, scores and features of the report
+    it is about (kept by content hash when /analyze produced it); the
+    retrain worker (learning/retrain.py) picks it up later.
     """
-    # In a real app, this would save to a database.
-    # Here we just log it and call the dummy retrain function.
-    print(f"Feedback received: {feedback}")
-    retrain(feedback.dict())
-    return {"status": "received", "message": "Thank you for your feedback! This helps us improve."}
+    stored = FEEDBACK.add(feedback.filename, feedback.is_accurate, feedback.comments, feedback.content_hash,
+                          feedback.label, model_sha256=model_fingerprint())
+    return {"status": "received", "id": stored['id'], "trainable": stored['trainable'],
+            "message": "Thank you for your feedback! This helps us improve."}
+
+
+@app.get('/feedback/stats')
+def feedback_stats():
+    """Stored verdicts, how many can be trained on and how far retraining got."""
+    return FEEDBACK.stats()
 
 
 # ==================== CHATBOT ENDPOINTS ====================
@@ -216,6 +418,53 @@ def chatbot_explain_analysis(analysis_result: dict):
         }
 
 
+@app.get('/cache/stats')
+def cache_stats():
+    """Hit/miss counters of the /analyze result cache."""
+    return RESULT_CACHE.stats()
+
+
+@app.get('/inference/stats')
+def inference_stats_endpoint():
+    """Batch-size and queue-time histograms of the AI detector's micro-batching,
+    added up over every analysis worker ('per_worker': each one's own, as of
+    its last finished job)."""
+    workers = EXECUTOR.worker_stats()
+    return {**merge_stats(workers), 'per_worker': workers}
+
+
+@app.get('/models')
+async def models():
+    """Registered model versions, the promoted one, shadow comparison results
+    and the model the answering analysis process currently serves."""
+    try:
+        serving = await EXECUTOR.run(model_status)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {**get_registry().status(), 'process': serving}
+
+
+@app.post('/models/{version}/promote')
+def promote_model(version: str):
+    """Serve a registered model version; every worker switches within
+    AI_MODEL_RELOAD_INTERVAL seconds, without dropping requests."""
+    try:
+        meta = get_registry().promote(version)
+    except UnknownVersionError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RegistryError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {'promoted': meta['version'], 'sha256': meta['sha256']}
+
+
 @app.get('/health')
 def health():
-    return {'status':'ok'}
+    return {'status':'ok', 'executor': EXECUTOR.stats()}
+
+
+@app.get('/ready')
+def ready():
+    """200 once every analysis worker has loaded the model and the plagiarism
+    index (and warmed up), 503 until then; /health only says the API is up."""
+    status = READINESS.status()
+    return status if status['ready'] else JSONResponse(status, status_code=503)
@@ -0,0 +1,318 @@
+"""Accuracy and latency of the whole detector pipeline, as a diffable JSON file.
+
+Runs analyze_document (extraction, preprocessing, AI detection, plagiarism,
+citations, eligibility and the final score) on:
+
+- the labeled sets: the dataset train_model.py trains on (its
+  load_dataset()) and data/samples/*.txt (labeled 'ai' or 'human' by file
+  name). The dataset is also scored on the held-out split train_model.py
+  leaves out, which the bundled model has not been trained on;
+- synthetic documents of growing size (--sizes, default 1K to 10M bytes)
+  made of shuffled dataset sentences.
+
+For each labeled set it reports ROC AUC of the AI score and of the final
+probability, and precision/recall/F1 of the final probability at the
+'Review Needed' and 'Reject' thresholds of aggregate_scores. For every
+run it reports per-stage and total latency percentiles, throughput
+(documents and MB per second) and the peak resident memory while
+analysing a document (sampled every few milliseconds).
+
+The result goes to --output (default data/benchmarks/detector-<commit>.json)
+together with the commit, model fingerprint and library versions.
+--compare OLD.json prints the accuracy figures that changed and the
+latency, throughput and memory figures that moved by more than 10%
+against an earlier run.
+
+    python src/benchmarks/bench_detector.py [--sizes 1K,10K,100K,1M,10M] [--repeats 3]
+                                            [--limit N] [--output PATH] [--compare OLD.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SRC_DIR)
+
+BASE_DIR = os.path.dirname(SRC_DIR)
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+OUTPUT_DIR = os.path.join(DATA_DIR, 'benchmarks')
+UNITS = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+
+def parse_size(text):
+    text = text.strip().upper().rstrip('B')
+    return int(float(text[:-1]) * UNITS[text[-1]]) if text[-1] in UNITS else int(text)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def _sample(rows, limit):
+    """`limit` rows picked at random (the same ones every run), or all of them."""
+    return random.Random(0).sample(rows, limit) if limit and len(rows) > limit else rows
+
+
+def labeled_sets(limit=None):
+    """{name: [(filename, text, label), ...]} of the labeled data."""
+    sets = {}
+    from learning.train_model import load_dataset
+    dataset = load_dataset()
+    if dataset is not None:
+        from sklearn.model_selection import train_test_split
+        # the same rows, order and split as train_model.py, so the holdout has no training rows
+        X, y = dataset
+        _, X_test, _, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        sets['dataset'] = _sample([(f'dataset:{i}.txt', text, int(label)) for i, text, label in zip(X.index, X, y)],
+                                  limit)
+        sets['dataset_holdout'] = _sample([(f'dataset:{i}.txt', text, int(label))
+                                           for i, text, label in zip(X_test.index, X_test, y_test)], limit)
+    samples_dir = os.path.join(DATA_DIR, 'samples')
+    samples = []
+    for name in sorted(os.listdir(samples_dir)) if os.path.isdir(samples_dir) else []:
+        parts = name.lower().replace('.', '_').split('_')
+        label = 0 if 'human' in parts else 1 if 'ai' in parts else None
+        if name.endswith('.txt') and label is not None:
+            with open(os.path.join(samples_dir, name), 'r', encoding='utf-8', errors='ignore') as f:
+                samples.append((name, f.read(), label))
+    if samples:
+        sets['samples'] = _sample(samples, limit)
+    return sets
+
+
+def synthetic_document(size, sentences, seed=0):
+    """About `size` bytes of shuffled dataset sentences in paragraphs of eight."""
+    rnd = random.Random(seed)
+    parts, total = [], 0
+    while total < size:
+        paragraph = ' '.join(rnd.choice(sentences) for _ in range(8))
+        parts.append(paragraph)
+        total += len(paragraph.encode('utf-8')) + 2
+    return '\n\n'.join(parts).encode('utf-8')[:size].decode('utf-8', errors='ignore')
+
+
+class PeakMemory:
+    """Highest resident set size of this process while the block runs, in MB,
+    sampled every `interval` seconds from /proc (ru_maxrss elsewhere)."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._page_mb = os.sysconf('SC_PAGE_SIZE') / (1 << 20) if hasattr(os, 'sysconf') else None
+
+    def _rss_mb(self):
+        try:
+            with open('/proc/self/statm', 'r') as f:
+                return int(f.read().split()[1]) * self._page_mb
+        except (OSError, TypeError):
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, self._rss_mb())
+
+    def __enter__(self):
+        self.peak_mb = self._rss_mb()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, self._rss_mb())
+
+
+def percentiles(values):
+    values = np.asarray(values, dtype=float) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p90_ms': round(float(np.percentile(values, 90)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'max_ms': round(float(values.max()), 3),
+        'mean_ms': round(float(values.mean()), 3),
+    }
+
+
+def run_documents(documents, corpus_dir):
+    """Analyse (filename, text) pairs one after another; per-document results and timings."""
+    from pipeline.analyze import analyze_document
+    runs = []
+    for filename, text in documents:
+        data = text.encode('utf-8')
+        with PeakMemory() as memory:
+            started = time.perf_counter()
+            report = analyze_document(data, corpus_dir, filename, ingest=False)
+            total = time.perf_counter() - started
+        ai = report['scores']['ai_score']
+        runs.append({
+            'bytes': len(data),
+            'total_s': total,
+            'stages': report['timings'],
+            'ai_score': ai['score'] if isinstance(ai, dict) else ai,
+            'final_probability': report['scores']['final']['final_probability'],
+            'peak_rss_mb': memory.peak_mb,
+        })
+    return runs
+
+
+def latency_summary(runs):
+    total = sum(r['total_s'] for r in runs)
+    stages = sorted({name for r in runs for name in r['stages']})
+    return {
+        'documents': len(runs),
+        'total': percentiles([r['total_s'] for r in runs]),
+        'stages': {name: percentiles([r['stages'][name] for r in runs if name in r['stages']]) for name in stages},
+        'docs_per_s': round(len(runs) / total, 3) if total else None,
+        'mb_per_s': round(sum(r['bytes'] for r in runs) / (1 << 20) / total, 4) if total else None,
+        'peak_rss_mb': round(max(r['peak_rss_mb'] for r in runs), 1),
+    }
+
+
+def classification_summary(labels, runs):
+    from sklearn.metrics import f1_score, precision_score, recall_score, roc_auc_score
+    from scoring.score import REJECT_THRESHOLD, REVIEW_THRESHOLD
+    y = np.asarray(labels)
+    ai = np.array([r['ai_score'] for r in runs])
+    final = np.array([r['final_probability'] for r in runs])
+    both = len(set(labels)) > 1
+    summary = {
+        'documents': len(labels),
+        'ai_documents': int(y.sum()),
+        'roc_auc_ai_score': round(float(roc_auc_score(y, ai)), 4) if both else None,
+        'roc_auc_final_probability': round(float(roc_auc_score(y, final)), 4) if both else None,
+    }
+    # aggregate_scores flags a paper above REVIEW_THRESHOLD and rejects it above REJECT_THRESHOLD
+    for name, threshold in (('review', REVIEW_THRESHOLD), ('reject', REJECT_THRESHOLD)):
+        predicted = final > threshold
+        summary[f'{name}_threshold'] = threshold
+        summary[f'{name}_precision'] = round(float(precision_score(y, predicted, zero_division=0)), 4)
+        summary[f'{name}_recall'] = round(float(recall_score(y, predicted, zero_division=0)), 4)
+        summary[f'{name}_f1'] = round(float(f1_score(y, predicted, zero_division=0)), 4)
+    return summary
+
+
+def key_metrics(result):
+    """{'section.run.metric': number} of the numbers worth diffing between commits."""
+    flat = {}
+    for name, summary in result.get('accuracy', {}).items():
+        for metric, value in summary.items():
+            if isinstance(value, (int, float)) and not metric.endswith('_threshold'):
+                flat[f'accuracy.{name}.{metric}'] = value
+    for section in ('labeled', 'synthetic'):
+        for name, summary in result.get(section, {}).items():
+            prefix = f'{section}.{name}.'
+            flat[prefix + 'p50_ms'] = summary['total']['p50_ms']
+            flat[prefix + 'p99_ms'] = summary['total']['p99_ms']
+            flat[prefix + 'docs_per_s'] = summary['docs_per_s']
+            flat[prefix + 'peak_rss_mb'] = summary['peak_rss_mb']
+            for stage, stats in summary['stages'].items():
+                flat[f'{prefix}{stage}.p50_ms'] = stats['p50_ms']
+    return flat
+
+
+def compare(old, new, min_change=0.1, min_ms=1.0):
+    """Print accuracy metrics that changed, and latency, throughput and memory
+    figures that moved by more than `min_change` (and `min_ms` for times)."""
+    before, after = key_metrics(old), key_metrics(new)
+    print(f"\nChanges since {old.get('commit')} ({old.get('created')}):")
+    changed = 0
+    for name in sorted(set(before) & set(after)):
+        a, b = before[name], after[name]
+        if a is None or b is None or a == b:
+            continue
+        if not name.startswith('accuracy.'):
+            if abs(b - a) <= min_change * abs(a) or (name.endswith('_ms') and abs(b - a) < min_ms):
+                continue
+        changed += 1
+        print(f"  {name}: {a} -> {b}" + (f" ({(b - a) / a * 100:+.1f}%)" if a else ""))
+    if not changed:
+        print("  nothing")
+
+
+def run(sizes, repeats, limit, corpus_dir):
+    from analysis.ai_detector import model_fingerprint
+    import sklearn
+    result = {
+        'commit': git_commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'model_sha256': model_fingerprint(),
+        'environment': {
+            'python': platform.python_version(), 'numpy': np.__version__, 'sklearn': sklearn.__version__,
+            'cpus': os.cpu_count(), 'pipeline_mode': os.environ.get('PIPELINE_MODE', 'thread'),
+        },
+        'accuracy': {}, 'labeled': {}, 'synthetic': {},
+    }
+    sets = labeled_sets(limit)
+    sentences = [s.strip() + '.' for _, text, _ in sets.get('dataset', []) for s in text.split('.') if s.strip()]
+    # the first analysis opens the plagiarism index and loads the models; keep it out of the numbers
+    run_documents([('warmup.txt', synthetic_document(4096, sentences or ['Warm-up sentence.']))], corpus_dir)
+
+    for name, docs in sets.items():
+        print(f"Analysing {len(docs)} documents of {name}...")
+        runs = run_documents([(filename, text) for filename, text, _ in docs], corpus_dir)
+        result['accuracy'][name] = classification_summary([label for _, _, label in docs], runs)
+        result['labeled'][name] = latency_summary(runs)
+
+    for size in sizes:
+        print(f"Analysing {repeats} synthetic documents of {size:,} bytes...")
+        docs = [(f'synthetic-{size}-{i}.txt', synthetic_document(size, sentences or ['Filler sentence.'], seed=i))
+                for i in range(repeats)]
+        result['synthetic'][str(size)] = latency_summary(run_documents(docs, corpus_dir))
+    result['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+
+def print_result(result):
+    for name, summary in result['accuracy'].items():
+        print(f"\n{name}: {summary['documents']} documents, ROC AUC ai {summary['roc_auc_ai_score']} "
+              f"final {summary['roc_auc_final_probability']}, F1 review {summary['review_f1']} "
+              f"reject {summary['reject_f1']}")
+    print(f"\n{'run':>16} {'docs':>5} {'p50 ms':>10} {'p99 ms':>10} {'docs/s':>8} {'MB/s':>8} {'peak MB':>8}")
+    for section in ('labeled', 'synthetic'):
+        for name, s in result[section].items():
+            print(f"{name:>16} {s['documents']:>5} {s['total']['p50_ms']:>10.1f} {s['total']['p99_ms']:>10.1f} "
+                  f"{s['docs_per_s']:>8.2f} {s['mb_per_s']:>8.3f} {s['peak_rss_mb']:>8.1f}")
+    slowest = max(result['synthetic'].values() or result['labeled'].values(), key=lambda s: s['total']['p50_ms'],
+                  default=None)
+    if slowest:
+        print("\nStage p50 (ms) of the slowest run: " +
+              ', '.join(f"{name} {s['p50_ms']:.1f}" for name, s in slowest['stages'].items()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Accuracy and latency benchmark of the whole detector pipeline")
+    parser.add_argument('--sizes', default='1K,10K,100K,1M,10M', help="synthetic document sizes ('' for none)")
+    parser.add_argument('--repeats', type=int, default=3, help="synthetic documents per size")
+    parser.add_argument('--limit', type=int, help="at most this many documents per labeled set")
+    parser.add_argument('--corpus-dir', default=DATA_DIR, help="plagiarism corpus to check against")
+    parser.add_argument('--output', help="result JSON (default: data/benchmarks/detector-<commit>.json)")
+    parser.add_argument('--compare', help="earlier result JSON to diff against")
+    args = parser.parse_args()
+
+    sizes = [parse_size(s) for s in args.sizes.split(',') if s.strip()]
+    result = run(sizes, args.repeats, args.limit, args.corpus_dir)
+    print_result(result)
+    output = args.output or os.path.join(OUTPUT_DIR, f"detector-{result['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+    print(f"\nResults written to {output}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(json.load(f), result)
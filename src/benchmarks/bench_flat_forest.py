@@ -0,0 +1,95 @@
+"""Load time and single-document latency of the flat Random Forest export
+against the pickled sklearn pipeline, and a check that both give
+bit-identical probabilities.
+
+Load time is the time a fresh interpreter takes to import the detector
+module and load each model (AI_FLAT_MODEL=1 or 0), imports included. Texts are
+the training datasets in data/dataset plus the .txt files in data/ (or
+--texts DIR).
+
+    python src/benchmarks/bench_flat_forest.py [--texts DIR] [--repeat 200]
+"""
+
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SRC_DIR)
+
+from analysis.ai_detector import FLAT_MODEL_PATH, MODEL_PATH, load_flat_model, model_fingerprint  # noqa: E402
+
+
+def load_seconds(flat, runs=3):
+    """Best wall time of importing the detector module and loading the model in a new interpreter."""
+    code = (f"import sys, time, warnings; warnings.simplefilter('ignore'); sys.path.insert(0, {SRC_DIR!r}); "
+            f"t = time.perf_counter(); import analysis.ai_detector as d; d.current_model(); print(time.perf_counter() - t)")
+    env = dict(os.environ, AI_FLAT_MODEL='1' if flat else '0')
+    times = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, env=env).stdout
+        times.append(float(out.strip().splitlines()[-1]))
+    return min(times)
+
+
+def read_texts(texts_dir):
+    texts = []
+    dataset_dir = os.path.join(os.path.dirname(SRC_DIR), 'data', 'dataset')
+    for name in sorted(os.listdir(dataset_dir)) if os.path.isdir(dataset_dir) else []:
+        if name.endswith('.csv'):
+            with open(os.path.join(dataset_dir, name), 'r', encoding='utf-8', newline='') as f:
+                texts.extend(row['text'] for row in csv.DictReader(f) if row.get('text'))
+    for name in sorted(os.listdir(texts_dir)):
+        if name.endswith('.txt'):
+            with open(os.path.join(texts_dir, name), 'r', encoding='utf-8', errors='ignore') as f:
+                texts.append(f.read())
+    return texts
+
+
+def latency_ms(model, texts, repeat):
+    """Mean milliseconds of predict_proba on one document."""
+    started = time.perf_counter()
+    for i in range(repeat):
+        model.predict_proba([texts[i % len(texts)]])
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the flat Random Forest export")
+    parser.add_argument('--texts', default=os.path.join(os.path.dirname(SRC_DIR), 'data'),
+                        help="directory of .txt files to score")
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    texts = read_texts(args.texts)
+    if not texts:
+        sys.exit(f"No .txt files in {args.texts}")
+    import joblib
+    pipeline = joblib.load(MODEL_PATH)
+    flat = load_flat_model(FLAT_MODEL_PATH, model_fingerprint())
+    if flat is None:
+        sys.exit(f"No up-to-date flat export at {FLAT_MODEL_PATH}; run src/learning/train_model.py --export-only")
+
+    expected = pipeline.predict_proba(texts)
+    got = flat.predict_proba(texts)
+    identical = bool(np.array_equal(expected, got))
+    single = all(np.array_equal(pipeline.predict_proba([t]), flat.predict_proba([t])) for t in texts)
+
+    rows = {}
+    for name, model in (('sklearn', pipeline), ('flat', flat)):
+        model.predict_proba(texts[:1])  # warm up
+        rows[name] = {'load_s': load_seconds(name == 'flat'), 'latency_ms': latency_ms(model, texts, args.repeat)}
+
+    print(f"{len(texts)} documents, bit-identical: batch {identical}, one by one {single}")
+    print(f"\n{'model':>8} {'load s':>8} {'ms/doc':>8}")
+    for name, r in rows.items():
+        print(f"{name:>8} {r['load_s']:>8.3f} {r['latency_ms']:>8.2f}")
+    print(json.dumps(rows))
+    if not (identical and single):
+        sys.exit(1)
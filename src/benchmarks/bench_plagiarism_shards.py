@@ -0,0 +1,132 @@
+"""Query latency and memory of the plagiarism index against its shard count.
+
+Builds a synthetic corpus (or uses --corpus), indexes it with each shard
+count and times analyze() on submissions that copy parts of corpus
+documents. Memory is the proportional set size (PSS: pages shared between
+processes are split among them) of this process and of the shard workers
+after the queries.
+
+    python src/benchmarks/bench_plagiarism_shards.py [--documents 2000] [--shards 1,2,4,8]
+                                                     [--workers N] [--queries 50] [--corpus DIR]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from analysis.plagiarism_shards import SHARD_WORKERS, ShardedIndex
+
+
+def synthetic_corpus(corpus_dir, documents, words_per_doc=1500, vocabulary=20000, seed=0):
+    """Random-word documents; Zipf-distributed so common words repeat like real text."""
+    rng = np.random.default_rng(seed)
+    letters = np.array(list('abcdefghijklmnopqrstuvwxyz'))
+    vocab = [''.join(rng.choice(letters, size=rng.integers(2, 10))) for _ in range(vocabulary)]
+    weights = 1.0 / np.arange(1, vocabulary + 1)
+    weights /= weights.sum()
+    os.makedirs(corpus_dir, exist_ok=True)
+    for i in range(documents):
+        words = [vocab[j] for j in rng.choice(vocabulary, size=words_per_doc, p=weights)]
+        sentences = [' '.join(words[k:k + 15]) + '.' for k in range(0, len(words), 15)]
+        with open(os.path.join(corpus_dir, f'doc{i:06d}.txt'), 'w', encoding='utf-8') as f:
+            f.write(' '.join(sentences))
+
+
+def make_queries(corpus_dir, count, seed=1):
+    """Submissions made of ten-sentence passages copied from three random corpus files."""
+    rnd = random.Random(seed)
+    names = sorted(n for n in os.listdir(corpus_dir) if n.endswith('.txt'))
+    queries = []
+    for _ in range(count):
+        parts = []
+        for name in rnd.sample(names, min(3, len(names))):
+            with open(os.path.join(corpus_dir, name), 'r', encoding='utf-8') as f:
+                sentences = f.read().split('. ')
+            start = rnd.randrange(max(1, len(sentences) - 10))
+            parts.extend(sentences[start:start + 10])
+        rnd.shuffle(parts)
+        queries.append('. '.join(parts))
+    return queries
+
+
+def pss_mb(pids):
+    """Summed proportional set size of `pids` from /proc, in MB (None where unavailable)."""
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+                for line in f:
+                    if line.startswith('Pss:'):
+                        total += int(line.split()[1])
+        except OSError:
+            return None
+    return total / 1024
+
+
+def run(corpus_dir, shard_counts, workers, queries, work_dir):
+    texts = make_queries(corpus_dir, queries)
+    rows = []
+    for shards in shard_counts:
+        root = os.path.join(work_dir, f'shards-{shards}')
+        started = time.perf_counter()
+        index = ShardedIndex(root, corpus_dir, shards=shards, workers=workers)
+        index.refresh(force=True)
+        build = time.perf_counter() - started
+        index.analyze(texts[0])  # start the workers and map the shards
+        latencies = []
+        for text in texts:
+            t = time.perf_counter()
+            index.analyze(text)
+            latencies.append((time.perf_counter() - t) * 1000)
+        worker_pids = index.worker_pids()
+        workers_pss = pss_mb(worker_pids) if worker_pids else 0
+        rows.append({
+            'shards': shards,
+            'documents': index.stats()['documents'],
+            'build_s': build,
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95)),
+            'mean_ms': float(np.mean(latencies)),
+            'pss_mb': pss_mb([os.getpid()]),
+            'workers_pss_mb': workers_pss,
+        })
+        index.close()
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark plagiarism query latency against the shard count")
+    parser.add_argument('--documents', type=int, default=2000, help="size of the synthetic corpus")
+    parser.add_argument('--corpus', help="directory of .txt files to use instead of a synthetic corpus")
+    parser.add_argument('--shards', default='1,2,4,8', help="comma-separated shard counts")
+    parser.add_argument('--workers', type=int, default=SHARD_WORKERS or (os.cpu_count() or 1),
+                        help="shard worker processes (0: search shards in this process)")
+    parser.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='plagiarism-bench-')
+    try:
+        corpus_dir = args.corpus
+        if not corpus_dir:
+            corpus_dir = os.path.join(work_dir, 'corpus')
+            print(f"Generating {args.documents} documents...")
+            synthetic_corpus(corpus_dir, args.documents)
+        rows = run(corpus_dir, [int(s) for s in args.shards.split(',')], args.workers, args.queries, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n{'shards':>6} {'docs':>8} {'build s':>8} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8} "
+          f"{'PSS MB':>8} {'workers MB':>10}")
+    for r in rows:
+        workers_pss = f"{r['workers_pss_mb']:.1f}" if r['workers_pss_mb'] is not None else '-'
+        pss = f"{r['pss_mb']:.1f}" if r['pss_mb'] is not None else '-'
+        print(f"{r['shards']:>6} {r['documents']:>8} {r['build_s']:>8.2f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+              f"{r['mean_ms']:>8.2f} {pss:>8} {workers_pss:>10}")
@@ -0,0 +1,109 @@
+"""Memory of N analysis workers that each load the detector model, with the
+sklearn pipeline, the flat export read into memory and the flat export
+memory-mapped (AI_FLAT_MODEL / AI_FLAT_MMAP).
+
+Every worker is a fresh interpreter, like an ANALYSIS_MODE=process or
+uvicorn worker. It imports the detector module, then loads the model and
+scores one text; all N are measured from /proc/<pid>/smaps_rollup while
+they are alive at the same time:
+
+    rss     resident pages, shared ones counted in full
+    pss     resident pages, shared ones divided among the processes sharing them;
+            the sum over the workers is what they cost the machine
+    uss     pages only this worker has (private)
+    model   how much the RSS grew with loading the model
+
+    python src/benchmarks/bench_worker_memory.py [--workers 4] [--model PATH] [--modes sklearn,flat,flat-mmap]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+MODES = {
+    'sklearn': {'AI_FLAT_MODEL': '0'},
+    'flat': {'AI_FLAT_MODEL': '1', 'AI_FLAT_MMAP': '0'},
+    'flat-mmap': {'AI_FLAT_MODEL': '1', 'AI_FLAT_MMAP': '1'},
+}
+
+# waits for a line on stdin before loading and before exiting, so all workers are measured together
+WORKER = (f"import sys, warnings; warnings.simplefilter('ignore'); sys.path.insert(0, {SRC_DIR!r}); "
+          "import analysis.ai_detector as d; print('imported', flush=True); sys.stdin.readline(); "
+          "m = d.current_model(); m.warm_up(); print('loaded', m.path, flush=True); sys.stdin.readline()")
+
+
+def memory_kb(pid):
+    """Rss, Pss and Private_* (kB) of a process, from smaps_rollup."""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                fields[name] = int(value.split()[0])
+    return {'rss': fields['Rss'], 'pss': fields['Pss'],
+            'uss': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)}
+
+
+def expect(worker, word):
+    """The rest of the worker's next output line starting with `word` (it also prints log lines)."""
+    for line in worker.stdout:
+        if line.startswith(word):
+            return line.split()[1:]
+    raise RuntimeError(f"Worker {worker.pid} exited before saying {word!r}: {worker.stderr.read()}")
+
+
+def measure(mode, workers, model_path=None):
+    env = dict(os.environ, **MODES[mode])
+    if model_path:
+        env['AI_MODEL_PATH'] = model_path
+    procs = [subprocess.Popen([sys.executable, '-c', WORKER], env=env, text=True, stdin=subprocess.PIPE,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE) for _ in range(workers)]
+    try:
+        for proc in procs:
+            expect(proc, 'imported')
+        before = [memory_kb(proc.pid) for proc in procs]
+        paths = set()
+        for proc in procs:
+            proc.stdin.write('\n')
+            proc.stdin.flush()
+        for proc in procs:
+            paths.update(expect(proc, 'loaded'))
+        after = [memory_kb(proc.pid) for proc in procs]
+    finally:
+        for proc in procs:
+            proc.stdin.close()
+            proc.wait(timeout=30)
+
+    def mean_mb(rows, key):
+        return round(sum(row[key] for row in rows) / len(rows) / 1024, 2)
+
+    return {
+        'workers': workers,
+        'model': sorted(paths),
+        'rss_mb': mean_mb(after, 'rss'),
+        'pss_mb': mean_mb(after, 'pss'),
+        'uss_mb': mean_mb(after, 'uss'),
+        'model_rss_mb': round(mean_mb(after, 'rss') - mean_mb(before, 'rss'), 2),
+        'model_uss_mb': round(mean_mb(after, 'uss') - mean_mb(before, 'uss'), 2),
+        'total_pss_mb': round(sum(row['pss'] for row in after) / 1024, 1),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Per-worker memory of the detector model")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--model', help="model .joblib to load (default: the one detect_ai serves)")
+    parser.add_argument('--modes', default=','.join(MODES), help="comma-separated subset of " + ', '.join(MODES))
+    args = parser.parse_args()
+
+    results = {mode: measure(mode, args.workers, args.model) for mode in args.modes.split(',')}
+    print(f"{args.workers} workers, MB per worker (total PSS of all workers)\n")
+    print(f"{'mode':>10} {'rss':>8} {'pss':>8} {'uss':>8} {'model rss':>10} {'model uss':>10} {'total pss':>10}")
+    for mode, r in results.items():
+        print(f"{mode:>10} {r['rss_mb']:>8.1f} {r['pss_mb']:>8.1f} {r['uss_mb']:>8.1f} "
+              f"{r['model_rss_mb']:>10.2f} {r['model_uss_mb']:>10.2f} {r['total_pss_mb']:>10.1f}")
+    print(json.dumps(results))
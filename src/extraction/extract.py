@@ -1,18 +1,35 @@
+import io
 import os
 
-def extract_text(path):
+
+def _open_source(source):
+    """Return a binary file object for a path, bytes or file-like source."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, 'rb')
+    return source
+
+
+def extract_text(source, filename=None):
     """Extract text from .txt, .pdf, or image files (.png, .jpg, .jpeg).
+    `source` is a path, the file's bytes or a binary file-like object; for
+    the latter two pass `filename` so the format can be told from its extension.
     Returns (text, metadata)
     """
-    metadata = {'title': os.path.basename(path)}
+    if filename is None:
+        filename = os.fspath(source) if isinstance(source, (str, os.PathLike)) else 'upload'
+    metadata = {'title': os.path.basename(filename)}
     text = ""
-    ext = os.path.splitext(path)[1].lower()
+    ext = os.path.splitext(filename)[1].lower()
+    stream = None
     
     try:
+        stream = _open_source(source)
         if ext == '.pdf':
             try:
                 from PyPDF2 import PdfReader
-                reader = PdfReader(path)
+                reader = PdfReader(stream)
                 pages = [p.extract_text() for p in reader.pages]
                 text = "\n".join(p for p in pages if p)
             except Exception:
@@ -44,7 +61,7 @@ def extract_text(path):
                         break
                         
                 # Attempt OCR
-                image = Image.open(path)
+                image = Image.open(stream)
                 text = pytesseract.image_to_string(image)
                 
                 if not text.strip():
@@ -63,9 +80,9 @@ def extract_text(path):
             import pandas as pd
             try:
                 if ext == '.csv':
-                    df = pd.read_csv(path)
+                    df = pd.read_csv(stream)
                 else:
-                    df = pd.read_excel(path)
+                    df = pd.read_excel(stream)
                 
                 # Convert all cells to string and join them
                 text = "\n".join(df.astype(str).apply(lambda x: ' '.join(x), axis=1))
@@ -73,11 +90,14 @@ def extract_text(path):
                 text = f"Error extracting text from spreadsheet: {e}"
 
         else:
-            # Assume text file
-            with open(path, 'r', encoding='utf-8') as f:
-                text = f.read()
+            # Assume text file (newlines normalised as text-mode open() would)
+            text = stream.read().decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
                 
     except Exception as e:
         text = f"Error reading file: {e}"
+    finally:
+        # only close what we opened ourselves
+        if stream is not None and stream is not source:
+            stream.close()
         
     return text, metadata
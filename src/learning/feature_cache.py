@@ -0,0 +1,149 @@
+"""On-disk cache of training features, reused across training runs and tuning trials.
+
+Two kinds of entries live under data/cache/features (FEATURE_CACHE_DIR):
+
+- Dense per-document rows (dense()): e.g. the GenAI feature matrix, whose
+  regex and entropy statistics are the slow part of feature extraction.
+  Rows are keyed by the SHA-256 of the document text, so any run over an
+  overlapping set of documents only computes the new ones. Each batch of
+  new rows is appended as one part-*.npz (keys + float32 values) in a
+  directory named after a signature of everything the features depend on.
+
+- Whole sparse matrices (sparse()): e.g. a fitted TF-IDF vectorizer's
+  output for a training split, stored as a scipy .npz under a key that
+  combines the vectorizer settings and the hashes of the documents.
+"""
+
+import hashlib
+import json
+import os
+import uuid
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+import scipy.sparse as sp
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+FEATURE_CACHE_DIR = os.environ.get('FEATURE_CACHE_DIR', os.path.join(BASE_DIR, 'data', 'cache', 'features'))
+
+
+def text_key(text: str) -> int:
+    """Cache key of one document: the first 8 bytes of the SHA-256 of its text."""
+    return int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+
+
+def text_keys(texts: Sequence[str]) -> np.ndarray:
+    return np.fromiter((text_key(t) for t in texts), dtype=np.uint64, count=len(texts))
+
+
+def corpus_key(texts: Sequence[str]) -> str:
+    """Hash of an ordered list of documents."""
+    return hashlib.sha256(text_keys(texts).tobytes()).hexdigest()[:16]
+
+
+def signature(*parts) -> str:
+    """Short hash of JSON-serializable `parts` (settings, file contents, ...)."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(json.dumps(part, sort_keys=True, default=str).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+def file_digest(path: str) -> Optional[str]:
+    """SHA-256 of a file's bytes, None if it does not exist."""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def genai_signature() -> str:
+    """Everything the GenAI feature matrix depends on: its columns and
+    scoring constants, the custom phrase lexicon and the n-gram model."""
+    from analysis import genai_features
+    from analysis.ngram_lm import LM_PATH
+    return signature('genai', genai_features.FEATURE_COLUMNS, genai_features.COMPOSITE_WEIGHTS,
+                     genai_features.PHRASE_FAMILIES, file_digest(genai_features.LEXICON_PATH),
+                     file_digest(os.path.join(LM_PATH, 'meta.json')))
+
+
+class FeatureCache:
+    """Dense per-document and sparse whole-matrix feature cache in `cache_dir`."""
+
+    def __init__(self, cache_dir: str = FEATURE_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._dense: Dict[str, tuple] = {}  # dir -> (sorted keys, values)
+        self.counters = {'dense_hits': 0, 'dense_misses': 0, 'sparse_hits': 0, 'sparse_misses': 0}
+
+    def _load_dense(self, path: str):
+        if path not in self._dense:
+            keys, values = [], []
+            if os.path.isdir(path):
+                for name in sorted(os.listdir(path)):
+                    if name.startswith('part-') and name.endswith('.npz'):
+                        with np.load(os.path.join(path, name)) as part:
+                            keys.append(part['keys'])
+                            values.append(part['values'])
+            if keys:
+                keys, values = np.concatenate(keys), np.concatenate(values)
+                keys, first = np.unique(keys, return_index=True)
+                self._dense[path] = (keys, values[first])
+            else:
+                self._dense[path] = (np.empty(0, dtype=np.uint64), None)
+        return self._dense[path]
+
+    def dense(self, name: str, sig: str, texts: Sequence[str],
+              compute: Callable[[Sequence[str]], np.ndarray]) -> np.ndarray:
+        """
+        Rows of `texts` from the cache `name`-`sig`; rows not cached yet are
+        computed with compute(list of texts) -> 2-D array and stored.
+        """
+        path = os.path.join(self.cache_dir, f'{name}-{sig}')
+        keys = text_keys(texts)
+        if len(keys) == 0:
+            return np.asarray(compute([]), dtype=np.float32)
+        cached_keys, cached_values = self._load_dense(path)
+        pos = np.minimum(np.searchsorted(cached_keys, keys), max(len(cached_keys) - 1, 0))
+        found = cached_keys[pos] == keys if len(cached_keys) else np.zeros(len(keys), dtype=bool)
+        missing = np.flatnonzero(~found)
+        self.counters['dense_hits'] += int(found.sum())
+        self.counters['dense_misses'] += len(missing)
+
+        new_keys, first = np.unique(keys[missing], return_index=True)
+        new_values = None
+        if len(new_keys):
+            new_values = np.asarray(compute([texts[i] for i in missing[first]]), dtype=np.float32)
+            os.makedirs(path, exist_ok=True)
+            tmp = os.path.join(path, f'.part-{uuid.uuid4().hex}.npz')
+            np.savez(tmp, keys=new_keys, values=new_values)
+            os.replace(tmp, os.path.join(path, os.path.basename(tmp)[1:]))
+            merged = np.concatenate([cached_keys, new_keys])
+            values = new_values if cached_values is None else np.concatenate([cached_values, new_values])
+            order = np.argsort(merged, kind='stable')
+            self._dense[path] = (merged[order], values[order])
+            cached_keys, cached_values = self._dense[path]
+
+        pos = np.searchsorted(cached_keys, keys)
+        return cached_values[pos]
+
+    def sparse(self, key: str, compute: Optional[Callable[[], sp.spmatrix]]) -> sp.csr_matrix:
+        """The sparse matrix stored under `key`, computed with compute() and stored on a miss
+        (compute=None: the entry must exist, KeyError otherwise)."""
+        path = os.path.join(self.cache_dir, f'sparse-{key}.npz')
+        if os.path.exists(path):
+            self.counters['sparse_hits'] += 1
+            return sp.load_npz(path).tocsr()
+        self.counters['sparse_misses'] += 1
+        if compute is None:
+            raise KeyError(f"No sparse matrix cached under {key} in {self.cache_dir}")
+        matrix = sp.csr_matrix(compute())
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = os.path.join(self.cache_dir, f'.sparse-{key}-{uuid.uuid4().hex}.npz')
+        sp.save_npz(tmp, matrix)
+        os.replace(tmp, path)
+        return matrix
+
+    def path(self, key: str, suffix: str) -> str:
+        """Location for another artifact stored next to the sparse entry `key` (e.g. a fitted vectorizer)."""
+        return os.path.join(self.cache_dir, f'sparse-{key}{suffix}')
@@ -0,0 +1,212 @@
+"""Durable store of reviewer feedback on detector verdicts (SQLite).
+
+POST /feedback appends one row per verdict: the report's content hash and
+the text, scores and GenAI features it was computed from, the model that
+produced it and the label the verdict implies. /analyze keeps those under
+the content hash in the documents table (remember()) for
+FEEDBACK_DOCUMENT_DAYS, independently of the result cache, which is
+cleared when a model is promoted or a report evicted; older documents are
+deleted every FEEDBACK_PRUNE_INTERVAL seconds by the API's background
+thread (start_pruning), not on the request path. Recording feedback
+is a single INSERT; retraining on it happens in learning/retrain.py, which
+reads the labeled rows it has not seen yet (its watermark is kept in the
+same database).
+
+A verdict gives a label either directly (label 'ai' or 'human') or
+through is_accurate: the reviewer confirms or flips the report's AI
+verdict (AI score >= 0.5).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+FEEDBACK_DB = os.environ.get('FEEDBACK_DB', os.path.join(BASE_DIR, 'data', 'feedback', 'feedback.sqlite3'))
+# How long the text and scores of an analysed document are kept for feedback on it
+FEEDBACK_DOCUMENT_DAYS = float(os.environ.get('FEEDBACK_DOCUMENT_DAYS', 30))
+# Seconds between deletions of documents older than that
+FEEDBACK_PRUNE_INTERVAL = float(os.environ.get('FEEDBACK_PRUNE_INTERVAL', 3600))
+
+LABELS = {'human': 0, 'ai': 1}
+AI_THRESHOLD = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    filename TEXT,
+    content_hash TEXT,
+    is_accurate INTEGER NOT NULL,
+    label INTEGER,              -- 1 ai, 0 human, NULL when the verdict cannot be turned into one
+    label_source TEXT,          -- 'reviewer' or 'verdict'
+    comments TEXT,
+    model_sha256 TEXT,
+    ai_score REAL,
+    ml_score REAL,
+    features TEXT,              -- JSON of the report's GenAI features
+    text TEXT                   -- the analysed body, what the detector scored
+);
+CREATE INDEX IF NOT EXISTS feedback_content_hash ON feedback (content_hash);
+CREATE TABLE IF NOT EXISTS documents (
+    content_hash TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    model_sha256 TEXT,
+    ai_score REAL,
+    ml_score REAL,
+    features TEXT,
+    text TEXT
+);
+CREATE INDEX IF NOT EXISTS documents_created ON documents (created);
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+def report_ai_scores(report: Optional[Dict]):
+    """(AI score, ML score) of a report, None for what it does not have."""
+    ai = ((report or {}).get('scores') or {}).get('ai_score')
+    if isinstance(ai, dict):
+        return ai.get('score'), ai.get('ml_score')
+    return ai, None
+
+
+def verdict_label(is_accurate: bool, ai_score: Optional[float]) -> Optional[int]:
+    """The label a reviewer's accurate/inaccurate verdict on a report implies."""
+    if ai_score is None:
+        return None
+    predicted = int(ai_score >= AI_THRESHOLD)
+    return predicted if is_accurate else 1 - predicted
+
+
+class FeedbackStore:
+    """Feedback rows in the SQLite database at `path` (one connection per thread)."""
+
+    def __init__(self, path: str = FEEDBACK_DB):
+        self.path = path
+        self._local = threading.local()
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            # readers (the retrain worker) never block the API's appends
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def remember(self, content_hash: str, report: Dict):
+        """Keep what feedback on the report of `content_hash` needs (its text,
+        scores, features and model) until prune_documents() forgets it."""
+        ai_score, ml_score = report_ai_scores(report)
+        features = (report.get('scores') or {}).get('genai_features')
+        self._db().execute(
+            'INSERT OR REPLACE INTO documents (content_hash, created, model_sha256, ai_score, ml_score, features, text) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (content_hash, time.time(), report.get('model_sha256'), ai_score, ml_score,
+             json.dumps(features) if features is not None else None,
+             (report.get('sections') or {}).get('body') or None))
+
+    def prune_documents(self, max_age_days: float = FEEDBACK_DOCUMENT_DAYS) -> int:
+        """Forget documents remembered more than `max_age_days` ago. Returns how many."""
+        cursor = self._db().execute('DELETE FROM documents WHERE created < ?', (time.time() - max_age_days * 86400,))
+        return cursor.rowcount
+
+    def document(self, content_hash: str) -> Optional[sqlite3.Row]:
+        """What remember() kept of the report of `content_hash`, if anything."""
+        return self._db().execute('SELECT * FROM documents WHERE content_hash = ?', (content_hash,)).fetchone()
+
+    def add(self, filename: Optional[str], is_accurate: bool, comments: Optional[str] = None,
+            content_hash: Optional[str] = None, label: Optional[str] = None, report: Optional[Dict] = None,
+            model_sha256: Optional[str] = None) -> Dict:
+        """Record one verdict; `report` is the analysis report it is about,
+        otherwise what remember() kept under `content_hash` is used."""
+        if report is not None:
+            ai_score, ml_score = report_ai_scores(report)
+            text = (report.get('sections') or {}).get('body') or None
+            features = (report.get('scores') or {}).get('genai_features')
+            features = json.dumps(features) if features is not None else None
+            model_sha256 = report.get('model_sha256') or model_sha256
+        else:
+            kept = self.document(content_hash) if content_hash else None
+            ai_score, ml_score, text, features = (None, None, None, None) if kept is None else (
+                kept['ai_score'], kept['ml_score'], kept['text'], kept['features'])
+            model_sha256 = (kept and kept['model_sha256']) or model_sha256
+        if label is not None:
+            label_id, source = LABELS[label], 'reviewer'
+        else:
+            label_id, source = verdict_label(is_accurate, ai_score), 'verdict'
+        cursor = self._db().execute(
+            'INSERT INTO feedback (created, filename, content_hash, is_accurate, label, label_source, comments, '
+            'model_sha256, ai_score, ml_score, features, text) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (time.time(), filename, content_hash, int(bool(is_accurate)), label_id,
+             source if label_id is not None else None, comments, model_sha256, ai_score, ml_score,
+             features, text))
+        return {'id': cursor.lastrowid, 'label': label_id, 'trainable': label_id is not None and text is not None}
+
+    def training_rows(self, after_id: int = 0) -> List[sqlite3.Row]:
+        """Labeled rows with text and id > `after_id`, oldest first."""
+        return self._db().execute(
+            'SELECT id, created, content_hash, label, label_source, text FROM feedback '
+            'WHERE id > ? AND label IS NOT NULL AND text IS NOT NULL ORDER BY id', (after_id,)).fetchall()
+
+    def latest_labels(self) -> List[sqlite3.Row]:
+        """The most recent label of every document with feedback; a reviewer's
+        explicit label wins over one implied by a verdict."""
+        latest = {}
+        for row in self.training_rows():
+            doc = row['content_hash'] or f"#{row['id']}"
+            kept = latest.get(doc)
+            if kept is None or row['label_source'] == 'reviewer' or kept['label_source'] != 'reviewer':
+                latest[doc] = row
+        return sorted(latest.values(), key=lambda row: row['id'])
+
+    def get_state(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        row = self._db().execute('SELECT value FROM state WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else default
+
+    def set_state(self, key: str, value):
+        self._db().execute('INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)', (key, str(value)))
+
+    def stats(self) -> Dict:
+        row = self._db().execute(
+            'SELECT COUNT(*) AS total, SUM(label IS NOT NULL AND text IS NOT NULL) AS trainable, '
+            'SUM(is_accurate) AS accurate, MAX(id) AS last_id FROM feedback').fetchone()
+        return {
+            'total': row['total'],
+            'trainable': row['trainable'] or 0,
+            'accurate': row['accurate'] or 0,
+            'last_id': row['last_id'] or 0,
+            'retrained_through': int(self.get_state('retrained_through', 0)),
+        }
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def run_pruning(store: FeedbackStore, interval: float = FEEDBACK_PRUNE_INTERVAL):
+    """Delete expired documents every `interval` seconds, forever."""
+    while True:
+        try:
+            pruned = store.prune_documents()
+            if pruned:
+                print(f"Feedback store: forgot {pruned} documents older than {FEEDBACK_DOCUMENT_DAYS:g} days")
+        except sqlite3.Error as e:
+            print(f"Pruning feedback documents failed: {e}")
+        time.sleep(interval)
+
+
+def start_pruning(store: FeedbackStore, interval: float = FEEDBACK_PRUNE_INTERVAL) -> threading.Thread:
+    """Run run_pruning on a daemon thread."""
+    thread = threading.Thread(target=run_pruning, args=(store, interval), name='feedback-prune', daemon=True)
+    thread.start()
+    return thread
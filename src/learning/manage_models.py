@@ -0,0 +1,98 @@
+"""Manage the versioned detector models in the model registry (analysis/model_registry.py).
+
+Processes serving detect_ai pick up promotions and shadow changes within
+AI_MODEL_RELOAD_INTERVAL seconds, without a restart.
+
+    python src/learning/manage_models.py list
+    python src/learning/manage_models.py register data/models/ai_detector_tuned.joblib [--metric roc_auc=0.97]
+                                                  [--notes TEXT] [--version NAME] [--promote]
+    python src/learning/manage_models.py promote v2
+    python src/learning/manage_models.py rollback
+    python src/learning/manage_models.py shadow v3 --rate 0.1
+    python src/learning/manage_models.py shadow --off
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from analysis.model_registry import RegistryError, get_registry
+
+
+def parse_metrics(pairs):
+    metrics = {}
+    for pair in pairs or []:
+        name, _, value = pair.partition('=')
+        try:
+            metrics[name] = float(value)
+        except ValueError:
+            metrics[name] = value
+    return metrics
+
+
+def print_status(registry):
+    status = registry.status()
+    print(f"Registry: {status['root']}")
+    if not status['versions']:
+        print("No models registered.")
+    for meta in status['versions']:
+        marker = '*' if meta['version'] == status['current'] else ' '
+        metrics = ' '.join(f"{k}={v}" for k, v in meta['metrics'].items())
+        print(f"{marker} {meta['version']:<8} {meta['created']}  {meta['sha256'][:12]}  "
+              f"{'flat' if meta['flat'] else 'joblib'}  {metrics}  {meta['notes']}")
+    if status['shadow']:
+        print(f"Shadow: {json.dumps(status['shadow'], indent=2)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the detector model registry")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help="registered versions, the promoted one marked *, and shadow results")
+    register = commands.add_parser('register', help="copy a trained model into a new version")
+    register.add_argument('model_path')
+    register.add_argument('--version', help="version name (default: v1, v2, ...)")
+    register.add_argument('--metric', action='append', metavar='NAME=VALUE', help="recorded in meta.json")
+    register.add_argument('--notes', default='')
+    register.add_argument('--promote', action='store_true', help="serve it right away")
+    promote = commands.add_parser('promote', help="serve a registered version")
+    promote.add_argument('version')
+    commands.add_parser('rollback', help="serve the previously promoted version again")
+    shadow = commands.add_parser('shadow', help="score a sample of traffic with a candidate version")
+    shadow.add_argument('version', nargs='?')
+    shadow.add_argument('--rate', type=float, default=0.1, help="fraction of requests to shadow")
+    shadow.add_argument('--off', action='store_true', help="stop shadow scoring")
+    args = parser.parse_args(argv)
+
+    registry = get_registry()
+    try:
+        if args.command == 'register':
+            meta = registry.register(args.model_path, args.version, parse_metrics(args.metric), args.notes)
+            print(f"Registered {args.model_path} as {meta['version']}")
+            if args.promote:
+                registry.promote(meta['version'])
+        elif args.command == 'promote':
+            registry.promote(args.version)
+        elif args.command == 'rollback':
+            registry.rollback()
+        elif args.command == 'shadow':
+            if args.off:
+                registry.clear_shadow()
+                print("Shadow scoring stopped")
+            elif not args.version:
+                parser.error("shadow needs a version or --off")
+            else:
+                registry.set_shadow(args.version, args.rate)
+                print(f"Shadow scoring {args.rate:.0%} of requests with {args.version}")
+        else:
+            print_status(registry)
+    except RegistryError as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
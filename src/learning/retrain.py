@@ -1,5 +1,201 @@
-def retrain(feedback, model_path=None):
-    """Placeholder retrain function. In production, use feedback to fine-tune models.
-    """
-    print("Retrain called with feedback:", feedback)
-    return True
+"""Background retraining of the AI detector on reviewer feedback.
+
+POST /feedback only appends to the feedback store (feedback_store.py).
+This worker, a separate low-priority process, wakes up every
+RETRAIN_INTERVAL seconds and retrains once RETRAIN_MIN_LABELS new labeled
+documents have come in, or once the oldest of fewer new labels has
+waited RETRAIN_MAX_DELAY seconds:
+
+- a served model that learns incrementally (partial_fit, e.g. the SGD
+  model of train_streaming.py) is updated with the new labels only;
+- any other model (the Random Forest) is refitted with its own
+  hyperparameters on the training split of data/dataset plus the latest
+  label of every document with feedback, weighted RETRAIN_FEEDBACK_WEIGHT.
+
+The result is scored on the held-out split of data/dataset, next to the
+served model, registered in the model registry with these metrics and
+published according to RETRAIN_PUBLISH: 'shadow' (the default, scored on
+RETRAIN_SHADOW_RATE of traffic next to the served model, for an operator
+to promote), 'register' or, only when asked for explicitly, 'promote'
+(workers switch to it within AI_MODEL_RELOAD_INTERVAL seconds). A model whose
+accuracy is more than RETRAIN_MAX_ACCURACY_DROP below the served one is
+registered only.
+
+    python src/learning/retrain.py [--once] [--force] [--publish shadow|register|promote]
+
+With RETRAIN_WORKER=1 the API starts the worker itself (start_worker).
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from analysis.model_registry import get_registry
+from learning.feedback_store import FeedbackStore
+
+RETRAIN_WORKER = os.environ.get('RETRAIN_WORKER', '0') == '1'
+RETRAIN_INTERVAL = float(os.environ.get('RETRAIN_INTERVAL', 300))
+RETRAIN_MIN_LABELS = int(os.environ.get('RETRAIN_MIN_LABELS', 20))
+RETRAIN_MAX_DELAY = float(os.environ.get('RETRAIN_MAX_DELAY', 24 * 3600))
+RETRAIN_FEEDBACK_WEIGHT = float(os.environ.get('RETRAIN_FEEDBACK_WEIGHT', 3))
+# feedback is user input: a retrained model is served only once someone promotes it, unless set to 'promote'
+RETRAIN_PUBLISH = os.environ.get('RETRAIN_PUBLISH', 'shadow')
+RETRAIN_SHADOW_RATE = float(os.environ.get('RETRAIN_SHADOW_RATE', 0.1))
+RETRAIN_MAX_ACCURACY_DROP = float(os.environ.get('RETRAIN_MAX_ACCURACY_DROP', 0.02))
+
+
+def served_model_path():
+    """(version, path) of the model detect_ai serves."""
+    from analysis.ai_detector import MODEL_PATH, MODEL_PINNED
+    meta = None if MODEL_PINNED else get_registry().current()
+    if meta is not None:
+        return meta['version'], get_registry().model_path(meta['version'])
+    return None, MODEL_PATH
+
+
+def holdout_split():
+    """(train texts, train labels, test texts, test labels) of data/dataset, split like train_model.py."""
+    from sklearn.model_selection import train_test_split
+    from learning.train_model import load_dataset
+    dataset = load_dataset()
+    if dataset is None:
+        return None
+    X_train, X_test, y_train, y_test = train_test_split(dataset[0], dataset[1], test_size=0.2, random_state=42)
+    return list(X_train), np.asarray(y_train, dtype=int), list(X_test), np.asarray(y_test, dtype=int)
+
+
+def accuracy(model, texts, labels):
+    if not len(labels):
+        return None
+    return round(float(np.mean((model.predict_proba(texts)[:, 1] >= 0.5) == labels)), 4)
+
+
+def update_incrementally(model, rows):
+    """partial_fit the final estimator of `model` on the new feedback rows."""
+    texts, labels = [row['text'] for row in rows], np.array([row['label'] for row in rows])
+    model.steps[-1][1].partial_fit(model[:-1].transform(texts), labels, classes=np.array([0, 1]))
+    return model
+
+
+def refit(model, split, store):
+    """A copy of `model` with the same hyperparameters, fitted on the training
+    split plus the latest feedback label of every document."""
+    from sklearn.base import clone
+    latest = store.latest_labels()
+    texts = split[0] + [row['text'] for row in latest]
+    labels = np.concatenate([split[1], np.array([row['label'] for row in latest], dtype=int)])
+    weights = np.concatenate([np.ones(len(split[1])), np.full(len(latest), RETRAIN_FEEDBACK_WEIGHT)])
+    fresh = clone(model)
+    fresh.fit(texts, labels, **{f'{fresh.steps[-1][0]}__sample_weight': weights})
+    estimator = fresh.steps[-1][1]
+    if hasattr(estimator, 'n_jobs'):
+        estimator.n_jobs = None  # single-threaded at inference, like train_model's forest
+    return fresh, len(latest)
+
+
+def publish(path, metrics, notes, policy=RETRAIN_PUBLISH):
+    """Register the model file `path` and promote or shadow it per `policy`."""
+    registry = get_registry()
+    meta = registry.register(path, metrics=metrics, notes=notes)
+    print(f"Registered retrained model as {meta['version']}: {metrics}")
+    baseline, score = metrics.get('baseline_accuracy'), metrics.get('accuracy')
+    if baseline is not None and score is not None and score < baseline - RETRAIN_MAX_ACCURACY_DROP:
+        print(f"Not publishing {meta['version']}: accuracy {score} is below the served model's {baseline}")
+    elif policy == 'promote':
+        registry.promote(meta['version'])
+    elif policy == 'shadow':
+        registry.set_shadow(meta['version'], RETRAIN_SHADOW_RATE)
+        print(f"Shadow scoring {RETRAIN_SHADOW_RATE:.0%} of requests with {meta['version']}")
+    return meta
+
+
+def retrain_once(store=None, force=False, policy=RETRAIN_PUBLISH):
+    """Retrain on the feedback that arrived since the last run, if there is
+    enough of it (or any, with `force`). Returns the registered version's metadata or None."""
+    store = store or FeedbackStore()
+    done = int(store.get_state('retrained_through', 0))
+    rows = store.training_rows(done)
+    if not rows:
+        return None
+    waited = time.time() - rows[0]['created']
+    if not force and len(rows) < RETRAIN_MIN_LABELS and waited < RETRAIN_MAX_DELAY:
+        print(f"{len(rows)} new feedback labels, waiting for {RETRAIN_MIN_LABELS}")
+        return None
+
+    import joblib
+    from learning.train_model import export_flat_model
+    version, path = served_model_path()
+    if not os.path.exists(path):
+        print(f"No served model at {path}; train one first")
+        return None
+    started = time.time()
+    served = joblib.load(path)
+    split = holdout_split()
+    if hasattr(served.steps[-1][1], 'partial_fit'):
+        model = update_incrementally(joblib.load(path), rows)
+        mode, labels = 'incremental', len(rows)
+    elif split is not None:
+        model, labels = refit(served, split, store)
+        mode = 'refit'
+    else:
+        print("No datasets found to refit the model on! Run the creation scripts first.")
+        return None
+
+    metrics = {'mode': mode, 'feedback_labels': labels, 'new_labels': len(rows), 'base_version': version}
+    if split is not None:
+        metrics['baseline_accuracy'] = accuracy(served, split[2], split[3])
+        metrics['accuracy'] = accuracy(model, split[2], split[3])
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, 'ai_detector_retrained.joblib')
+        joblib.dump(model, out)
+        try:
+            export_flat_model(out)
+        except ValueError as e:
+            print(f"No flat export: {e}")
+        meta = publish(out, metrics, f"retrained on feedback #{done + 1}-#{rows[-1]['id']}", policy)
+    store.set_state('retrained_through', rows[-1]['id'])
+    print(f"Retrained in {time.time() - started:.1f}s")
+    return meta
+
+
+def run_worker(interval=RETRAIN_INTERVAL, policy=RETRAIN_PUBLISH):
+    """Check for new feedback every `interval` seconds, forever."""
+    try:
+        os.nice(10)  # the API and analysis workers come first
+    except (AttributeError, OSError):
+        pass
+    store = FeedbackStore()
+    print(f"Retrain worker started (pid {os.getpid()}), checking every {interval:.0f}s")
+    while True:
+        try:
+            retrain_once(store, policy=policy)
+        except Exception as e:
+            print(f"Retraining failed: {e}")
+        time.sleep(interval)
+
+
+def start_worker():
+    """Run the worker in a separate process, so training never holds the API's GIL or cores."""
+    process = multiprocessing.get_context('spawn').Process(target=run_worker, name='retrain-worker', daemon=True)
+    process.start()
+    return process
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retrain the AI detector on reviewer feedback")
+    parser.add_argument('--once', action='store_true', help="check once instead of running as a worker")
+    parser.add_argument('--force', action='store_true', help="retrain on any new feedback (implies --once)")
+    parser.add_argument('--interval', type=float, default=RETRAIN_INTERVAL, help="seconds between checks")
+    parser.add_argument('--publish', choices=('shadow', 'register', 'promote'), default=RETRAIN_PUBLISH)
+    args = parser.parse_args()
+    if args.once or args.force:
+        retrain_once(force=args.force, policy=args.publish)
+    else:
+        run_worker(args.interval, args.publish)
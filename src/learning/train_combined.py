@@ -0,0 +1,108 @@
+"""Train one detector on the TF-IDF vector and the GenAI feature matrix together.
+
+Instead of blending the Random Forest probability and the GenAI composite
+60/40 in detect_ai, the classifier sees both feature sets: the TF-IDF
+columns followed by the FEATURE_COLUMNS of GenAIFeatureExtractor. Features
+come from the on-disk FeatureCache, so a second run (or a tuning trial)
+over the same documents skips the regex and entropy statistics and the
+TF-IDF transform.
+
+The result is saved as a make_combined_pipeline() Pipeline; detect_ai uses
+its probability as the score when AI_MODEL_PATH points at it.
+
+    python src/learning/train_combined.py [--output PATH] [--n-estimators 100] [--jobs 1]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import scipy.sparse as sp
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, classification_report
+from sklearn.model_selection import train_test_split
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from analysis.combined_model import make_combined_pipeline
+from analysis.genai_features import get_extractor
+from analysis.tfidf import make_vectorizer
+from learning.feature_cache import FeatureCache, corpus_key, genai_signature, signature
+from learning.train_model import load_dataset
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+OUTPUT_PATH = os.path.join(BASE_DIR, "data", "models", "ai_detector_combined.joblib")
+VECTORIZER_PARAMS = {'max_features': 5000}
+
+
+def genai_matrix(cache, texts, n_jobs=1):
+    """GenAI feature rows of `texts`, computed only for documents not cached yet."""
+    return cache.dense('genai', genai_signature(), texts,
+                       lambda missing: get_extractor().extract_feature_matrix(missing, n_jobs=n_jobs))
+
+
+def fit_vectorizer(cache, train_texts, params=VECTORIZER_PARAMS):
+    """(key, vectorizer) fitted on `train_texts`; the fitted vectorizer is cached too."""
+    key = signature('tfidf', params, corpus_key(train_texts))
+    path = cache.path(key, '.joblib')
+    if os.path.exists(path):
+        return key, joblib.load(path)
+    vectorizer = make_vectorizer(**params).fit(train_texts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    joblib.dump(vectorizer, path + '.tmp')
+    os.replace(path + '.tmp', path)
+    return key, vectorizer
+
+
+def combined_features(cache, vectorizer_key, vectorizer, texts, n_jobs=1, genai=True):
+    """hstack([TF-IDF, GenAI features]) of `texts`, in the column order of
+    make_combined_pipeline(); only the TF-IDF part with genai=False."""
+    tfidf = cache.sparse(signature(vectorizer_key, corpus_key(texts)), lambda: vectorizer.transform(texts))
+    if not genai:
+        return tfidf
+    return sp.hstack([tfidf, sp.csr_matrix(genai_matrix(cache, texts, n_jobs))], format='csr')
+
+
+def train_combined(output=OUTPUT_PATH, n_estimators=100, n_jobs=1, cache=None):
+    print("Loading datasets...")
+    dataset = load_dataset()
+    if dataset is None:
+        print("No datasets found! Run the creation scripts first.")
+        return None
+    texts, y = dataset
+    X_train, X_test, y_train, y_test = train_test_split(list(texts), np.asarray(y, dtype=int),
+                                                        test_size=0.2, random_state=42)
+    cache = cache or FeatureCache()
+
+    started = time.time()
+    key, vectorizer = fit_vectorizer(cache, X_train)
+    F_train = combined_features(cache, key, vectorizer, X_train, n_jobs)
+    F_test = combined_features(cache, key, vectorizer, X_test, n_jobs)
+    print(f"Features: {F_train.shape[1]} columns in {time.time() - started:.1f}s, cache {cache.counters}")
+
+    print("Training Random Forest on TF-IDF + GenAI features...")
+    classifier = RandomForestClassifier(n_estimators=n_estimators, random_state=42, n_jobs=n_jobs)
+    classifier.fit(F_train, y_train)
+    y_pred = classifier.predict(F_test)
+    print("Model Performance:")
+    print(classification_report(y_test, y_pred))
+    print(f"Accuracy: {accuracy_score(y_test, y_pred):.4f}")
+
+    model = make_combined_pipeline(vectorizer, classifier)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    joblib.dump(model, output + '.tmp')
+    os.replace(output + '.tmp', output)
+    print(f"Model saved to {output}")
+    return model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the combined TF-IDF + GenAI feature detector")
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    parser.add_argument('--n-estimators', type=int, default=100)
+    parser.add_argument('--jobs', type=int, default=1, help="processes for feature extraction and trees")
+    args = parser.parse_args()
+    train_combined(args.output, args.n_estimators, args.jobs)
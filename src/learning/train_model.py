@@ -1,20 +1,35 @@
 import os
+import sys
+import argparse
+import hashlib
 import pandas as pd
 import joblib
 from sklearn.model_selection import train_test_split
-from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import classification_report, accuracy_score
 
-def train_model():
-    print("Loading datasets...")
-    
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# the similar-document index tokenizes with the same vectorizer settings
+from analysis.tfidf import make_vectorizer
+from analysis.ai_detector import save_flat_model
+
+
+def export_flat_model(model_path):
+    """Write the array export of the pipeline in `model_path` next to it
+    (see analysis/ai_detector.py), for fast loading and scoring."""
+    with open(model_path, 'rb') as f:
+        model_sha256 = hashlib.sha256(f.read()).hexdigest()
+    flat_path = os.path.splitext(model_path)[0] + '.flat'
+    save_flat_model(joblib.load(model_path), flat_path, model_sha256)
+    print(f"Flat model exported to {flat_path}")
+
+def load_dataset():
+    """Texts and 0 (human) / 1 (ai) labels of the datasets in data/dataset, or None if there are none."""
     base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     data_dir = os.path.join(base_dir, "data", "dataset")
-    models_dir = os.path.join(base_dir, "data", "models")
-    os.makedirs(models_dir, exist_ok=True)
-    
+
     # Load available datasets
     dfs = []
     
@@ -32,8 +47,7 @@ def train_model():
         dfs.append(df2)
         
     if not dfs:
-        print("No datasets found! Run the creation scripts first.")
-        return
+        return None
 
     full_df = pd.concat(dfs, ignore_index=True)
     print(f"Total samples: {len(full_df)}")
@@ -46,8 +60,20 @@ def train_model():
     # Handle any missing values
     full_df = full_df.dropna(subset=['text', 'label_id'])
     
-    X = full_df['text']
-    y = full_df['label_id']
+    return full_df['text'], full_df['label_id']
+
+def train_model():
+    print("Loading datasets...")
+    
+    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    models_dir = os.path.join(base_dir, "data", "models")
+    os.makedirs(models_dir, exist_ok=True)
+    
+    dataset = load_dataset()
+    if dataset is None:
+        print("No datasets found! Run the creation scripts first.")
+        return
+    X, y = dataset
     
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
     
@@ -55,7 +81,7 @@ def train_model():
     
     # Create a pipeline with TF-IDF and Random Forest
     pipeline = Pipeline([
-        ('tfidf', TfidfVectorizer(stop_words='english', max_features=5000)),
+        ('tfidf', make_vectorizer(max_features=5000)),
         ('clf', RandomForestClassifier(n_estimators=100, random_state=42))
     ])
     
@@ -70,6 +96,15 @@ def train_model():
     model_path = os.path.join(models_dir, "ai_detector_rf.joblib")
     joblib.dump(pipeline, model_path)
     print(f"Model saved to {model_path}")
+    export_flat_model(model_path)
 
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description="Train the AI detector")
+    parser.add_argument('--export-only', action='store_true',
+                        help="only re-export the flat arrays of the existing model")
+    args = parser.parse_args()
+    if args.export_only:
+        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        export_flat_model(os.path.join(base_dir, "data", "models", "ai_detector_rf.joblib"))
+    else:
+        train_model()
@@ -0,0 +1,95 @@
+"""Train the n-gram language model used for perplexity scoring.
+
+The model is trained on human-written text only: the 'human' rows of the
+datasets in data/dataset plus any .txt files in --corpus. A held-out part
+of the human text (and the 'ai' rows, if any) calibrates the mapping from
+perplexity to an AI score.
+
+    python src/learning/train_ngram_lm.py [--corpus DIR] [--order 3] [--output DIR]
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from analysis.ngram_lm import (LM_PATH, NgramLanguageModel, save_model, sentence_tokens,
+                               set_calibration, train_kneser_ney)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATA_DIR = os.path.join(BASE_DIR, "data", "dataset")
+
+
+def load_texts(corpus_dir=None):
+    """Return (human_texts, ai_texts) from the datasets and corpus_dir."""
+    human, ai = [], []
+    for name in ("scholarly_data.csv", "hc3_authentic_subset.csv"):
+        path = os.path.join(DATA_DIR, name)
+        if not os.path.exists(path):
+            continue
+        df = pd.read_csv(path).dropna(subset=['text', 'label'])
+        human.extend(df.loc[df['label'] == 'human', 'text'].astype(str))
+        ai.extend(df.loc[df['label'] == 'ai', 'text'].astype(str))
+    if corpus_dir and os.path.isdir(corpus_dir):
+        for fname in sorted(os.listdir(corpus_dir)):
+            if fname.lower().endswith('.txt'):
+                with open(os.path.join(corpus_dir, fname), 'r', encoding='utf-8', errors='ignore') as f:
+                    human.append(f.read())
+    return human, ai
+
+
+def calibrate(model, human, ai):
+    """Center and scale of the perplexity -> AI score sigmoid, in log2 perplexity."""
+    human_ppl = np.array([model.score(t)['log2_perplexity'] for t in human if t.strip()])
+    ai_ppl = np.array([model.score(t)['log2_perplexity'] for t in ai if t.strip()])
+    if len(human_ppl) == 0:
+        return {}
+    h = float(np.median(human_ppl))
+    if len(ai_ppl) and np.median(ai_ppl) < h:
+        a = float(np.median(ai_ppl))
+        center, scale = (h + a) / 2, max((h - a) / 4, 0.05)
+    else:
+        spread = float(np.std(human_ppl)) or 1.0
+        center, scale = h - spread, spread / 2
+    return {
+        'center': round(center, 4),
+        'scale': round(scale, 4),
+        'human_median': round(h, 4),
+        'ai_median': round(float(np.median(ai_ppl)), 4) if len(ai_ppl) else None,
+    }
+
+
+def train_ngram_lm(corpus_dir=None, order=3, output=LM_PATH, holdout=0.1):
+    print("Loading texts...")
+    human, ai = load_texts(corpus_dir)
+    if not human:
+        print("No human-written text found! Run the dataset creation scripts first.")
+        return
+    rng = np.random.default_rng(42)
+    order_idx = rng.permutation(len(human))
+    n_held = int(len(human) * holdout) if len(human) >= 10 else 0
+    held = [human[i] for i in order_idx[:n_held]]
+    train = [human[i] for i in order_idx[n_held:]]
+    print(f"Training {order}-gram model on {len(train)} human texts ({len(held)} held out)...")
+
+    entries, unk_logprob = train_kneser_ney((s for t in train for s in sentence_tokens(t)), order=order)
+    save_model(entries, unk_logprob, output, order)
+
+    model = NgramLanguageModel(output, mmap=False)
+    calibration = calibrate(model, held or train, ai)
+    set_calibration(output, calibration)
+    print(f"{len(entries)} n-grams, calibration: {calibration}")
+    print(f"Model saved to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the n-gram language model")
+    parser.add_argument('--corpus', help="directory of extra human-written .txt files")
+    parser.add_argument('--order', type=int, default=3)
+    parser.add_argument('--output', default=LM_PATH)
+    args = parser.parse_args()
+    train_ngram_lm(args.corpus, args.order, args.output)
@@ -0,0 +1,186 @@
+"""Train the AI detector out of core, for labeled corpora too large for memory.
+
+Reads CSV and JSONL shards (columns/keys 'text' and 'label', labels 'human'
+or 'ai') in chunks of --chunk-size rows, vectorizes every chunk with a
+stateless HashingVectorizer (make_hashing_vectorizer: the tokens of the
+TF-IDF model, no vocabulary to fit) and updates an SGD logistic regression
+with partial_fit. Memory stays constant however many rows there are: one
+chunk plus the 2^20 model weights.
+
+Every --holdout-th row (chosen by a hash of its text, so the split is
+stable across runs) is never trained on. It is scored with the model as
+it is at that point, and running accuracy, log loss and AI-class
+precision/recall over these rows are printed as training goes.
+
+SGD assumes the rows come in random order, but shards are often written one
+source or one label at a time. The shards are therefore read interleaved
+(one chunk of each in turn, in a shuffled order every epoch) and the rows of
+every chunk are shuffled before training, both seeded by --seed.
+
+The result is a joblib Pipeline with predict_proba, like
+ai_detector_rf.joblib; point AI_MODEL_PATH at it to use it in detect_ai.
+--resume continues training a saved model on new shards.
+
+    python src/learning/train_streaming.py [SHARD ...] [--output PATH] [--chunk-size 10000]
+                                           [--epochs 1] [--resume] [--seed 42]
+"""
+
+import argparse
+import glob
+import hashlib
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import Pipeline
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from analysis.tfidf import make_hashing_vectorizer
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATA_DIR = os.path.join(BASE_DIR, "data", "dataset")
+OUTPUT_PATH = os.path.join(BASE_DIR, "data", "models", "ai_detector_sgd.joblib")
+
+LABELS = {'human': 0, 'ai': 1}
+CLASSES = np.array([0, 1])
+
+
+def read_chunks(path, chunk_size):
+    """DataFrames of up to `chunk_size` rows with 'text' and 'label_id' columns."""
+    if path.endswith(('.jsonl', '.json')):
+        reader = pd.read_json(path, lines=True, chunksize=chunk_size)
+    else:
+        reader = pd.read_csv(path, chunksize=chunk_size)
+    with reader:
+        for chunk in reader:
+            if 'text' not in chunk or 'label' not in chunk:
+                print(f"Skipping {path}: no 'text'/'label' columns")
+                return
+            chunk = chunk.assign(label_id=chunk['label'].map(LABELS)).dropna(subset=['text', 'label_id'])
+            yield chunk['text'].astype(str), chunk['label_id'].astype(int).to_numpy()
+
+
+def interleave(shards, chunk_size, rng):
+    """Chunks of all shards, one of each in turn, the shards in a random order."""
+    readers = [read_chunks(shards[i], chunk_size) for i in rng.permutation(len(shards))]
+    while readers:
+        for reader in list(readers):
+            try:
+                yield next(reader)
+            except StopIteration:
+                readers.remove(reader)
+
+
+def shuffled(texts, y, rng):
+    """The rows of a chunk in a random order."""
+    order = rng.permutation(len(y))
+    return texts.iloc[order], y[order]
+
+
+def is_holdout(texts, every):
+    """Stable pseudo-random 1-in-`every` selection of texts."""
+    if every <= 1:
+        return np.zeros(len(texts), dtype=bool)
+    return np.fromiter((int.from_bytes(hashlib.blake2b(t.encode('utf-8'), digest_size=4).digest(), 'little')
+                        % every == 0 for t in texts), dtype=bool, count=len(texts))
+
+
+class RunningMetrics:
+    """Accuracy, log loss and AI-class precision/recall accumulated over scored rows."""
+
+    def __init__(self):
+        self.rows = 0
+        self.log_loss = 0.0
+        self.confusion = np.zeros((2, 2), dtype=np.int64)  # [true, predicted]
+
+    def update(self, y, proba):
+        p = np.clip(proba[:, 1], 1e-15, 1 - 1e-15)
+        self.log_loss -= float(np.sum(y * np.log(p) + (1 - y) * np.log(1 - p)))
+        np.add.at(self.confusion, (y, (proba[:, 1] >= 0.5).astype(int)), 1)
+        self.rows += len(y)
+
+    def summary(self):
+        if not self.rows:
+            return {}
+        tp, fp, fn = self.confusion[1, 1], self.confusion[0, 1], self.confusion[1, 0]
+        return {
+            'rows': self.rows,
+            'accuracy': round(float(np.trace(self.confusion)) / self.rows, 4),
+            'log_loss': round(self.log_loss / self.rows, 4),
+            'precision': round(float(tp / (tp + fp)), 4) if tp + fp else None,
+            'recall': round(float(tp / (tp + fn)), 4) if tp + fn else None,
+        }
+
+
+def train_streaming(shards, output=OUTPUT_PATH, chunk_size=10000, epochs=1, holdout=10, resume=False,
+                    report_every=10, seed=42):
+    if resume and os.path.exists(output):
+        model = joblib.load(output)
+        print(f"Resuming from {output}")
+    else:
+        model = Pipeline([
+            ('hashing', make_hashing_vectorizer()),
+            ('clf', SGDClassifier(loss='log_loss', alpha=1e-5, random_state=42)),
+        ])
+    vectorizer, classifier = model.steps[0][1], model.steps[-1][1]
+    fitted = hasattr(classifier, 'coef_')
+
+    rng = np.random.default_rng(seed)
+    started = time.time()
+    trained = 0
+    chunks = 0
+    for epoch in range(epochs):
+        metrics = RunningMetrics()
+        for texts, y in interleave(shards, chunk_size, rng):
+            texts, y = shuffled(texts, y, rng)
+            held = is_holdout(texts, holdout)
+            X = vectorizer.transform(texts)
+            if fitted and held.any():
+                metrics.update(y[held], classifier.predict_proba(X[held]))
+            train = ~held
+            if train.any():
+                classifier.partial_fit(X[train], y[train], classes=CLASSES)
+                fitted = True
+                trained += int(train.sum())
+            chunks += 1
+            if chunks % report_every == 0:
+                print(f"epoch {epoch + 1}: {trained} rows trained, {trained / (time.time() - started):.0f} rows/s, "
+                      f"validation {metrics.summary()}")
+        print(f"Epoch {epoch + 1} done: {trained} rows trained, validation {metrics.summary()}")
+
+    if not fitted:
+        print("No labeled rows found! Run the dataset creation scripts first.")
+        return None
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    tmp = output + '.tmp'
+    joblib.dump(model, tmp)
+    os.replace(tmp, output)
+    print(f"Model saved to {output} ({time.time() - started:.1f}s)")
+    return model
+
+
+def find_shards(patterns):
+    shards = []
+    for pattern in patterns:
+        shards.extend(sorted(glob.glob(pattern)) or [pattern])
+    return shards
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the AI detector out of core")
+    parser.add_argument('shards', nargs='*', default=[os.path.join(DATA_DIR, '*.csv')],
+                        help="CSV/JSONL files or glob patterns (default: data/dataset/*.csv)")
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    parser.add_argument('--chunk-size', type=int, default=10000, help="rows read and trained on at a time")
+    parser.add_argument('--epochs', type=int, default=1)
+    parser.add_argument('--holdout', type=int, default=10, help="validate on every N-th row (0: no validation)")
+    parser.add_argument('--resume', action='store_true', help="continue training the model in --output")
+    parser.add_argument('--seed', type=int, default=42, help="seed of the shard order and chunk shuffling")
+    args = parser.parse_args()
+    train_streaming(find_shards(args.shards), args.output, args.chunk_size, args.epochs, args.holdout, args.resume,
+                    seed=args.seed)
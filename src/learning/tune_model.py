@@ -0,0 +1,186 @@
+"""Cross-validated hyperparameter search for the AI detector.
+
+Every combination of the vectorizer grid and the classifier grid is scored
+with stratified k-fold cross-validation (ROC AUC, accuracy, log loss). The
+search runs in two parallel phases over --jobs processes:
+
+1. per vectorizer setting and fold, the TfidfVectorizer is fitted on the
+   training part and both parts are transformed. Fitted vectorizers and
+   matrices go to the FeatureCache, so they are computed once per fold,
+   not once per classifier setting, and are reused by later searches;
+2. per classifier setting and fold, a Random Forest is trained on the
+   cached matrices and scored.
+
+The leaderboard (one row per combination, best first) is written as CSV.
+The best combination is refitted on all data and saved like
+ai_detector_rf.joblib, with its flat export when the vectorizer allows one.
+With --genai the GenAI feature matrix is appended to the TF-IDF columns
+and the best model is a combined pipeline (see train_combined.py).
+
+    python src/learning/tune_model.py [--folds 5] [--jobs N] [--grid grid.json] [--genai]
+                                      [--leaderboard PATH] [--output PATH]
+
+grid.json holds {"vectorizer": {param: [values]}, "classifier": {param: [values]}}.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, log_loss, roc_auc_score
+from sklearn.model_selection import StratifiedKFold
+from sklearn.pipeline import Pipeline
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from analysis.combined_model import make_combined_pipeline
+from learning.feature_cache import FEATURE_CACHE_DIR, FeatureCache, corpus_key, genai_signature, signature
+from learning.train_combined import combined_features, fit_vectorizer, genai_matrix
+from learning.train_model import export_flat_model, load_dataset
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MODELS_DIR = os.path.join(BASE_DIR, "data", "models")
+LEADERBOARD_PATH = os.path.join(MODELS_DIR, "leaderboard.csv")
+OUTPUT_PATH = os.path.join(MODELS_DIR, "ai_detector_tuned.joblib")
+
+DEFAULT_GRID = {
+    'vectorizer': {'max_features': [2000, 5000, 20000], 'min_df': [1, 2]},
+    'classifier': {'n_estimators': [100, 300], 'max_depth': [None, 30], 'min_samples_leaf': [1, 2]},
+}
+
+
+def expand(grid):
+    """Every combination of a {param: [values]} grid, as dicts."""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+
+def _fold_matrix(cache, vectorizer_key, vectorizer, texts, genai):
+    """Cache key of the feature matrix of `texts` (TF-IDF, plus GenAI columns with `genai`)."""
+    tfidf_key = signature(vectorizer_key, corpus_key(texts))
+    if not genai:
+        combined_features(cache, vectorizer_key, vectorizer, texts, genai=False)
+        return tfidf_key
+    key = signature(tfidf_key, genai_signature())
+    cache.sparse(key, lambda: combined_features(cache, vectorizer_key, vectorizer, texts))
+    return key
+
+
+def _fold_features(cache_dir, vectorizer_params, train_texts, test_texts, genai):
+    """Phase 1 task: fit the vectorizer of one fold and cache the fold's matrices.
+    Returns their cache keys, so phase 2 tasks need no texts."""
+    cache = FeatureCache(cache_dir)
+    key, vectorizer = fit_vectorizer(cache, train_texts, vectorizer_params)
+    return (_fold_matrix(cache, key, vectorizer, train_texts, genai),
+            _fold_matrix(cache, key, vectorizer, test_texts, genai))
+
+
+def _score(cache_dir, keys, y_train, y_test, classifier_params):
+    """Phase 2 task: train one classifier setting on one fold's cached features and score it."""
+    cache = FeatureCache(cache_dir)
+    X_train, X_test = (cache.sparse(key, None) for key in keys)
+    started = time.time()
+    classifier = RandomForestClassifier(random_state=42, **classifier_params).fit(X_train, y_train)
+    proba = classifier.predict_proba(X_test)[:, 1]
+    return {
+        'roc_auc': roc_auc_score(y_test, proba) if len(set(y_test)) > 1 else float('nan'),
+        'accuracy': accuracy_score(y_test, proba >= 0.5),
+        'log_loss': log_loss(y_test, proba, labels=[0, 1]),
+        'fit_s': time.time() - started,
+    }
+
+
+def tune_model(grid=DEFAULT_GRID, folds=5, n_jobs=-1, genai=False, leaderboard=LEADERBOARD_PATH,
+               output=OUTPUT_PATH, cache_dir=FEATURE_CACHE_DIR):
+    print("Loading datasets...")
+    dataset = load_dataset()
+    if dataset is None:
+        print("No datasets found! Run the creation scripts first.")
+        return None
+    texts, y = list(dataset[0]), np.asarray(dataset[1], dtype=int)
+    vectorizer_grid, classifier_grid = expand(grid['vectorizer']), expand(grid['classifier'])
+    splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=42).split(texts, y))
+    fold_texts = [([texts[i] for i in train], [texts[i] for i in test]) for train, test in splits]
+    print(f"{len(vectorizer_grid)} vectorizer x {len(classifier_grid)} classifier settings, {folds} folds, "
+          f"{len(texts)} documents")
+
+    started = time.time()
+    if genai:
+        # computed once for all documents here, so the fold tasks only read the cache
+        genai_matrix(FeatureCache(cache_dir), texts, n_jobs)
+    parallel = Parallel(n_jobs=n_jobs)
+    keys = parallel(delayed(_fold_features)(cache_dir, v, train, test, genai)
+                    for v in vectorizer_grid for train, test in fold_texts)
+    print(f"Fold features ready in {time.time() - started:.1f}s")
+
+    tasks = [(vi, ci, fi) for vi in range(len(vectorizer_grid)) for ci in range(len(classifier_grid))
+             for fi in range(folds)]
+    scores = parallel(delayed(_score)(cache_dir, keys[vi * folds + fi], y[splits[fi][0]], y[splits[fi][1]],
+                                      classifier_grid[ci])
+                      for vi, ci, fi in tasks)
+    print(f"{len(tasks)} fits scored in {time.time() - started:.1f}s")
+
+    rows = {}
+    for (vi, ci, _), score in zip(tasks, scores):
+        rows.setdefault((vi, ci), []).append(score)
+    board = []
+    for (vi, ci), fold_scores in rows.items():
+        frame = pd.DataFrame(fold_scores)
+        board.append({
+            'roc_auc': frame['roc_auc'].mean(), 'roc_auc_std': frame['roc_auc'].std(ddof=0),
+            'accuracy': frame['accuracy'].mean(), 'log_loss': frame['log_loss'].mean(),
+            'fit_s': frame['fit_s'].mean(),
+            'vectorizer': json.dumps(vectorizer_grid[vi], sort_keys=True),
+            'classifier': json.dumps(classifier_grid[ci], sort_keys=True),
+        })
+    board = pd.DataFrame(board).sort_values(['roc_auc', 'log_loss'], ascending=[False, True], ignore_index=True)
+    board.index += 1
+    os.makedirs(os.path.dirname(leaderboard), exist_ok=True)
+    board.to_csv(leaderboard, index_label='rank')
+    print(board.head(10).to_string())
+    print(f"Leaderboard written to {leaderboard}")
+
+    best = board.iloc[0]
+    vectorizer_params, classifier_params = json.loads(best['vectorizer']), json.loads(best['classifier'])
+    print(f"Refitting the best setting on all data: {vectorizer_params} {classifier_params}")
+    cache = FeatureCache(cache_dir)
+    key, vectorizer = fit_vectorizer(cache, texts, vectorizer_params)
+    X = combined_features(cache, key, vectorizer, texts, n_jobs, genai=genai)
+    classifier = RandomForestClassifier(random_state=42, n_jobs=n_jobs, **classifier_params).fit(X, y)
+    classifier.n_jobs = None  # single-threaded at inference, like train_model's forest
+    model = (make_combined_pipeline(vectorizer, classifier) if genai
+             else Pipeline([('tfidf', vectorizer), ('clf', classifier)]))
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    joblib.dump(model, output + '.tmp')
+    os.replace(output + '.tmp', output)
+    print(f"Model saved to {output}")
+    if not genai:
+        try:
+            export_flat_model(output)
+        except ValueError as e:
+            print(f"No flat export: {e}")
+    return board
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cross-validated hyperparameter search for the AI detector")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--jobs', type=int, default=-1, help="parallel processes (-1: all cores)")
+    parser.add_argument('--grid', help="JSON file with 'vectorizer' and 'classifier' parameter grids")
+    parser.add_argument('--genai', action='store_true', help="append the GenAI feature matrix to TF-IDF")
+    parser.add_argument('--leaderboard', default=LEADERBOARD_PATH)
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    args = parser.parse_args()
+    grid = DEFAULT_GRID
+    if args.grid:
+        with open(args.grid, 'r', encoding='utf-8') as f:
+            grid = {**DEFAULT_GRID, **json.load(f)}
+    tune_model(grid, args.folds, args.jobs, args.genai, args.leaderboard, args.output)
@@ -0,0 +1,126 @@
+import os
+
+from extraction.extract import extract_text
+from preprocessing.clean import preprocess
+from analysis.document import AnalyzedDocument
+from analysis.ai_detector import detect_ai
+from analysis.inference import analysis_in_progress
+from analysis.plagiarism import analyze_plagiarism
+from analysis.plagiarism_shards import open_index
+from analysis.citation import check_citations
+from analysis.eligibility import check_eligibility
+from scoring.score import aggregate_scores
+from report.generate import generate_report
+from pipeline.dag import Stage, StagePipeline
+from pipeline.ingest import AUTO_INGEST, ingest_submission, submission_id
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CORPUS_DIR = os.path.join(BASE_DIR, 'data')
+
+
+class ExtractionError(Exception):
+    """Raised when no usable text could be extracted from an upload."""
+
+
+# Stage functions take their dependencies as keyword arguments and live at
+# module level so the pipeline can also run them in a process pool.
+
+def _extract(source, filename):
+    text, metadata = extract_text(source, filename)
+    if text.startswith("Error"):
+        raise ExtractionError(text)
+    return text, metadata
+
+
+def _preprocess(document):
+    return preprocess(document[0])
+
+
+def _body(sections):
+    # tokenized once here, shared by every analyzer below
+    return AnalyzedDocument(sections.get('body', ''))
+
+
+def _detect_ai(body):
+    return detect_ai(body)
+
+
+def _plagiarism(body, corpus_dir):
+    # an earlier analysis of the same upload may have ingested it (AUTO_INGEST)
+    return analyze_plagiarism(body, open_index(corpus_dir), exclude=[submission_id(body.text)])
+
+
+def _citations(body, sections):
+    return check_citations(body, sections.get('references', ''))
+
+
+def _ai_score(ai):
+    return ai['score'] if isinstance(ai, dict) else ai
+
+
+def _eligibility(ai, plagiarism, citations, body):
+    return check_eligibility(_ai_score(ai), plagiarism['score'], citations, body)
+
+
+def _final(ai, plagiarism):
+    return aggregate_scores(_ai_score(ai), plagiarism['score'])
+
+
+# detect_ai, analyze_plagiarism and check_citations only need the body, so they run concurrently
+ANALYSIS_STAGES = [
+    Stage('document', _extract, deps=('source', 'filename')),
+    Stage('sections', _preprocess, deps=('document',)),
+    Stage('body', _body, deps=('sections',)),
+    Stage('ai', _detect_ai, deps=('body',)),
+    Stage('plagiarism', _plagiarism, deps=('body', 'corpus_dir')),
+    Stage('citations', _citations, deps=('body', 'sections')),
+    Stage('eligibility', _eligibility, deps=('ai', 'plagiarism', 'citations', 'body')),
+    Stage('final', _final, deps=('ai', 'plagiarism')),
+]
+
+PIPELINE = StagePipeline(ANALYSIS_STAGES)
+
+
+def analyze_document(source, corpus_dir=CORPUS_DIR, filename=None, pipeline=None, ingest=None):
+    """Run extraction and every analysis stage on one file.
+
+    `source` is anything extract_text accepts (path, bytes or file object).
+    This is the CPU-bound part of `/analyze`; it is a plain module-level
+    function so it can be shipped to a thread or process pool.
+    With `ingest` (default: PLAGIARISM_AUTO_INGEST) the body is added to the
+    plagiarism index after it has been checked, so later submissions are
+    compared against it.
+    Returns the report dict (with per-stage wall times under 'timings'),
+    raises ExtractionError if extraction failed.
+    """
+    with analysis_in_progress():
+        results, timings = (pipeline or PIPELINE).run(source=source, filename=filename, corpus_dir=corpus_dir)
+    text, metadata = results['document']
+    path = filename or (os.fspath(source) if isinstance(source, (str, os.PathLike)) else metadata['title'])
+    ai_result = results['ai']
+    plagiarism = results['plagiarism']
+
+    report = generate_report(path, metadata, results['sections'], ai_result, plagiarism['score'],
+                             results['citations'], results['final'], plagiarism['matches'])
+    report['eligibility'] = results['eligibility']
+    # corpus documents the matches come from, with character offsets of every shared passage
+    report['plagiarism_sources'] = plagiarism['sources']
+    # the same passages in submission order, for highlighting
+    report['plagiarism_passages'] = plagiarism['passages']
+    # paraphrased paragraphs: source, estimated similarity and offsets
+    report['near_duplicates'] = plagiarism['near_duplicates']
+    # topically closest corpus documents by TF-IDF cosine similarity
+    report['similar_documents'] = plagiarism['similar_documents']
+
+    # Add GenAI features to report for frontend display
+    if isinstance(ai_result, dict) and 'genai_features' in ai_result:
+        report['scores']['genai_features'] = ai_result['genai_features']
+    # the model that scored this document, which the result cache keys the report on
+    report['model_sha256'] = ai_result.get('model_sha256') if isinstance(ai_result, dict) else None
+    # and the plagiarism index it was checked against
+    report['index_state'] = plagiarism.get('index_state')
+    report['timings'] = {name: round(seconds, 4) for name, seconds in timings.items()}
+
+    if (AUTO_INGEST if ingest is None else ingest) and results['body'].text.strip():
+        report['ingested_id'] = ingest_submission(results['body'].text, os.path.basename(path), corpus_dir)
+    return report
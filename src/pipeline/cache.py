@@ -0,0 +1,172 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+
+from analysis.ai_detector import model_fingerprint
+from scoring.score import DEFAULT_WEIGHTS
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CACHE_DIR = os.environ.get('RESULT_CACHE_DIR', os.path.join(BASE_DIR, 'data', 'cache', 'results'))
+CACHE_MEMORY_ITEMS = int(os.environ.get('RESULT_CACHE_MEMORY_ITEMS', 256))
+CACHE_DISK_BYTES = int(os.environ.get('RESULT_CACHE_DISK_BYTES', 512 * 1024 * 1024))
+
+# Bump when the report layout or analysis code changes in a way that makes old entries wrong
+CACHE_VERSION = 8
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache of analysis reports, keyed on the uploaded bytes.
+
+    Keys combine the SHA-256 of the upload with the model fingerprint, the
+    state of the plagiarism index (ShardedIndex.state) and the scoring
+    weights, so a retrained model, a changed corpus or new weights never
+    serve stale reports. The memory tier is an LRU of `memory_items` reports; the
+    disk tier stores one JSON file per report under a directory named after
+    the model fingerprint and evicts the least recently used files once it
+    grows past `disk_bytes`. When the model file changes, the memory tier
+    and the disk entries of older models are dropped.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, memory_items=CACHE_MEMORY_ITEMS, disk_bytes=CACHE_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.memory_items = memory_items
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._disk = OrderedDict()  # path -> size, least recently used first
+        self._disk_total = 0
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'stale': 0}
+
+    def _model_dir(self):
+        """Directory of the current model; resets both tiers when the model changed."""
+        fingerprint = model_fingerprint()
+        if fingerprint != self._fingerprint:
+            self._memory.clear()
+            self._disk.clear()
+            self._disk_total = 0
+            model_dir = os.path.join(self.cache_dir, fingerprint[:16])
+            if os.path.isdir(self.cache_dir):
+                for name in os.listdir(self.cache_dir):
+                    path = os.path.join(self.cache_dir, name)
+                    if path != model_dir and os.path.isdir(path):
+                        shutil.rmtree(path, ignore_errors=True)
+            os.makedirs(model_dir, exist_ok=True)
+            entries = []
+            for entry in os.scandir(model_dir):
+                if entry.name.endswith('.json'):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, entry.path, st.st_size))
+            for _, path, size in sorted(entries):
+                self._disk[path] = size
+                self._disk_total += size
+            self._fingerprint = fingerprint
+        return os.path.join(self.cache_dir, fingerprint[:16])
+
+    def key(self, digest, fingerprint=None, index_state=None):
+        """Cache key for an upload whose SHA-256 hex digest is `digest`, scored
+        by the model `fingerprint` (default: the current one) against the
+        plagiarism index in `index_state`."""
+        weights = json.dumps(DEFAULT_WEIGHTS, sort_keys=True)
+        fingerprint = fingerprint or model_fingerprint()
+        return hashlib.sha256(f"{CACHE_VERSION}:{digest}:{fingerprint}:{index_state}:{weights}".encode()).hexdigest()
+
+    def get(self, digest, count=True, index_state=None):
+        """The cached report of `digest` against the index in `index_state`, or
+        None. With count=False the lookup is left out of the hit/miss counters
+        (it is not an /analyze request)."""
+        with self._lock:
+            counters = self.counters if count else dict.fromkeys(self.counters, 0)
+            model_dir = self._model_dir()
+            key = self.key(digest, self._fingerprint, index_state)
+            report = self._memory.get(key)
+            if report is not None:
+                self._memory.move_to_end(key)
+                counters['memory_hits'] += 1
+                return report
+            path = os.path.join(model_dir, key + '.json')
+            if path in self._disk:
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        report = json.load(f)
+                    os.utime(path)
+                except (OSError, ValueError):
+                    self._drop(path)
+                    report = None
+            if report is None:
+                counters['misses'] += 1
+                return None
+            self._disk.move_to_end(path)
+            self._remember(key, report)
+            counters['disk_hits'] += 1
+            return report
+
+    def put(self, digest, report, model_sha256=None, index_state=None):
+        """Store the report of `digest`. `model_sha256` is the model that
+        scored it (None: the report does not depend on one), `index_state`
+        the plagiarism index it was checked against. A report of any
+        other model than the current one is not stored: after a promotion,
+        workers keep scoring with the old model until they have loaded the
+        new one, and the current key must not serve those reports."""
+        with self._lock:
+            model_dir = self._model_dir()
+            if model_sha256 is not None and model_sha256 != self._fingerprint:
+                self.counters['stale'] += 1
+                return
+            key = self.key(digest, self._fingerprint, index_state)
+            self._remember(key, report)
+            path = os.path.join(model_dir, key + '.json')
+            tmp = f"{path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(report, f)
+                os.replace(tmp, path)
+            except (OSError, TypeError, ValueError) as e:
+                print(f"Result cache write failed: {e}")
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                return
+            if path in self._disk:
+                self._disk_total -= self._disk.pop(path)
+            size = os.path.getsize(path)
+            self._disk[path] = size
+            self._disk_total += size
+            self.counters['stores'] += 1
+            while self._disk_total > self.disk_bytes and len(self._disk) > 1:
+                self._drop(next(iter(self._disk)))
+                self.counters['evictions'] += 1
+
+    def _remember(self, key, report):
+        self._memory[key] = report
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _drop(self, path):
+        self._disk_total -= self._disk.pop(path, 0)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters['memory_hits'] + self.counters['disk_hits'] + self.counters['misses']
+            hits = lookups - self.counters['misses']
+            return dict(
+                self.counters,
+                hit_rate=round(hits / lookups, 3) if lookups else 0.0,
+                memory_items=len(self._memory),
+                disk_items=len(self._disk),
+                disk_bytes=self._disk_total,
+            )
@@ -0,0 +1,95 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+PIPELINE_MODE = os.environ.get('PIPELINE_MODE', 'thread')  # 'thread', 'process' or 'serial'
+PIPELINE_WORKERS = int(os.environ.get('PIPELINE_WORKERS', 4))
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def _get_pool(mode, workers):
+    """Stage pools are shared by every pipeline run in the process."""
+    with _POOLS_LOCK:
+        pool = _POOLS.get((mode, workers))
+        if pool is None:
+            if mode == 'process':
+                pool = ProcessPoolExecutor(max_workers=workers)
+            else:
+                pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='stage')
+            _POOLS[(mode, workers)] = pool
+        return pool
+
+
+def _timed(fn, kwargs):
+    started = time.perf_counter()
+    value = fn(**kwargs)
+    return value, time.perf_counter() - started
+
+
+class Stage:
+    """One step of a pipeline: `fn` is called with the results of `deps` as keyword arguments."""
+
+    def __init__(self, name, fn, deps=()):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, deps={self.deps})"
+
+
+class StagePipeline:
+    """
+    Runs a set of stages as a dependency graph.
+
+    Every stage starts as soon as all of its dependencies are available,
+    so independent stages run side by side in a thread or process pool
+    and a run takes about as long as its slowest chain of stages. Inputs
+    passed to run() can be used as dependencies like stage results.
+    In process mode stage functions and their arguments must be picklable.
+    """
+
+    def __init__(self, stages, mode=PIPELINE_MODE, max_workers=PIPELINE_WORKERS):
+        if mode not in ('thread', 'process', 'serial'):
+            raise ValueError(f"Unknown pipeline mode: {mode}")
+        self.stages = list(stages)
+        self.mode = mode
+        self.max_workers = max(1, max_workers)
+        names = [s.name for s in self.stages]
+        if len(set(names)) != len(names):
+            raise ValueError("Stage names must be unique")
+
+    def run(self, **inputs):
+        """Run every stage. Returns (results, timings): results maps stage
+        and input names to values, timings maps stage names to seconds."""
+        results = dict(inputs)
+        timings = {}
+        remaining = list(self.stages)
+        pool = None if self.mode == 'serial' else _get_pool(self.mode, self.max_workers)
+        running = {}
+        while remaining or running:
+            ready = [s for s in remaining if all(d in results for d in s.deps)]
+            for stage in ready:
+                remaining.remove(stage)
+                kwargs = {d: results[d] for d in stage.deps}
+                if pool is None:
+                    results[stage.name], timings[stage.name] = _timed(stage.fn, kwargs)
+                else:
+                    running[pool.submit(_timed, stage.fn, kwargs)] = stage.name
+            if pool is None:
+                if not ready and remaining:
+                    break
+                continue
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                results[name], timings[name] = future.result()
+        if remaining:
+            missing = {s.name: [d for d in s.deps if d not in results] for s in remaining}
+            raise ValueError(f"Unsatisfied stage dependencies: {missing}")
+        return results, timings
@@ -0,0 +1,233 @@
+import os
+import json
+import time
+import glob
+import shutil
+import asyncio
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Execution settings, overridable from the environment
+ANALYSIS_MODE = os.environ.get('ANALYSIS_MODE', 'process')  # 'process', 'thread' or 'inline'
+ANALYSIS_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', os.cpu_count() or 2))
+ANALYSIS_QUEUE_SIZE = int(os.environ.get('ANALYSIS_QUEUE_SIZE', 32))
+ANALYSIS_TIMEOUT = float(os.environ.get('ANALYSIS_TIMEOUT', 120))
+
+
+class QueueFullError(Exception):
+    """Raised when more jobs are in flight than the executor accepts."""
+
+
+class JobTimeoutError(Exception):
+    """Raised when a job does not finish within its timeout."""
+
+
+# where this worker process publishes its inference statistics (see AnalysisExecutor.worker_stats)
+_STATS_DIR = None
+# shared by all workers of a pool; AnalysisExecutor.warm_up's tasks wait on the barrier
+# and skip it once their round has been given up
+_BARRIER = None
+_WARMUP_ROUND = None
+
+
+def _init_worker(corpus_dir=None, warmup=True, stats_dir=None, barrier=None, warmup_round=None):
+    """Runs once in every worker process: load the detector model and open
+    the plagiarism index up front (and, with `warmup`, analyse a synthetic
+    paper) so the first job does not pay for them."""
+    global _STATS_DIR, _BARRIER, _WARMUP_ROUND
+    _STATS_DIR = stats_dir
+    _BARRIER, _WARMUP_ROUND = barrier, warmup_round
+    from pipeline.warmup import warm_up
+    warm_up(corpus_dir, document=warmup)
+    _publish_stats()
+
+
+def _publish_stats():
+    """Write this worker's inference statistics to _STATS_DIR/<pid>.json. A
+    failed write (e.g. the directory was removed by a shutdown) is only logged:
+    it must not fail the job or, from the initializer, break the pool."""
+    if _STATS_DIR is None:
+        return
+    from analysis.ai_detector import inference_stats
+    path = os.path.join(_STATS_DIR, f'{os.getpid()}.json')
+    try:
+        with open(path + '.tmp', 'w') as f:
+            json.dump(inference_stats(), f)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        print(f"Could not publish worker statistics: {e}")
+
+
+def _await_workers(warmup_round, timeout):
+    """A warm-up task: holds this worker until every worker of the pool has
+    taken one, so each task is answered by a different, initialized worker."""
+    if _WARMUP_ROUND.value != warmup_round:
+        return None  # left in the queue by a warm-up that timed out
+    _BARRIER.wait(timeout)
+    return os.getpid()
+
+
+def _run_job(fn, *args, **kwargs):
+    """A job in a worker process; publishes the worker's statistics after it."""
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _publish_stats()
+
+
+class AnalysisExecutor:
+    """
+    Runs CPU-bound analysis jobs off the event loop.
+
+    mode='process' uses a pool of worker processes that each load the model
+    once at startup, mode='thread' uses a thread pool in this process and
+    mode='inline' runs jobs directly in the caller (the old behaviour).
+    At most `max_workers + queue_size` jobs are admitted at once; anything
+    beyond that is rejected with QueueFullError instead of piling up.
+
+    A process pool cannot abort a job that is already running, so on
+    timeout the caller gets JobTimeoutError while the worker finishes the
+    job in the background; the job keeps its admission slot until then.
+    """
+
+    def __init__(self, mode=ANALYSIS_MODE, max_workers=ANALYSIS_WORKERS,
+                 queue_size=ANALYSIS_QUEUE_SIZE, timeout=ANALYSIS_TIMEOUT, corpus_dir=None, warmup=None):
+        if mode not in ('process', 'thread', 'inline'):
+            raise ValueError(f"Unknown analysis mode: {mode}")
+        self.mode = mode
+        self.max_workers = max(1, max_workers)
+        self.queue_size = max(0, queue_size)
+        self.timeout = timeout
+        self.corpus_dir = corpus_dir
+        self.warmup = warmup
+        self._pool = None
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._stats_dir = None
+        self._barrier = None
+        self._warmup_round = None
+
+    def start(self):
+        if self._pool is not None:
+            return
+        if self.mode == 'process':
+            self._stats_dir = tempfile.mkdtemp(prefix='analysis-stats-')
+            self._barrier = multiprocessing.Barrier(self.max_workers)
+            self._warmup_round = multiprocessing.Value('i', 0)
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                             initargs=(self.corpus_dir, self._warmup_document(), self._stats_dir,
+                                                       self._barrier, self._warmup_round))
+        elif self.mode == 'thread':
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='analysis')
+        else:
+            # inline requests never touch the pool; batches still need a background thread
+            self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='analysis')
+
+    def _warmup_document(self):
+        if self.warmup is None:
+            from pipeline.warmup import ANALYSIS_WARMUP
+            return ANALYSIS_WARMUP
+        return self.warmup
+
+    def warm_up(self, timeout=None):
+        """Block until every place jobs run has loaded the model and the
+        plagiarism index (see pipeline/warmup.py). Worker processes do that
+        in their initializer, so this submits one task per worker that waits
+        on a barrier shared by the pool: no worker can take two of them, and
+        they only return once all workers have started and initialized.
+        Threads share this process, which is warmed up here. Returns the
+        warm-up timings or the worker pids."""
+        self.start()
+        if self.mode != 'process':
+            from pipeline.warmup import warm_up
+            return warm_up(self.corpus_dir, document=self._warmup_document())
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        warmup_round = self._warmup_round.value
+        futures = [self._pool.submit(_await_workers, warmup_round, timeout) for _ in range(self.max_workers)]
+        try:
+            pids = [future.result(timeout=max(0, deadline - time.monotonic())) for future in futures]
+        except (TimeoutError, threading.BrokenBarrierError):
+            # tasks of this round still queued skip the barrier, so a later warm-up can use it
+            with self._warmup_round.get_lock():
+                self._warmup_round.value += 1
+            self._barrier.reset()
+            raise JobTimeoutError(f"Not all {self.max_workers} analysis workers started within {timeout:.0f}s")
+        return {'workers': sorted(pids)}
+
+    def shutdown(self, wait=True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
+            self._barrier = self._warmup_round = None
+        if self._stats_dir is not None:
+            shutil.rmtree(self._stats_dir, ignore_errors=True)
+            self._stats_dir = None
+
+    def worker_stats(self):
+        """inference_stats() of every place jobs run: each worker process
+        publishes its own after every job, threads share this process."""
+        if self._stats_dir is None:
+            from analysis.ai_detector import inference_stats
+            return [inference_stats()]
+        stats = []
+        for path in sorted(glob.glob(os.path.join(self._stats_dir, '*.json'))):
+            try:
+                with open(path, 'r') as f:
+                    stats.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return stats
+
+    @property
+    def capacity(self):
+        return self.max_workers + self.queue_size
+
+    def stats(self):
+        return {
+            'mode': self.mode,
+            'workers': self.max_workers,
+            'in_flight': self._pending,
+            'capacity': self.capacity,
+        }
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue `fn(*args, **kwargs)` on the pool without admission control
+        and return a concurrent.futures.Future. Used for batch jobs, which
+        limit their own fan-out."""
+        self.start()
+        if self.mode == 'process':
+            return self._pool.submit(_run_job, fn, *args, **kwargs)
+        return self._pool.submit(fn, *args, **kwargs)
+
+    def _release(self, _future=None):
+        with self._pending_lock:
+            self._pending -= 1
+
+    async def run(self, fn, *args, timeout=None, **kwargs):
+        """Run `fn(*args, **kwargs)` in the pool and await its result."""
+        with self._pending_lock:
+            if self._pending >= self.capacity:
+                raise QueueFullError(f"Analysis queue is full ({self.capacity} jobs in flight)")
+            self._pending += 1
+        if self.mode == 'inline':
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._release()
+        try:
+            self.start()
+            if self.mode == 'process':
+                fn, args = _run_job, (fn, *args)
+            future = self._pool.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+        # the slot is freed when the job ends, not when the caller stops waiting for it
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            raise JobTimeoutError(f"Analysis did not finish within {timeout or self.timeout:.0f}s")
@@ -0,0 +1,140 @@
+"""Add documents to (and remove them from) the plagiarism index.
+
+    python src/pipeline/ingest.py add paper1.pdf paper2.txt [--corpus-dir DIR]
+    python src/pipeline/ingest.py delete DOC_ID [DOC_ID ...]
+    python src/pipeline/ingest.py sync | compact | stats
+    python src/pipeline/ingest.py reshard N
+
+Queries never look at the corpus directory: its .txt files are indexed
+when the index is built, by `sync`, and (PLAGIARISM_SYNC_CORPUS=1, the
+default) by the API's background sync every PLAGIARISM_SYNC_INTERVAL
+seconds (start_corpus_sync).
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import threading
+import time
+import uuid
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from extraction.extract import extract_text
+from analysis.plagiarism_index import SYNC_CORPUS
+from analysis.plagiarism_shards import open_index
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CORPUS_DIR = os.path.join(BASE_DIR, 'data')
+# Add the body of every analyzed upload to the index, so later submissions are checked against it
+AUTO_INGEST = os.environ.get('PLAGIARISM_AUTO_INGEST', '0') == '1'
+# Seconds between background syncs of the corpus directory's .txt files into the index
+SYNC_INTERVAL = float(os.environ.get('PLAGIARISM_SYNC_INTERVAL', 30))
+
+
+class IngestError(Exception):
+    """Raised when a document has no text to index."""
+
+
+def ingest_text(text, name, corpus_dir=CORPUS_DIR, doc_id=None):
+    """Index one text. Returns its document ID (a new one unless `doc_id` is given)."""
+    if not text or not text.strip():
+        raise IngestError(f"{name}: no text to index")
+    doc_id = doc_id or f"doc:{uuid.uuid4().hex}"
+    open_index(corpus_dir).add_documents([(doc_id, name, text)], keep_text=True)
+    return doc_id
+
+
+def ingest_file(source, corpus_dir=CORPUS_DIR, filename=None, doc_id=None):
+    """Extract the text of a file (path, bytes or file object, as extract_text
+    accepts) and index it. Returns {'id', 'name', 'chars'}."""
+    text, metadata = extract_text(source, filename)
+    if text.startswith("Error"):
+        raise IngestError(text)
+    name = filename or (os.path.basename(os.fspath(source)) if isinstance(source, (str, os.PathLike)) else metadata['title'])
+    doc_id = ingest_text(text, name, corpus_dir, doc_id)
+    return {'id': doc_id, 'name': name, 'chars': len(text)}
+
+
+def submission_id(body):
+    """Document ID of an analyzed upload: a hash of its body, so the same
+    paper analyzed twice is indexed once."""
+    return f"upload:{hashlib.sha256(body.encode('utf-8')).hexdigest()[:32]}"
+
+
+def ingest_submission(body, filename, corpus_dir=CORPUS_DIR):
+    """Index an analyzed upload (AUTO_INGEST) unless it already is.
+    Returns its document ID."""
+    doc_id = submission_id(body)
+    if open_index(corpus_dir).contains(doc_id):
+        return doc_id
+    stamp = time.strftime('%Y-%m-%d %H:%M:%S')
+    return ingest_text(body, f"upload: {filename} ({stamp})", corpus_dir, doc_id)
+
+
+def delete(ids, corpus_dir=CORPUS_DIR):
+    """Remove documents from the index. Returns how many were found."""
+    return open_index(corpus_dir).delete_documents(ids)
+
+
+def index_stats(corpus_dir=CORPUS_DIR):
+    return open_index(corpus_dir).stats()
+
+
+def run_corpus_sync(corpus_dir=CORPUS_DIR, interval=SYNC_INTERVAL):
+    """Index changes to the corpus directory every `interval` seconds, forever."""
+    while True:
+        try:
+            added, removed = open_index(corpus_dir).sync()
+            if added or removed:
+                print(f"Corpus sync: indexed {added} new or changed files, removed {removed}")
+        except Exception as e:
+            print(f"Corpus sync failed: {e}")
+        time.sleep(interval)
+
+
+def start_corpus_sync(corpus_dir=CORPUS_DIR, interval=SYNC_INTERVAL):
+    """Run run_corpus_sync on a daemon thread (PLAGIARISM_SYNC_CORPUS=1 only)."""
+    if not SYNC_CORPUS:
+        return None
+    thread = threading.Thread(target=run_corpus_sync, args=(corpus_dir, interval), name='corpus-sync', daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Manage the plagiarism index")
+    parser.add_argument('--corpus-dir', default=CORPUS_DIR, help="corpus the index belongs to")
+    sub = parser.add_subparsers(dest='command', required=True)
+    add = sub.add_parser('add', help="index files")
+    add.add_argument('paths', nargs='+')
+    rm = sub.add_parser('delete', help="remove documents by ID")
+    rm.add_argument('ids', nargs='+')
+    sub.add_parser('sync', help="index changes to the corpus directory's .txt files")
+    sub.add_parser('compact', help="merge segments and drop deleted documents")
+    sub.add_parser('stats', help="show index statistics")
+    reshard = sub.add_parser('reshard', help="re-index into N shards")
+    reshard.add_argument('shards', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'add':
+        for path in args.paths:
+            try:
+                print(ingest_file(path, args.corpus_dir))
+            except IngestError as e:
+                print(f"Skipped: {e}")
+    elif args.command == 'delete':
+        print(f"Deleted {delete(args.ids, args.corpus_dir)} documents")
+    elif args.command == 'sync':
+        added, removed = open_index(args.corpus_dir).sync()
+        print(f"Indexed {added} new or changed files, removed {removed}")
+    elif args.command == 'compact':
+        manifests = open_index(args.corpus_dir).compact()
+        print(f"{sum(m.get('documents', 0) for m in manifests)} documents in "
+              f"{sum(len(m.get('segments', [])) for m in manifests)} segment(s)")
+    elif args.command == 'reshard':
+        open_index(args.corpus_dir).reshard(args.shards)
+    else:
+        print(index_stats(args.corpus_dir))
@@ -0,0 +1,139 @@
+import os
+import time
+import uuid
+import shutil
+import threading
+from collections import OrderedDict
+
+MAX_JOBS = int(os.environ.get('BATCH_MAX_JOBS', 100))
+
+
+class BatchJob:
+    """Progress and per-file results of one batch analysis."""
+
+    def __init__(self, job_id, files, work_dir=None):
+        self.id = job_id
+        self.files = list(files)  # [(display_name, path), ...]
+        self.work_dir = work_dir
+        self.results = [None] * len(self.files)
+        self.created = time.time()
+        self.finished = None
+        self.completed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    @property
+    def total(self):
+        return len(self.files)
+
+    @property
+    def status(self):
+        if self.finished is not None:
+            return 'done'
+        return 'running' if self.completed else 'queued'
+
+    def record(self, index, report=None, error=None, elapsed=0.0):
+        name = self.files[index][0]
+        if error is None:
+            entry = {'file': name, 'status': 'done', 'elapsed': round(elapsed, 3), 'report': report}
+        else:
+            entry = {'file': name, 'status': 'failed', 'elapsed': round(elapsed, 3), 'error': error}
+        with self._lock:
+            self.results[index] = entry
+            self.completed += 1
+            if error is not None:
+                self.failed += 1
+            if self.completed == self.total:
+                self.finished = time.time()
+                if self.work_dir:
+                    shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def summary(self):
+        """Progress plus the scores of every finished file (reports without their full text)."""
+        end = self.finished or time.time()
+        duration = max(end - self.created, 1e-9)
+        files = []
+        for (name, _), entry in zip(self.files, self.results):
+            if entry is None:
+                files.append({'file': name, 'status': 'pending'})
+            elif entry['status'] == 'failed':
+                files.append(entry)
+            else:
+                report = entry['report']
+                files.append({
+                    'file': name,
+                    'status': 'done',
+                    'elapsed': entry['elapsed'],
+                    'final': report.get('scores', {}).get('final'),
+                    'ai_score': (report.get('scores', {}).get('ai_score') or {}).get('score'),
+                    'plagiarism_score': report.get('scores', {}).get('plagiarism_score'),
+                    'eligibility': report.get('eligibility'),
+                })
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'total': self.total,
+            'completed': self.completed,
+            'failed': self.failed,
+            'elapsed': round(duration, 3),
+            'docs_per_second': round(self.completed / duration, 3),
+            'files': files,
+        }
+
+    def finished_results(self):
+        return [entry for entry in self.results if entry is not None]
+
+
+class JobStore:
+    """In-memory registry of batch jobs; the oldest finished jobs are dropped past `max_jobs`."""
+
+    def __init__(self, max_jobs=MAX_JOBS):
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, files, work_dir=None):
+        job = BatchJob(uuid.uuid4().hex, files, work_dir)
+        with self._lock:
+            self._jobs[job.id] = job
+            finished = [jid for jid, j in self._jobs.items() if j.finished is not None]
+            while len(self._jobs) > self.max_jobs and finished:
+                self._jobs.pop(finished.pop(0), None)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+def run_batch(job, executor, fn, *args):
+    """Feed the files of `job` to `executor`, keeping at most one file per
+    worker in the pool so interactive /analyze requests can still get in
+    between batch files. `fn(path, *args, filename=name)` must return a
+    report dict.
+    """
+    pending = iter(range(job.total))
+    lock = threading.Lock()
+
+    def submit_next():
+        with lock:
+            index = next(pending, None)
+        if index is None:
+            return
+        started = time.time()
+        name, path = job.files[index]
+        future = executor.submit(fn, path, *args, filename=name)
+        future.add_done_callback(lambda f, i=index, t=started: on_done(f, i, t))
+
+    def on_done(future, index, started):
+        try:
+            job.record(index, report=future.result(), elapsed=time.time() - started)
+        except Exception as e:
+            job.record(index, error=str(e), elapsed=time.time() - started)
+        submit_next()
+
+    if job.total == 0:
+        job.finished = time.time()
+        return
+    for _ in range(min(executor.max_workers, job.total)):
+        submit_next()
@@ -0,0 +1,155 @@
+import os
+import hashlib
+import tempfile
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+UPLOAD_TMP_DIR = os.environ.get('UPLOAD_TMP_DIR', os.path.join(BASE_DIR, 'data', 'uploads', 'tmp'))
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 50 * 1024 * 1024))
+UPLOAD_SPOOL_BYTES = int(os.environ.get('UPLOAD_SPOOL_BYTES', 4 * 1024 * 1024))
+UPLOAD_CHUNK_BYTES = 256 * 1024
+# Room for the multipart boundaries and part headers around the file in a request's Content-Length
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the configured maximum size."""
+
+
+class UploadFormatError(Exception):
+    """Raised when a request is not a multipart form with the expected file."""
+
+
+class SpooledUpload:
+    """
+    An upload read in chunks and hashed on the way in.
+
+    Small uploads stay in memory and are handed to the analysis as bytes;
+    once an upload grows past `spool_bytes` it is moved to a temp file that
+    belongs to this request only and is removed by `cleanup()`.
+    """
+
+    def __init__(self, filename, max_bytes=UPLOAD_MAX_BYTES, spool_bytes=UPLOAD_SPOOL_BYTES, tmp_dir=UPLOAD_TMP_DIR):
+        self.filename = os.path.basename(filename or 'upload')
+        self.max_bytes = max_bytes
+        self.spool_bytes = spool_bytes
+        self.tmp_dir = tmp_dir
+        self.size = 0
+        self.path = None
+        self._buffer = bytearray()
+        self._file = None
+        self._sha256 = hashlib.sha256()
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLargeError(f"Upload exceeds the {self.max_bytes:,} byte limit")
+        self._sha256.update(chunk)
+        if self._file is None and len(self._buffer) + len(chunk) <= self.spool_bytes:
+            self._buffer += chunk
+            return
+        if self._file is None:
+            os.makedirs(self.tmp_dir, exist_ok=True)
+            # keep the extension: extract_text picks the parser from it
+            fd, self.path = tempfile.mkstemp(suffix=os.path.splitext(self.filename)[1], dir=self.tmp_dir)
+            self._file = os.fdopen(fd, 'wb')
+            self._file.write(self._buffer)
+            self._buffer = bytearray()
+        self._file.write(chunk)
+
+    async def read_from(self, upload, chunk_size=UPLOAD_CHUNK_BYTES):
+        """Stream an UploadFile into this spool."""
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            self.write(chunk)
+        self.close()
+
+    @classmethod
+    async def receive(cls, request, field='file', max_bytes=UPLOAD_MAX_BYTES, **kwargs):
+        """
+        Stream the file of form field `field` of a multipart/form-data
+        request straight from the socket (request.stream()) into a new
+        spool. Unlike an UploadFile parameter, which Starlette fills with the
+        whole body before the endpoint runs, this never holds more than one
+        chunk beyond the spool: a Content-Length over the limit is rejected
+        before anything is read, and a body that grows past it is abandoned.
+        """
+        content_type, params = parse_options_header(request.headers.get('content-type', ''))
+        if content_type != b'multipart/form-data' or b'boundary' not in params:
+            raise UploadFormatError("Expected a multipart/form-data upload")
+        length = request.headers.get('content-length', '')
+        if length.isdigit() and int(length) > max_bytes + MULTIPART_OVERHEAD_BYTES:
+            raise UploadTooLargeError(f"Upload exceeds the {max_bytes:,} byte limit")
+
+        state = {'headers': {}, 'name': b'', 'value': b'', 'upload': None, 'target': None}
+
+        def on_part_begin():
+            state['headers'], state['target'] = {}, None
+
+        def on_header_field(data, start, end):
+            state['name'] += data[start:end]
+
+        def on_header_value(data, start, end):
+            state['value'] += data[start:end]
+
+        def on_header_end():
+            state['headers'][state['name'].lower()] = state['value']
+            state['name'], state['value'] = b'', b''
+
+        def on_headers_finished():
+            _, options = parse_options_header(state['headers'].get(b'content-disposition', b''))
+            filename = options.get(b'filename')
+            if options.get(b'name') == field.encode() and filename and state['upload'] is None:
+                state['upload'] = state['target'] = cls(filename.decode('utf-8', 'replace'), max_bytes, **kwargs)
+
+        def on_part_data(data, start, end):
+            if state['target'] is not None:
+                state['target'].write(data[start:end])
+
+        parser = MultipartParser(params[b'boundary'], {
+            'on_part_begin': on_part_begin, 'on_header_field': on_header_field,
+            'on_header_value': on_header_value, 'on_header_end': on_header_end,
+            'on_headers_finished': on_headers_finished, 'on_part_data': on_part_data,
+        })
+        try:
+            async for chunk in request.stream():
+                parser.write(chunk)
+            parser.finalize()
+        except BaseException:
+            if state['upload'] is not None:
+                state['upload'].cleanup()
+            raise
+        if state['upload'] is None:
+            raise UploadFormatError(f"No file in form field '{field}'")
+        state['upload'].close()
+        return state['upload']
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @property
+    def digest(self):
+        return self._sha256.hexdigest()
+
+    @property
+    def source(self):
+        """What to pass to extract_text: the bytes, or the temp file path once spooled."""
+        return self.path if self.path else bytes(self._buffer)
+
+    def cleanup(self):
+        self.close()
+        self._buffer = bytearray()
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
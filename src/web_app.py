@@ -6,13 +6,7 @@ from flask import Flask, request, jsonify, render_template_string
 import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from extraction.extract import extract_text
-from preprocessing.clean import preprocess
-from analysis.ai_detector import detect_ai
-from analysis.plagiarism import check_plagiarism
-from analysis.citation import check_citations
-from scoring.score import aggregate_scores
-from report.generate import generate_report
+from pipeline.analyze import analyze_document, ExtractionError
 from chatbot.explainer import ExplainerChatbot
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -21,8 +15,6 @@ BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 chatbot = ExplainerChatbot()
 WEB_DIR = os.path.join(BASE_DIR, 'web')
 app = Flask(__name__, static_folder=WEB_DIR, static_url_path='/static', template_folder=WEB_DIR)
-UPLOAD_DIR = os.path.join('data', 'uploads')
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 @app.route('/')
 def index():
@@ -34,16 +26,10 @@ def analyze():
     if not f:
         return jsonify({'error':'no file provided'}), 400
     filename = f.filename or 'upload'
-    save_path = os.path.join(UPLOAD_DIR, filename)
-    f.save(save_path)
-
-    text, metadata = extract_text(save_path)
-    sections = preprocess(text)
-    ai_score = detect_ai(sections.get('body',''))
-    citation_score = check_citations(sections.get('body',''), sections.get('references',''))
-    plagiarism_score, matches = check_plagiarism(sections.get('body',''), 'data')
-    final = aggregate_scores(ai_score, plagiarism_score)
-    report = generate_report(save_path, metadata, sections, ai_score, plagiarism_score, citation_score, final, matches)
+    try:
+        report = analyze_document(f.read(), 'data', filename=filename)
+    except ExtractionError as e:
+        return jsonify({'error': str(e)}), 422
 
     return jsonify(report)
 
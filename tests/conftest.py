@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules import each other as top-level packages of src/, like the scripts do
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
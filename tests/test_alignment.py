@@ -0,0 +1,72 @@
+import random
+
+import numpy as np
+import pytest
+
+from analysis.alignment import align, common_prefix
+from analysis.plagiarism_index import PlagiarismIndex, add_documents, build_index
+
+
+def tokens(*values):
+    return np.array(values, dtype=np.uint32)
+
+
+def test_common_prefix():
+    assert common_prefix(tokens(1, 2, 3), tokens(1, 2, 4)) == 2
+    assert common_prefix(tokens(*range(100)), tokens(*range(100))) == 100
+    assert common_prefix(tokens(), tokens(1)) == 0
+
+
+def test_seed_is_extended_both_ways():
+    query = tokens(9, 1, 2, 3, 4, 5, 8)
+    source = tokens(7, 7, 1, 2, 3, 4, 5, 6)
+    # one seed in the middle of the shared run 1..5
+    passages = align(query, source, [3], [4])
+    assert passages.tolist() == [[1, 6, 2, 7]]
+
+
+def test_seeds_of_one_passage_give_it_once():
+    query = tokens(*range(50))
+    source = tokens(*([100] * 10 + list(range(50))))
+    passages = align(query, source, np.arange(0, 45, 5), np.arange(10, 55, 5))
+    assert passages.tolist() == [[0, 50, 10, 60]]
+
+
+def test_separate_passages_and_min_length():
+    query = tokens(1, 2, 3, 0, 0, 4, 5)
+    source = tokens(4, 5, 9, 1, 2, 3)
+    passages = align(query, source, [0, 5], [3, 0])
+    assert passages.tolist() == [[0, 3, 3, 6], [5, 7, 0, 2]]
+    assert align(query, source, [0, 5], [3, 0], min_length=3).tolist() == [[0, 3, 3, 6]]
+
+
+def test_passage_contained_in_a_longer_one_is_dropped():
+    # the phrase 1 2 occurs twice in the source, once inside the longer match
+    query = tokens(1, 2, 3, 4)
+    source = tokens(1, 2, 0, 1, 2, 3, 4)
+    passages = align(query, source, [0, 0], [0, 3])
+    assert passages.tolist() == [[0, 4, 3, 7]]
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    path = str(tmp_path / 'index')
+    build_index(None, path)
+    return path
+
+
+def test_search_reports_character_offsets_of_both_texts(index_dir):
+    rnd = random.Random(7)
+    words = [''.join(rnd.choice('abcdefghij') for _ in range(rnd.randint(3, 8))) for _ in range(400)]
+    source = 'Intro line.\n' + ' '.join(words[:200]) + '\n\n' + ' '.join(words[200:])
+    copied = ' '.join(words[120:180])
+    query = 'Something new entirely here and there. ' + copied.upper() + ' Closing remark follows now.'
+    add_documents(index_dir, [('src', 'src.txt', source)])
+
+    _, found = PlagiarismIndex(index_dir).search(query)
+    assert [s['source_id'] for s in found] == ['src']
+    [p] = found[0]['passages']
+    assert query[p['start']:p['end']] == copied.upper()
+    assert source[p['source_start']:p['source_end']] == copied
+    assert p['words'] == 60
+    assert found[0]['matched_chars'] == len(copied)
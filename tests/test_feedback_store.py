@@ -0,0 +1,70 @@
+import pytest
+
+from learning import feedback_store
+from learning.feedback_store import FeedbackStore
+
+
+def report(score, body='Body of the paper.', model='m' * 64):
+    return {'scores': {'ai_score': {'score': score, 'ml_score': score - 0.05}, 'genai_features': {'f': 1.0}},
+            'sections': {'body': body}, 'model_sha256': model}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = FeedbackStore(str(tmp_path / 'feedback.sqlite3'))
+    yield store
+    store.close()
+
+
+def test_verdict_implies_a_label():
+    assert feedback_store.verdict_label(True, 0.8) == 1
+    assert feedback_store.verdict_label(False, 0.8) == 0
+    assert feedback_store.verdict_label(True, 0.2) == 0
+    assert feedback_store.verdict_label(True, None) is None
+
+
+def test_feedback_uses_the_remembered_document(store):
+    store.remember('hash-a', report(0.9, body='Generated text.'))
+    row = store.add('a.txt', is_accurate=False, content_hash='hash-a')
+    assert row == {'id': 1, 'label': 0, 'trainable': True}
+    [trained] = store.training_rows()
+    assert trained['content_hash'] == 'hash-a' and trained['text'] == 'Generated text.'
+    assert trained['label_source'] == 'verdict'
+
+
+def test_feedback_on_an_unknown_document_is_not_trainable(store):
+    row = store.add('b.txt', is_accurate=True, content_hash='unknown', model_sha256='x' * 64)
+    assert row['label'] is None and not row['trainable']
+    assert store.training_rows() == []
+    assert store.stats()['total'] == 1 and store.stats()['trainable'] == 0
+
+
+def test_reviewer_label_wins_over_verdicts(store):
+    store.remember('hash-a', report(0.9))
+    store.add('a.txt', is_accurate=True, content_hash='hash-a', label='human')
+    store.add('a.txt', is_accurate=True, content_hash='hash-a')
+    store.add('c.txt', is_accurate=True, report=report(0.1, body='Other.'), content_hash='hash-c')
+    latest = {row['content_hash']: (row['label'], row['label_source']) for row in store.latest_labels()}
+    assert latest == {'hash-a': (0, 'reviewer'), 'hash-c': (0, 'verdict')}
+
+
+def test_old_documents_are_forgotten(store, monkeypatch):
+    now = 1_000_000_000.0
+    monkeypatch.setattr(feedback_store.time, 'time', lambda: now)
+    store.remember('old', report(0.9))
+    now += feedback_store.FEEDBACK_DOCUMENT_DAYS * 86400 + 1
+    store.remember('new', report(0.9))
+    assert store.document('old') is not None
+    assert store.prune_documents() == 1
+    assert store.document('old') is None
+    assert store.document('new')['ai_score'] == 0.9
+
+
+def test_state_and_training_cursor(store):
+    store.remember('hash-a', report(0.9))
+    first = store.add('a.txt', is_accurate=True, content_hash='hash-a')
+    second = store.add('a.txt', is_accurate=False, content_hash='hash-a')
+    store.set_state('retrained_through', first['id'])
+    assert [row['id'] for row in store.training_rows(after_id=first['id'])] == [second['id']]
+    assert store.stats()['retrained_through'] == first['id']
+    assert store.get_state('missing', 'default') == 'default'
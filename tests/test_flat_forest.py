@@ -0,0 +1,67 @@
+import random
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.pipeline import Pipeline
+
+from analysis.ai_detector import FlatForest, load_flat_model, save_flat_model
+from analysis.tfidf import make_vectorizer
+
+HUMAN = 'we measured the samples twice and found small deviations in field data collected by hand'.split()
+AI = 'furthermore it is important to note that this comprehensive study delves into pivotal insights'.split()
+
+
+def texts(count, seed):
+    rnd = random.Random(seed)
+    rows, labels = [], []
+    for _ in range(count):
+        label = rnd.random() < 0.5
+        vocabulary = AI if label else HUMAN
+        # mostly words of the own class, some of the other, so the trees have real splits
+        rows.append(' '.join(rnd.choice(vocabulary if rnd.random() < 0.7 else HUMAN + AI)
+                             for _ in range(rnd.randint(5, 40))))
+        labels.append(int(label))
+    return rows, np.array(labels)
+
+
+@pytest.fixture(scope='module')
+def pipeline():
+    X, y = texts(400, seed=1)
+    return Pipeline([
+        ('tfidf', make_vectorizer(max_features=50)),
+        ('clf', RandomForestClassifier(n_estimators=25, random_state=42)),
+    ]).fit(X, y)
+
+
+def test_forest_is_bit_identical_to_sklearn(pipeline):
+    X = pipeline.steps[0][1].transform(texts(200, seed=2)[0])
+    forest = pipeline.steps[-1][1]
+    assert np.array_equal(FlatForest.from_sklearn(forest).predict_proba(X), forest.predict_proba(X))
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_exported_model_is_bit_identical_to_the_pipeline(tmp_path, pipeline, mmap):
+    path = str(tmp_path / 'model.flat')
+    save_flat_model(pipeline, path, 'f' * 64)
+    flat = load_flat_model(path, 'f' * 64, mmap=mmap)
+    X = texts(200, seed=3)[0] + ['', 'unknown words only', 'FURTHERMORE, Delves!']
+    assert np.array_equal(flat.predict_proba(X), pipeline.predict_proba(X))
+    assert flat.classes_.tolist() == pipeline.classes_.tolist()
+
+
+def test_export_of_another_model_is_not_loaded(tmp_path, pipeline):
+    path = str(tmp_path / 'model.flat')
+    save_flat_model(pipeline, path, 'f' * 64)
+    assert load_flat_model(path, 'e' * 64) is None
+    assert load_flat_model(str(tmp_path / 'missing.flat')) is None
+
+
+def test_unsupported_vectorizer_settings_are_rejected(tmp_path):
+    X, y = texts(50, seed=4)
+    bigrams = Pipeline([
+        ('tfidf', make_vectorizer(ngram_range=(1, 2))),
+        ('clf', RandomForestClassifier(n_estimators=2, random_state=0)),
+    ]).fit(X, y)
+    with pytest.raises(ValueError):
+        save_flat_model(bigrams, str(tmp_path / 'model.flat'), 'f' * 64)
@@ -0,0 +1,85 @@
+import json
+import os
+
+import pytest
+
+from analysis.model_registry import ModelRegistry, RegistryError, UnknownVersionError
+
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = ModelRegistry(str(tmp_path / 'registry'))
+    for i in range(1, 5):
+        model = tmp_path / f'model{i}.joblib'
+        model.write_bytes(f'model {i}'.encode())
+        registry.register(str(model))
+    return registry
+
+
+def served(registry):
+    return registry.current()['version']
+
+
+def test_versions_are_numbered_in_order(registry):
+    assert [meta['version'] for meta in registry.versions()] == ['v1', 'v2', 'v3', 'v4']
+    assert registry.current() is None
+    with pytest.raises(UnknownVersionError):
+        registry.get('v9')
+
+
+def test_promote_switches_the_served_version(registry):
+    registry.promote('v1')
+    assert served(registry) == 'v1'
+    registry.promote('v3')
+    assert served(registry) == 'v3'
+    assert ModelRegistry(registry.root).current()['version'] == 'v3'
+    with pytest.raises(UnknownVersionError):
+        registry.promote('v9')
+
+
+def test_rollback_walks_back_through_promotions(registry):
+    for version in ('v1', 'v2', 'v3'):
+        registry.promote(version)
+    registry.rollback()
+    assert served(registry) == 'v2'
+    registry.rollback()
+    assert served(registry) == 'v1'
+    with pytest.raises(RegistryError):
+        registry.rollback()
+    assert served(registry) == 'v1'
+
+
+def test_rollback_does_not_return_to_a_rolled_back_version(registry):
+    for version in ('v1', 'v2', 'v3'):
+        registry.promote(version)
+    registry.rollback()
+    registry.promote('v4')
+    registry.rollback()
+    assert served(registry) == 'v2'
+    registry.rollback()
+    assert served(registry) == 'v1'
+
+
+def test_repromoting_the_served_version_adds_no_rollback_step(registry):
+    registry.promote('v1')
+    registry.promote('v2')
+    registry.promote('v2')
+    registry.rollback()
+    assert served(registry) == 'v1'
+
+
+def test_history_records_rollbacks(registry):
+    registry.promote('v1')
+    registry.promote('v2')
+    registry.rollback()
+    with open(os.path.join(registry.root, 'history.jsonl'), 'r', encoding='utf-8') as f:
+        history = [json.loads(line) for line in f]
+    assert [(h['version'], h['previous'], h['rollback']) for h in history] == \
+        [('v1', None, False), ('v2', 'v1', False), ('v1', 'v2', True)]
+
+
+def test_promote_refuses_a_modified_model_file(registry):
+    with open(registry.model_path('v2'), 'ab') as f:
+        f.write(b'tampered')
+    with pytest.raises(RegistryError):
+        registry.promote('v2')
@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+from analysis import plagiarism_index
+from analysis.plagiarism_index import (PlagiarismIndex, add_documents, build_index, compact, contains,
+                                       delete_documents)
+
+
+def words(seed, count=300):
+    rnd = random.Random(seed)
+    return [''.join(rnd.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rnd.randint(3, 9)))
+            for _ in range(count)]
+
+
+def text(seed, count=300):
+    return ' '.join(words(seed, count)) + '.'
+
+
+def passage(seed, start=40, length=60):
+    return ' '.join(words(seed)[start:start + length])
+
+
+def sources(index_dir, query):
+    return [s['source_id'] for s in PlagiarismIndex(index_dir).search(query)[1]]
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    # refit on the writing thread, so the tests see its result
+    monkeypatch.setattr(plagiarism_index, '_refit_in_background', plagiarism_index.refit)
+    path = str(tmp_path / 'index')
+    build_index(None, path)
+    return path
+
+
+def test_added_documents_are_found(index_dir):
+    assert add_documents(index_dir, [('a', 'a.txt', text(1)), ('b', 'b.txt', text(2))]) == 2
+    assert contains(index_dir, 'a') and contains(index_dir, 'b')
+    assert not contains(index_dir, 'c')
+    assert sources(index_dir, passage(1)) == ['a']
+    assert sources(index_dir, passage(2)) == ['b']
+    assert sources(index_dir, passage(3)) == []
+
+
+def test_deleted_documents_disappear(index_dir):
+    add_documents(index_dir, [('a', 'a.txt', text(1)), ('b', 'b.txt', text(2))])
+    assert delete_documents(index_dir, ['a', 'missing']) == 1
+    assert not contains(index_dir, 'a')
+    assert sources(index_dir, passage(1)) == []
+    assert sources(index_dir, passage(2)) == ['b']
+    assert PlagiarismIndex(index_dir).document_count == 1
+
+
+def test_adding_an_indexed_id_replaces_it(index_dir):
+    add_documents(index_dir, [('a', 'a.txt', text(1))])
+    add_documents(index_dir, [('a', 'a.txt', text(2))])
+    assert sources(index_dir, passage(1)) == []
+    assert sources(index_dir, passage(2)) == ['a']
+    assert PlagiarismIndex(index_dir).document_count == 1
+
+
+def test_segments_are_merged_past_the_limit(index_dir, monkeypatch):
+    monkeypatch.setattr(plagiarism_index, 'MAX_SEGMENTS', 3)
+    for seed in range(8):
+        add_documents(index_dir, [(f'd{seed}', f'd{seed}.txt', text(seed))])
+    delete_documents(index_dir, ['d0'])
+    add_documents(index_dir, [('d8', 'd8.txt', text(8))])
+    index = PlagiarismIndex(index_dir)
+    assert len(index.segments) <= 3
+    assert index.document_count == 8
+    assert sources(index_dir, passage(0)) == []
+    for seed in range(1, 9):
+        assert sources(index_dir, passage(seed)) == [f'd{seed}']
+
+
+def test_compact_drops_tombstones(index_dir):
+    for seed in range(4):
+        add_documents(index_dir, [(f'd{seed}', f'd{seed}.txt', text(seed))])
+    delete_documents(index_dir, ['d1'])
+    manifest = compact(index_dir)
+    assert len(manifest['segments']) == 1
+    assert manifest['deleted'] == {}
+    assert manifest['tfidf']['documents'] == 3
+    index = PlagiarismIndex(index_dir)
+    assert index.segments[0].doc_count == 3
+    assert sources(index_dir, passage(1)) == []
+    assert sources(index_dir, passage(2)) == ['d2']
+    assert index.similar_documents(text(3), k=1)[0]['source_id'] == 'd3'
+
+
+def test_excluding_leaves_a_document_out_of_queries(index_dir):
+    add_documents(index_dir, [('a', 'a.txt', text(1)), ('b', 'b.txt', text(1) + ' ' + text(2))])
+    index = PlagiarismIndex(index_dir)
+    assert sorted(s['source_id'] for s in index.search(passage(1))[1]) == ['a', 'b']
+    assert [s['source_id'] for s in index.excluding(['b']).search(passage(1))[1]] == ['a']
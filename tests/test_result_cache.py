@@ -0,0 +1,63 @@
+import pytest
+
+from pipeline import cache
+from pipeline.cache import ResultCache, content_hash
+
+REPORT = {'decision': 'Accept', 'scores': {'ai_score': 0.25}}
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """The fingerprint of the served model, changeable by the test."""
+    served = {'sha256': 'a' * 64}
+    monkeypatch.setattr(cache, 'model_fingerprint', lambda: served['sha256'])
+    return served
+
+
+@pytest.fixture
+def result_cache(tmp_path, model):
+    return ResultCache(str(tmp_path / 'results'), memory_items=4, disk_bytes=1 << 20)
+
+
+def test_key_covers_upload_model_and_index_state(model):
+    c = ResultCache('unused')
+    digest = content_hash(b'paper')
+    key = c.key(digest, 'a' * 64, 'state-1')
+    assert key == c.key(digest, 'a' * 64, 'state-1')
+    assert key != c.key(content_hash(b'other paper'), 'a' * 64, 'state-1')
+    assert key != c.key(digest, 'b' * 64, 'state-1')
+    assert key != c.key(digest, 'a' * 64, 'state-2')
+    assert c.key(digest) == c.key(digest, 'a' * 64)
+
+
+def test_hit_only_for_the_same_index_state(result_cache):
+    digest = content_hash(b'paper')
+    result_cache.put(digest, REPORT, index_state='state-1')
+    assert result_cache.get(digest, index_state='state-1') == REPORT
+    assert result_cache.get(digest, index_state='state-2') is None
+    assert result_cache.stats()['memory_hits'] == 1
+    assert result_cache.stats()['misses'] == 1
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path, result_cache):
+    digest = content_hash(b'paper')
+    result_cache.put(digest, REPORT, index_state='state-1')
+    reopened = ResultCache(result_cache.cache_dir)
+    assert reopened.get(digest, index_state='state-1') == REPORT
+    assert reopened.stats()['disk_hits'] == 1
+
+
+def test_new_model_invalidates_entries(model, result_cache):
+    digest = content_hash(b'paper')
+    result_cache.put(digest, REPORT, index_state='state-1')
+    model['sha256'] = 'b' * 64
+    assert result_cache.get(digest, index_state='state-1') is None
+    assert result_cache.stats()['disk_items'] == 0
+
+
+def test_report_of_another_model_is_not_stored(result_cache):
+    digest = content_hash(b'paper')
+    result_cache.put(digest, REPORT, model_sha256='c' * 64, index_state='state-1')
+    assert result_cache.get(digest, index_state='state-1') is None
+    assert result_cache.stats()['stale'] == 1
+    assert result_cache.stats()['stores'] == 0
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from analysis import tfidf
+
+
+@pytest.fixture(scope='module')
+def corpus(tmp_path_factory):
+    """Postings of 300 random documents over 500 terms, and their dense TF-IDF matrix."""
+    rng = np.random.default_rng(3)
+    documents, vocabulary = 300, 500
+    posting_terms, posting_docs, tf = [], [], []
+    for doc in range(documents):
+        # Zipf-like: some terms are in most documents, most in few
+        terms = np.unique(rng.zipf(1.3, size=rng.integers(5, 60)) % vocabulary)
+        posting_terms.append(terms.astype(np.uint64) * np.uint64(2654435761))
+        posting_docs.append(np.full(len(terms), doc))
+        tf.append(rng.integers(1, 6, size=len(terms)))
+    posting_terms, posting_docs, tf = map(np.concatenate, (posting_terms, posting_docs, tf))
+    idf = tfidf.fit_idf(posting_terms, documents)
+    path = tmp_path_factory.mktemp('postings')
+    for name, values in tfidf.postings_arrays(posting_terms, posting_docs, tf, idf).items():
+        np.save(path / f'{name}.npy', values)
+    postings = tfidf.Postings(str(path))
+    dense = np.zeros((documents, len(postings.terms)))
+    columns = np.searchsorted(postings.terms, posting_terms)
+    dense[posting_docs, columns] = tfidf.weigh(posting_terms, posting_docs, tf, idf)
+    return postings, dense, idf, rng
+
+
+def brute_force(postings, dense, terms, q, k, alive=None, threshold=0.0):
+    pos, found = tfidf.lookup(postings.terms, terms)
+    scores = dense[:, pos[found]] @ q[found]
+    if alive is not None:
+        scores[~alive] = 0
+    order = np.argsort(-scores, kind='stable')[:k]
+    return [(float(scores[d]), int(d)) for d in order if scores[d] > threshold and scores[d] > 0]
+
+
+def random_query(postings, rng):
+    terms = np.unique(rng.choice(postings.terms, size=rng.integers(1, 40)))
+    counts = rng.integers(1, 4, size=len(terms))
+    return terms, counts
+
+
+@pytest.mark.parametrize('k', [1, 5, 20])
+def test_top_k_matches_brute_force(corpus, k):
+    postings, dense, idf, rng = corpus
+    for _ in range(50):
+        terms, counts = random_query(postings, rng)
+        q = tfidf.query_vector(terms, counts, idf)
+        got = tfidf.top_k(postings, None, terms, q, k)
+        expected = brute_force(postings, dense, terms, q, k)
+        assert [d for _, d in got] == [d for _, d in expected]
+        np.testing.assert_allclose([s for s, _ in got], [s for s, _ in expected], rtol=1e-6)
+
+
+def test_top_k_skips_dead_documents_and_respects_threshold(corpus):
+    postings, dense, idf, rng = corpus
+    alive = rng.random(len(dense)) > 0.3
+    for _ in range(50):
+        terms, counts = random_query(postings, rng)
+        q = tfidf.query_vector(terms, counts, idf)
+        threshold = float(rng.uniform(0, 0.2))
+        got = tfidf.top_k(postings, alive, terms, q, 5, threshold)
+        expected = brute_force(postings, dense, terms, q, 5, alive, threshold)
+        assert [d for _, d in got] == [d for _, d in expected]
+        assert all(alive[d] and s > threshold for s, d in got)
+
+
+def test_top_k_of_unknown_terms_is_empty(corpus):
+    postings, _, idf, _ = corpus
+    terms = np.array([1, 3, 5], dtype=np.uint64)
+    assert tfidf.top_k(postings, None, terms, np.ones(3), 5) == []
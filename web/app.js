@@ -152,20 +152,20 @@ function showResult(data) {
   feedbackDiv.style.marginTop = '24px';
   feedbackDiv.innerHTML = `
     <p style="color:#94a3b8;font-size:13px;margin-bottom:10px;">Is this result accurate?</p>
-    <button class="btn" style="border:1px solid #10b981;color:#10b981;margin-right:8px;" onclick="sendFeedback(true, '${data.file}')">Yes, Accurate</button>
-    <button class="btn" style="border:1px solid #ef4444;color:#ef4444;" onclick="sendFeedback(false, '${data.file}')">No, Inaccurate</button>
+    <button class="btn" style="border:1px solid #10b981;color:#10b981;margin-right:8px;" onclick="sendFeedback(true, '${data.file}', '${data.content_hash || ''}')">Yes, Accurate</button>
+    <button class="btn" style="border:1px solid #ef4444;color:#ef4444;" onclick="sendFeedback(false, '${data.file}', '${data.content_hash || ''}')">No, Inaccurate</button>
   `;
   result.appendChild(feedbackDiv);
 }
 
 // --- Feedback Logic ---
-async function sendFeedback(isAccurate, filepath) {
+async function sendFeedback(isAccurate, filepath, contentHash) {
   try {
     const filename = filepath ? filepath.split(/[\\/]/).pop() : 'unknown';
     const resp = await fetch('/feedback', {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ filename, is_accurate: isAccurate })
+      body: JSON.stringify({ filename, is_accurate: isAccurate, content_hash: contentHash || null })
     });
     const res = await resp.json();
     alert(res.message);